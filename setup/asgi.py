@@ -3,5 +3,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'setup.settings')
+# Feed pages use the async views when served through ASGI
+os.environ.setdefault('ASYNC_FEED_VIEWS', '1')
 
 application = get_asgi_application()
@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import sys
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -20,11 +21,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
     'twitter.apps.TwitterConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'twitter.profiling.QueryBudgetMiddleware',
+    'twitter.routing.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,6 +58,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'setup.wsgi.application'
 
+# Serve home/profile with the async views; setup.asgi turns this on
+# (e.g. uvicorn setup.asgi:application)
+ASYNC_FEED_VIEWS = os.environ.get('ASYNC_FEED_VIEWS') == '1'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
@@ -96,4 +104,193 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Media serving (twitter.media); thumbs/ is content-addressed and cached as immutable
+MEDIA_CACHE_MAX_AGE = 60 * 60
+MEDIA_IMMUTABLE_PREFIXES = ('thumbs/',)
+# Leave file bodies to the front server: '' (Django streams them), 'X-Sendfile' (Apache/lighttpd)
+# or 'X-Accel-Redirect' (nginx, with an internal location for MEDIA_ACCEL_PREFIX aliased to MEDIA_ROOT)
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER', '')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Avatar thumbnails (twitter.thumbnails, backfill_thumbnails command)
+AVATAR_SIZES = (35, 55, 200)
+AVATAR_QUALITY = 85
+
+# API (twitter/api.py): compact JSON only, no browsable API
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+}
+
+# CACHE
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Sessions and request.user (twitter.identity) are only cached in a cache every process shares:
+# REDIS_URL adds it as the 'shared' alias (needs the redis package). LocMem is per process, so
+# without it a session written by one worker would be missing or stale in the others: sessions
+# then stay in the database (SESSION_BACKEND=cached_db needs REDIS_URL, signed_cookies keeps them
+# in a signed cookie) and request.user is read from the database on every request.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+SESSION_CACHE_ALIAS = 'shared' if REDIS_URL else 'default'
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get(
+    'SESSION_BACKEND', 'cached_db' if REDIS_URL else 'db'
+)
+
+AUTHENTICATION_BACKENDS = ['twitter.identity.CachedModelBackend']
+IDENTITY_CACHE_ALIAS = 'shared' if REDIS_URL else None
+IDENTITY_CACHE_TIMEOUT = 60
+
+# Rendered tweet cards (twitter.fragments), on the shared cache when there is one. The write
+# views bump versions in the cache they write to, so on a per-process LocMem cache other workers
+# keep their cards: there entries live FRAGMENT_LOCAL_CACHE_TIMEOUT seconds at most
+FRAGMENT_CACHE_ALIAS = 'shared' if REDIS_URL else 'default'
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+FRAGMENT_LOCAL_CACHE_TIMEOUT = 5
+
+# Follower graph adjacency arrays (twitter.graph), on the shared cache when there is one. A follow
+# only drops the arrays of the process that handled it, so on LocMem they live
+# GRAPH_LOCAL_CACHE_TIMEOUT seconds at most
+GRAPH_CACHE_ALIAS = 'shared' if REDIS_URL else 'default'
+GRAPH_CACHE_TIMEOUT = 60 * 60
+GRAPH_LOCAL_CACHE_TIMEOUT = 5
+
+# "Who to follow" (twitter.suggestions, compute_suggestions command)
+SUGGESTIONS_TOP_K = 20
+SUGGESTIONS_ACTIVITY_DAYS = 7
+SUGGESTIONS_ACTIVITY_WEIGHT = 0.5
+# Follows considered per profile when walking friends of friends
+SUGGESTIONS_MAX_FOLLOWS = 500
+
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
+# Read replicas (twitter.routing): GET requests read from one of DATABASE_REPLICAS.
+# DB_REPLICA_HOSTS="host1,host2" adds a replica alias per host, same credentials as default.
+DATABASE_ROUTERS = ['twitter.routing.ReplicaRouter']
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'OPTIONS': {**DATABASES['default']['OPTIONS'], 'connect_timeout': 2},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+if TESTING:
+    # A test database of its own that never receives the primary's writes, i.e. a replica
+    # lagging forever; enabled per test with DATABASE_REPLICAS=['replica']
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'TEST': {'NAME': f"test_{DATABASES['default']['NAME']}_replica"},
+    }
+# After a write, the client reads from the primary for this long (db_primary cookie)
+REPLICA_STICKY_SECONDS = 5
+# Seconds between SELECT 1 probes of each replica, per process
+REPLICA_HEALTH_INTERVAL = 10
+
+# SQL budgets per URL name (twitter.profiling); violations are logged, and raise under "manage.py test"
+SQL_BUDGET_RAISE = TESTING
+# "duplicates": how often one query shape may repeat in a request before it counts as an N+1
+SQL_BUDGET_DEFAULT = {'queries': 30, 'ms': 1000, 'duplicates': 3}
+SQL_BUDGETS = {
+    'home': {'queries': 15},
+    'profile': {'queries': 15},
+    'followers': {'queries': 10},
+    'follows': {'queries': 10},
+    'tweet_like': {'queries': 15},
+}
+# X-Query-Count / Server-Timing response headers
+SQL_PROFILE_HEADERS = os.environ.get('SQL_PROFILE_HEADERS') == '1'
+
+# Background tasks (twitter.tasks, run_tasks worker); eager runs them inline, as under tests
+TASKS_EAGER = TESTING or os.environ.get('TASKS_EAGER') == '1'
+TASK_MAX_ATTEMPTS = 5
+# Retry backoff in seconds: TASK_RETRY_BASE * 2 ** (attempt - 1), capped at TASK_RETRY_MAX
+TASK_RETRY_BASE = 2
+TASK_RETRY_MAX = 60 * 60
+# Running tasks older than this are assumed orphaned and queued again
+TASK_LOCK_TIMEOUT = 10 * 60
+# Finished tasks (and their idempotency keys) are kept this long; failed ones longer, for inspection
+TASK_KEEP_DONE = 7 * 24 * 60 * 60
+TASK_KEEP_FAILED = 30 * 24 * 60 * 60
+
+# Write-behind like buffer (twitter.likes): likes are queued in-process and flushed in batches
+# every LIKE_FLUSH_INTERVAL seconds; off under tests, where likes are written straight through
+LIKE_BUFFER = not TESTING
+LIKE_FLUSH_INTERVAL = 1.0
+LIKE_FLUSH_BATCH = 1000
+
+# Token-bucket rate limits of the write views (twitter.ratelimit), per user and per IP:
+# "N/period" allows bursts of N and refills N tokens per period (s, m, h, d)
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_CACHE_ALIAS = 'default'
+# Take the client IP from X-Forwarded-For; only behind a proxy that sets it
+RATE_LIMIT_TRUST_FORWARDED = os.environ.get('RATE_LIMIT_TRUST_FORWARDED') == '1'
+RATE_LIMITS = {
+    'tweet': '30/m',
+    'comment': '30/m',
+    'like': '120/m',
+    'follow': '60/m',
+    'login': '10/m',
+}
+
+# Search (twitter.search): a query ranks the tweets among the newest SEARCH_MAX_CANDIDATES postings
+# of its rarest term, so a deep page costs the same as the first one
+SEARCH_MAX_CANDIDATES = 5000
+
+# Query plan checks (explain_views command): tables that may be read whole or sorted outside an index
+EXPLAIN_ALLOWED_SCANS = ()
+# search ranks by a score computed per query
+EXPLAIN_ALLOWED_SORTS = ('twitter_searchposting',)
+
+# Per-view benchmark baselines (bench_views command)
+BENCH_BASELINE_FILE = os.path.join(BASE_DIR, 'benchmarks', 'baselines.json')
+
+# TIMELINE
+# Authors with more followers than this are merged into feeds on read instead of fanned out on write
+TIMELINE_FANOUT_LIMIT = 10000
+# Tweets copied into a timeline when following someone or rebuilding it
+TIMELINE_LENGTH = 800
+# Stream the home and profile pages (twitter.streaming): the page head goes out before the feed
+# is loaded and the tweet cards follow in chunks (first one STREAM_CHUNK_SIZE); sync (WSGI) views only
+STREAM_FEED_VIEWS = os.environ.get('STREAM_FEED_VIEWS') == '1'
+STREAM_CHUNK_SIZE = 5
+# Live updates (twitter.live, "live" SSE view, ASGI only): new tweets and like/comment counts.
+# Events go to the streams of this process (MemoryBackend) or, with several processes,
+# through the LiveEvent table, polled every LIVE_POLL_INTERVAL seconds (DatabaseBackend)
+LIVE_UPDATES = True
+LIVE_BACKEND = os.environ.get('LIVE_BACKEND', 'twitter.live.MemoryBackend')
+LIVE_POLL_INTERVAL = 1.0
+# Seconds LiveEvent rows are kept for the pollers (purged by run_tasks)
+LIVE_EVENT_RETENTION = 60
+# Polling processes refresh their LiveListener row every LIVE_HEARTBEAT seconds; events are
+# stored only while one was refreshed in the last LIVE_LISTENER_TIMEOUT seconds
+LIVE_HEARTBEAT = 5
+LIVE_LISTENER_TIMEOUT = 15
+# Tweets on screen one stream may watch
+LIVE_MAX_TWEETS = 100
+# A comment line every LIVE_KEEPALIVE seconds; streams end after LIVE_MAX_SECONDS and the browser reconnects
+LIVE_KEEPALIVE = 25
+LIVE_MAX_SECONDS = 300
+# Hot/cold storage (twitter.archive, archive_tweets command): tweets older than this move to the
+# archive tables, ARCHIVE_BATCH_SIZE per transaction; profile and visitor feeds continue into them
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_BATCH_SIZE = 500
+# Tweets per page in the home and profile feeds
+FEED_PAGE_SIZE = 20
+# Latest comments shown under each tweet in the feed
+COMMENT_PREVIEW_SIZE = 3
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
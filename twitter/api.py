@@ -0,0 +1,144 @@
+import hashlib
+
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+
+from . import fragments, likes, ratelimit, timeline
+from .feed import mark_liked, with_authors
+from .models import ArchivedTweet, Comment, Profile, Tweet
+from .pagination import after_cursor, encode_cursor, page_size
+from .serializers import CommentSerializer, TweetSerializer
+
+# JSON API for the mobile clients. Every list is cursor paginated and carries a
+# strong ETag plus Last-Modified; the validators are computed from a narrow
+# values_list query, so an unchanged poll gets its 304 before any object is
+# loaded or serialized.
+
+TWEET_VERSIONS = ("date_modified", "user__profile__date_modified")
+COMMENT_VERSIONS = ("created_at", "user__profile__date_modified")
+
+
+def _etag(*parts):
+    return '"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def conditional_page(request, queryset, serializer_class, versions, prepare=None, archive=None, pending=None):
+    cursor = request.query_params.get("cursor")
+    size = page_size()
+    window = list(after_cursor(queryset, cursor).values_list("id", *versions)[:size + 1])
+    if archive is not None and len(window) <= size:
+        # older than every hot row, so only read once those run out (see twitter.archive)
+        window += after_cursor(archive, cursor).values_list("id", *versions)[:size + 1 - len(window)]
+    page = window[:size]
+
+    # the viewer is part of the tag because the payload carries their "liked" flags, and so are
+    # their likes still waiting in the write-behind buffer (twitter.likes), which change no row yet
+    buffered = sorted(pending([row[0] for row in page]).items()) if pending else None
+    etag = _etag(request.user.id, cursor, window, buffered)
+    last_modified = max((value for row in page for value in row[1:] if value), default=None)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if not_modified is not None:
+        not_modified["ETag"] = etag
+        return not_modified
+
+    ids = [row[0] for row in page]
+    found = queryset.in_bulk(ids)
+    if archive is not None and len(found) < len(ids):
+        found.update(archive.in_bulk([pk for pk in ids if pk not in found]))
+    items = [found[pk] for pk in ids if pk in found]
+    if prepare:
+        prepare(items)
+
+    response = Response({
+        "results": serializer_class(items, many=True).data,
+        "next": encode_cursor(items[-1]) if items and len(window) > size else None,
+    })
+    response["ETag"] = etag
+    if timestamp:
+        response["Last-Modified"] = http_date(timestamp)
+    return response
+
+
+@api_view(["GET"])
+def feed(request):
+    if request.user.is_authenticated:
+        # timelines only hold hot tweets
+        tweets, archive = timeline.home_timeline(request.user), None
+    else:
+        tweets, archive = Tweet.objects.all(), with_authors(ArchivedTweet.objects.all())
+    return conditional_page(
+        request, with_authors(tweets), TweetSerializer, TWEET_VERSIONS,
+        prepare=lambda items: mark_liked(items, request.user), archive=archive,
+        pending=lambda ids: likes.pending_for(request.user.id, ids),
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def profile_tweets(request, pk):
+    get_object_or_404(Profile, user_id=pk)
+    return conditional_page(
+        request, with_authors(Tweet.objects.filter(user_id=pk)), TweetSerializer, TWEET_VERSIONS,
+        prepare=lambda items: mark_liked(items, request.user),
+        archive=with_authors(ArchivedTweet.objects.filter(user_id=pk)),
+        pending=lambda ids: likes.pending_for(request.user.id, ids),
+    )
+
+
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticatedOrReadOnly])
+@ratelimit.limit("comment")
+def tweet_comments(request, pk):
+    tweet = Tweet.objects.filter(id=pk).first()
+    if tweet is None:
+        # older tweets may be in the archive (twitter.archive), which is read only
+        tweet = get_object_or_404(ArchivedTweet, id=pk)
+        if request.method == "POST":
+            return Response(
+                {"detail": "This tweet is archived and can't be commented."}, status=status.HTTP_409_CONFLICT,
+            )
+
+    if request.method == "POST":
+        serializer = CommentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        comment = tweet.add_comment(Comment(user=request.user, **serializer.validated_data))
+        fragments.bump_tweet(tweet.id)
+        return Response(CommentSerializer(comment).data, status=status.HTTP_201_CREATED)
+
+    comments = tweet.comments.select_related("user__profile")
+    return conditional_page(request, comments, CommentSerializer, COMMENT_VERSIONS)
+
+
+@api_view(["POST", "DELETE"])
+@permission_classes([IsAuthenticated])
+@ratelimit.limit("like", methods=("POST", "DELETE"))
+def like(request, pk):
+    tweet = get_object_or_404(Tweet, id=pk)
+    liked = likes.record(tweet.id, request.user.id, request.method == "POST")
+
+    tweet.refresh_from_db(fields=["like_count"])
+    return Response({"liked": liked, "likes": tweet.like_count + likes.pending_delta(tweet.id)})
+
+
+@api_view(["POST", "DELETE"])
+@permission_classes([IsAuthenticated])
+@ratelimit.limit("follow", methods=("POST", "DELETE"))
+def follow(request, pk):
+    target = get_object_or_404(Profile, user_id=pk)
+    current = request.user.profile
+    if request.method == "POST":
+        current.follows.add(target)
+    else:
+        current.follows.remove(target)
+    # only the timestamp: the rest may come from the identity cache
+    current.save(update_fields=["date_modified"])
+
+    target.refresh_from_db(fields=["follower_count"])
+    return Response({"following": request.method == "POST", "followers": target.follower_count})
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TwitterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'twitter'
+
+    def ready(self):
+        # Connects the timeline fan-out, follower graph, search index, identity cache and live update signals
+        from . import graph, identity, live, search, timeline  # noqa: F401
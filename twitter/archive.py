@@ -0,0 +1,99 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import fragments
+from .models import (
+    ArchivedComment, ArchivedLike, ArchivedTweet, Comment, SearchPosting, TimelineEntry, Tweet,
+)
+
+# Hot/cold storage. Tweet, Comment and the likes table only keep recent
+# tweets; the archive_tweets command moves tweets older than ARCHIVE_AFTER_DAYS,
+# with their comments and likes, to ArchivedTweet, ArchivedComment and
+# ArchivedLike, oldest first and in batches of ARCHIVE_BATCH_SIZE tweets. Each
+# batch is one short transaction that locks only its own rows, so writers are
+# never held up for long and an interrupted run simply resumes.
+#
+# Moving oldest first keeps every archived tweet older than every hot one, so
+# the profile and visitor feeds (feed.profile_page, feed.home_page, the API)
+# read the archive with the same cursor once the hot rows run out; pages of
+# recent tweets never touch it. Archived tweets keep their ids and are read
+# only: they can't be liked, commented, edited or deleted, and leave the
+# timelines and the search index. Tweets imported with an old created_at after
+# a run are archived by the next one.
+
+Likes = Tweet.likes.through
+
+
+def cutoff(days=None):
+    days = getattr(settings, "ARCHIVE_AFTER_DAYS", 90) if days is None else days
+    return timezone.now() - timedelta(days=days)
+
+
+def batch_size():
+    return getattr(settings, "ARCHIVE_BATCH_SIZE", 500)
+
+
+def _delete(model, column, ids):
+    """DELETE the rows of ``model`` whose ``column`` is in ``ids``; no collector, no signals."""
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"DELETE FROM {quote(model._meta.db_table)} WHERE {quote(column)} IN ({placeholders})", chunk)
+
+
+def archive_batch(before, size=None):
+    """Move up to ``size`` of the oldest tweets created before ``before``; returns their ids."""
+    with transaction.atomic():
+        ids = list(
+            Tweet.objects.select_for_update()
+            .filter(created_at__lt=before)
+            .order_by("created_at", "id")
+            .values_list("id", flat=True)[:size or batch_size()]
+        )
+        if not ids:
+            return []
+
+        ArchivedTweet.objects.bulk_create([
+            ArchivedTweet(
+                id=tweet.id, user_id=tweet.user_id, body=tweet.body, created_at=tweet.created_at,
+                date_modified=tweet.date_modified, like_count=tweet.like_count, comment_count=tweet.comment_count,
+            )
+            for tweet in Tweet.objects.filter(id__in=ids)
+        ])
+        ArchivedComment.objects.bulk_create([
+            ArchivedComment(**row)
+            for row in Comment.objects.filter(tweet_id__in=ids).values("id", "tweet_id", "user_id", "body", "created_at")
+        ])
+        ArchivedLike.objects.bulk_create([
+            ArchivedLike(**row) for row in Likes.objects.filter(tweet_id__in=ids).values("tweet_id", "user_id")
+        ])
+
+        # plain DELETEs: the rows are moved, not deleted, so no signals (counters, live updates,
+        # search) may fire; children go first since there is no cascade
+        for model in (SearchPosting, TimelineEntry, Likes, Comment):
+            _delete(model, model._meta.get_field("tweet").column, ids)
+        _delete(Tweet, Tweet._meta.pk.column, ids)
+
+    # cached cards still offer likes and comments
+    fragments.bump_tweets(ids)
+    return ids
+
+
+def archive(before, size=None, limit=None, pause=0):
+    """Archive the tweets created before ``before`` (at most ``limit``); yields each batch's ids."""
+    size = size or batch_size()
+    moved = 0
+    while limit is None or moved < limit:
+        ids = archive_batch(before, size if limit is None else min(size, limit - moved))
+        if not ids:
+            return
+        moved += len(ids)
+        yield ids
+        # writers the batch held up go first
+        time.sleep(pause)
@@ -0,0 +1,108 @@
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+# Query plan checks (explain_views command, QueryPlanTests). The SELECTs a view
+# runs are recorded through the connections' execute_wrapper and run again
+# under EXPLAIN; a plan that reads a whole table or sorts rows outside an
+# index (a filesort) is reported. Plans are read the way each backend prints
+# them: EXPLAIN QUERY PLAN on SQLite, EXPLAIN on MySQL and PostgreSQL.
+#
+# Tables in EXPLAIN_ALLOWED_SCANS may be read whole and those in
+# EXPLAIN_ALLOWED_SORTS sorted: search results, for one, are ranked by a score
+# computed in the query, which no index can hold.
+
+
+class PlanRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip()[:6].upper() == "SELECT":
+            self.queries.append((context["connection"].alias, sql, params))
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def capture(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+def _sqlite(cursor, sql, params):
+    cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+    # a temp b-tree sorts the rows of the last table read at its level of the plan
+    source = {}
+    for _, parent, _, detail in cursor.fetchall():
+        if detail.startswith(("SCAN ", "SEARCH ")):
+            source[parent] = detail.split()[1]
+            # "SCAN t USING INDEX i" walks an index in order, which is what a keyset page wants
+            if detail.startswith("SCAN ") and " USING " not in detail:
+                yield "full scan", source[parent]
+        elif detail.startswith("USE TEMP B-TREE FOR") and "ORDER BY" in detail:
+            yield "filesort", source.get(parent)
+
+
+def _mysql(cursor, sql, params):
+    cursor.execute("EXPLAIN " + sql, params)
+    columns = [column[0].lower() for column in cursor.description]
+    for row in cursor.fetchall():
+        row = dict(zip(columns, row))
+        if row.get("type") == "ALL":
+            yield "full scan", row.get("table")
+        if "filesort" in (row.get("extra") or ""):
+            yield "filesort", row.get("table")
+
+
+def _postgresql(cursor, sql, params):
+    cursor.execute("EXPLAIN " + sql, params)
+    for (line,) in cursor.fetchall():
+        node = line.strip().lstrip("-> ")
+        if node.startswith("Seq Scan on "):
+            yield "full scan", node.split()[3]
+        elif node.startswith("Sort "):
+            # not tied to a table in the plan text, so always reported
+            yield "filesort", None
+
+
+_READERS = {"sqlite": _sqlite, "mysql": _mysql, "postgresql": _postgresql}
+
+
+def allowed():
+    """{problem: tables where it is accepted} from EXPLAIN_ALLOWED_SCANS / EXPLAIN_ALLOWED_SORTS."""
+    return {
+        "full scan": set(getattr(settings, "EXPLAIN_ALLOWED_SCANS", ())),
+        "filesort": set(getattr(settings, "EXPLAIN_ALLOWED_SORTS", ())),
+    }
+
+
+def plan_problems(alias, sql, params):
+    """[(problem, table)] for one query; empty when its plan is fine."""
+    connection = connections[alias]
+    reader = _READERS.get(connection.vendor)
+    if reader is None:
+        return []
+    accepted = allowed()
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        problems = list(reader(cursor, sql, params))
+    # derived tables (subqueries) hold rows already narrowed down by an index
+    return [
+        (problem, table) for problem, table in problems
+        if (table is None or table in tables) and table not in accepted[problem]
+    ]
+
+
+def check(recorder):
+    """[(sql, problems)] for every recorded query with a bad plan."""
+    seen, report = set(), []
+    for alias, sql, params in recorder.queries:
+        if sql in seen:
+            continue
+        seen.add(sql)
+        problems = plan_problems(alias, sql, params)
+        if problems:
+            report.append((sql, problems))
+    return report
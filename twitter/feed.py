@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+
+from . import graph, likes, suggestions, timeline
+from .models import ArchivedComment, ArchivedLike, ArchivedTweet, Comment, Profile, Tweet
+from .pagination import paginate
+
+
+def comment_preview_size():
+    return getattr(settings, "COMMENT_PREVIEW_SIZE", 3)
+
+
+def with_authors(queryset):
+    """Load each tweet's author and profile in the same query."""
+    return queryset.select_related("user__profile")
+
+
+def home_page(user, cursor=None):
+    """(tweets, next_cursor) for the home feed: the timeline, or every tweet for visitors."""
+    if user.is_authenticated:
+        # timelines only hold hot tweets
+        return paginate(with_authors(timeline.home_timeline(user)), cursor)
+    return paginate(with_authors(Tweet.objects.all()), cursor, archive=with_authors(ArchivedTweet.objects.all()))
+
+
+def profile_page(user_id, cursor=None):
+    return paginate(
+        with_authors(Tweet.objects.filter(user_id=user_id)), cursor,
+        archive=with_authors(ArchivedTweet.objects.filter(user_id=user_id)),
+    )
+
+
+def suggestions_for(profile_id, limit=5):
+    """Profiles to suggest on the home page (precomputed, see twitter.suggestions)."""
+    return suggestions.for_profile(profile_id, graph.following(profile_id), limit)
+
+
+async def asuggestions_for(user, limit=5):
+    profile_id = await Profile.objects.values_list("id", flat=True).aget(user=user)
+    following_ids = await graph.afollowing(profile_id)
+    return await suggestions.afor_profile(profile_id, following_ids, limit)
+
+
+def prefetch_comment_previews(tweets):
+    """Attach the latest comments (oldest first) as ``tweet.preview_comments``.
+
+    One query for the whole page (two if it reaches archived tweets): the
+    per-tweet limit is applied in SQL with a window function, and comment
+    authors come in through select_related.
+    """
+    for model, archived in ((Comment, False), (ArchivedComment, True)):
+        group = [tweet for tweet in tweets if tweet.archived == archived]
+        if not group:
+            continue
+        latest = (
+            model.objects.select_related("user__profile")
+            .order_by("-created_at", "-id")[:comment_preview_size()]
+        )
+        prefetch_related_objects(
+            group, Prefetch("comments", queryset=latest, to_attr="preview_comments")
+        )
+    for tweet in tweets:
+        tweet.preview_comments.reverse()
+    return tweets
+
+
+def liked_tweet_ids(user, tweet_ids):
+    """Ids among ``tweet_ids`` that ``user`` has liked, in a single query."""
+    if not user.is_authenticated or not tweet_ids:
+        return set()
+    liked = set(
+        Tweet.likes.through.objects.filter(
+            user_id=user.id, tweet_id__in=tweet_ids
+        ).values_list("tweet_id", flat=True)
+    )
+    # likes still waiting in the write-behind buffer
+    for tweet_id, pending in likes.pending_for(user.id, tweet_ids).items():
+        if pending:
+            liked.add(tweet_id)
+        else:
+            liked.discard(tweet_id)
+    return liked
+
+
+def mark_liked(tweets, user):
+    """Set ``tweet.liked`` on every tweet of a rendered page."""
+    liked = liked_tweet_ids(user, [tweet.id for tweet in tweets if not tweet.archived])
+    archived = [tweet.id for tweet in tweets if tweet.archived]
+    if archived and user.is_authenticated:
+        liked.update(
+            ArchivedLike.objects.filter(user_id=user.id, tweet_id__in=archived).values_list("tweet_id", flat=True)
+        )
+    for tweet in tweets:
+        tweet.liked = tweet.id in liked
+    return tweets
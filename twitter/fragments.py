@@ -0,0 +1,183 @@
+import re
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.template.backends.utils import csrf_input
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .feed import mark_liked
+from .models import ArchivedComment, Comment
+
+# Rendered tweet cards are cached per tweet and shared by every viewer. The key
+# carries a version for the tweet and one for its author's profile; the write
+# views bump them so a changed card simply misses the cache. A profile change
+# also bumps the tweets it commented on, whose cards preview its comments.
+# Viewer-specific bits (liked heart, CSRF token, owner actions) are rendered as
+# slot markers carrying a random nonce, and the card is cached split at those
+# markers: a list of text segments and slot names. Tweet and comment bodies
+# can't contain a marker of a nonce picked after they were written, and each
+# viewer's copy is filled in one pass over the segments.
+#
+# Versions only reach the processes sharing the cache, so cards are cached for
+# FRAGMENT_CACHE_TIMEOUT on a shared cache but only a few seconds on LocMem.
+
+SLOTS = ("like_link", "like_icon", "profile_like_icon", "csrf", "owner_start", "owner_end")
+
+LIKED = {
+    "like_link": "text-danger",
+    "like_icon": "fa-solid",
+    "profile_like_icon": "fa-solid fa-heart liked",
+}
+
+NOT_LIKED = {
+    "like_link": "text-muted",
+    "like_icon": "fa-regular",
+    "profile_like_icon": "fa fa-heart-o",
+}
+
+
+def _cache():
+    return caches[getattr(settings, "FRAGMENT_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    timeout = getattr(settings, "FRAGMENT_CACHE_TIMEOUT", 60 * 60 * 24)
+    if isinstance(_cache(), LocMemCache):
+        # other processes can't see this one's invalidations
+        return min(timeout, getattr(settings, "FRAGMENT_LOCAL_CACHE_TIMEOUT", 5))
+    return timeout
+
+
+def tweet_version_key(tweet_id):
+    return f"fragments:tweet:{tweet_id}"
+
+
+def profile_version_key(user_id):
+    return f"fragments:profile:{user_id}"
+
+
+def _new_version():
+    # Time based, so a version lost to eviction never comes back with old content
+    return time.time_ns()
+
+
+def bump_tweet(tweet_id):
+    _cache().set(tweet_version_key(tweet_id), _new_version(), None)
+
+
+def bump_tweets(tweet_ids):
+    version = _new_version()
+    _cache().set_many({tweet_version_key(tweet_id): version for tweet_id in tweet_ids}, None)
+
+
+def bump_profile(user_id):
+    """New version for the user's cards and for the cards previewing their comments."""
+    _cache().set(profile_version_key(user_id), _new_version(), None)
+    for model in (Comment, ArchivedComment):
+        commented = model.objects.filter(user_id=user_id).values_list("tweet_id", flat=True).distinct()
+        batch = []
+        for tweet_id in commented.iterator(chunk_size=1000):
+            batch.append(tweet_id)
+            if len(batch) == 1000:
+                bump_tweets(batch)
+                batch = []
+        if batch:
+            bump_tweets(batch)
+
+
+def _versions(keys):
+    cache = _cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        cache.add(key, _new_version(), None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def _record(**counts):
+    cache = _cache()
+    for name, amount in counts.items():
+        if amount:
+            key = f"fragments:stats:{name}"
+            cache.add(key, 0, None)
+            cache.incr(key, amount)
+
+
+def stats():
+    """Fragment cache hit and miss counts since the cache was last cleared."""
+    cache = _cache()
+    return {name: cache.get(f"fragments:stats:{name}", 0) for name in ("hits", "misses")}
+
+
+def render_segments(template, context):
+    """Render a card and split it at its slots: [text, slot, text, slot, ..., text]."""
+    nonce = secrets.token_hex(8)
+    slot = {name: f"__slot_{nonce}_{name}__" for name in SLOTS}
+    html = render_to_string(template, {**context, "slot": slot})
+    return re.split(f"__slot_{nonce}_({'|'.join(SLOTS)})__", html)
+
+
+def overlay(segments, liked, owner, csrf):
+    """Join a cached card's segments, filling its slots for the viewer."""
+    values = {**(LIKED if liked else NOT_LIKED), "csrf": csrf}
+    parts = []
+    shown = True
+    for i, segment in enumerate(segments):
+        if i % 2 == 0:
+            if shown:
+                parts.append(segment)
+        elif segment in ("owner_start", "owner_end"):
+            # the owner actions are only kept for the tweet's author
+            shown = owner or segment == "owner_end"
+        elif shown:
+            parts.append(values[segment])
+    return "".join(parts)
+
+
+def render_cards(tweets, request, template, prepare=None):
+    """Set ``tweet.card`` to the tweet's HTML for the current viewer.
+
+    ``prepare`` is called with the tweets that missed the cache, so related
+    data (e.g. comment previews) is only loaded for cards that get rendered.
+    """
+    cache = _cache()
+    version_keys = {
+        tweet.id: (tweet_version_key(tweet.id), profile_version_key(tweet.user_id))
+        for tweet in tweets
+    }
+    versions = _versions([key for pair in version_keys.values() for key in pair])
+    keys = {
+        tweet_id: f"fragments:segments:{template}:{tweet_id}:{versions[tv]}:{versions[pv]}"
+        for tweet_id, (tv, pv) in version_keys.items()
+    }
+
+    cards = cache.get_many(list(keys.values()))
+    missing = [tweet for tweet in tweets if keys[tweet.id] not in cards]
+    if missing:
+        if prepare:
+            prepare(missing)
+        fresh = {
+            keys[tweet.id]: render_segments(template, {"tweet": tweet})
+            for tweet in missing
+        }
+        cache.set_many(fresh, _timeout())
+        cards.update(fresh)
+    _record(hits=len(tweets) - len(missing), misses=len(missing))
+
+    mark_liked(tweets, request.user)
+    csrf = csrf_input(request)
+    for tweet in tweets:
+        html = overlay(
+            cards[keys[tweet.id]],
+            liked=tweet.liked,
+            owner=tweet.user_id == request.user.id,
+            csrf=csrf,
+        )
+        tweet.card = mark_safe(html)
+    return tweets
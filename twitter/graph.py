@@ -0,0 +1,140 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import m2m_changed
+
+from .models import Profile
+from .pagination import page_size
+
+# Follower graph cache. Each profile's following and follower ids are kept as a
+# sorted array of 64-bit ints (stored as raw bytes in the cache), so follow
+# checks are a binary search, a whole page can be checked against one set, and
+# counts are just the array length. Any change to Profile.follows drops the
+# arrays of both ends, in the cache of the process that made it: arrays are
+# kept GRAPH_CACHE_TIMEOUT on a shared cache but only a few seconds on LocMem.
+
+Follows = Profile.follows.through
+
+_EDGES = {
+    "following": ("from_profile_id", "to_profile_id"),
+    "followers": ("to_profile_id", "from_profile_id"),
+}
+
+
+def _cache():
+    return caches[getattr(settings, "GRAPH_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    timeout = getattr(settings, "GRAPH_CACHE_TIMEOUT", 60 * 60)
+    if isinstance(_cache(), LocMemCache):
+        # other processes can't see this one's invalidations
+        return min(timeout, getattr(settings, "GRAPH_LOCAL_CACHE_TIMEOUT", 5))
+    return timeout
+
+
+def _key(kind, profile_id):
+    return f"graph:{kind}:{profile_id}"
+
+
+def _adjacency(kind, profile_id):
+    key = _key(kind, profile_id)
+    raw = _cache().get(key)
+    ids = array("q")
+    if raw is not None:
+        ids.frombytes(raw)
+        return ids
+
+    field, other = _EDGES[kind]
+    ids.extend(
+        Follows.objects.filter(**{field: profile_id})
+        .order_by(other)
+        .values_list(other, flat=True)
+    )
+    _cache().set(key, ids.tobytes(), _timeout())
+    return ids
+
+
+async def _aadjacency(kind, profile_id):
+    key = _key(kind, profile_id)
+    raw = await _cache().aget(key)
+    ids = array("q")
+    if raw is not None:
+        ids.frombytes(raw)
+        return ids
+
+    field, other = _EDGES[kind]
+    queryset = Follows.objects.filter(**{field: profile_id}).order_by(other)
+    ids.extend([pk async for pk in queryset.values_list(other, flat=True)])
+    await _cache().aset(key, ids.tobytes(), _timeout())
+    return ids
+
+
+def following(profile_id):
+    """Sorted ids of the profiles ``profile_id`` follows."""
+    return _adjacency("following", profile_id)
+
+
+def followers(profile_id):
+    """Sorted ids of the profiles following ``profile_id``."""
+    return _adjacency("followers", profile_id)
+
+
+async def afollowing(profile_id):
+    return await _aadjacency("following", profile_id)
+
+
+def following_set(profile_id):
+    return frozenset(following(profile_id))
+
+
+def is_following(profile_id, other_id):
+    ids = following(profile_id)
+    i = bisect_left(ids, other_id)
+    return i < len(ids) and ids[i] == other_id
+
+
+def counts(profile_id):
+    return {"followers": len(followers(profile_id)), "following": len(following(profile_id))}
+
+
+def page(ids, cursor=None, size=None):
+    """Return (ids, next_cursor) for the ids after ``cursor`` (an id)."""
+    size = size or page_size()
+    try:
+        start = bisect_right(ids, int(cursor)) if cursor else 0
+    except ValueError:
+        start = 0
+    chunk = ids[start:start + size]
+    more = start + size < len(ids)
+    return list(chunk), (str(chunk[-1]) if more else None)
+
+
+def load_profiles(ids, viewer_profile_id=None):
+    """Profiles for ``ids`` in that order, with ``followed_by_me`` set for the viewer."""
+    found = Profile.objects.select_related("user").in_bulk(ids)
+    mine = following_set(viewer_profile_id) if viewer_profile_id else frozenset()
+    profiles = [found[pk] for pk in ids if pk in found]
+    for profile in profiles:
+        profile.followed_by_me = profile.id in mine
+    return profiles
+
+
+def invalidate(*profile_ids):
+    _cache().delete_many([_key(kind, pk) for pk in profile_ids for kind in _EDGES])
+
+
+def follows_changed(sender, instance, action, pk_set, **kwargs):
+    if action in ("post_add", "post_remove"):
+        invalidate(instance.pk, *pk_set)
+    elif action == "pre_clear":
+        # pk_set is not given for clear(); drop both ends before the rows go
+        invalidate(instance.pk, *followers(instance.pk), *following(instance.pk))
+    elif action == "post_clear":
+        invalidate(instance.pk)
+
+
+m2m_changed.connect(follows_changed, sender=Follows)
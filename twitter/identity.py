@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+
+from .models import Profile
+
+# Cached identity. CachedModelBackend.get_user, which auth calls on every
+# request to turn the session's user id into request.user, serves the User
+# with its Profile already attached from the cache, so with cached sessions a
+# warm request needs no query to know who is asking. Entries live for
+# IDENTITY_CACHE_TIMEOUT seconds and are dropped whenever the user or the
+# profile is saved (profile edits, password changes, logins).
+#
+# Counters changed with update() (follower_count) may lag by up to the
+# timeout, so views that write a profile save only the fields they change,
+# or reload it first.
+#
+# The cache must be shared by every process (IDENTITY_CACHE_ALIAS, see the
+# settings): a per-process cache would keep serving a user another worker has
+# changed. With no alias, or one on LocMem, the user is read from the database.
+
+
+def _cache():
+    """The shared identity cache, or None when there is none to use."""
+    alias = getattr(settings, "IDENTITY_CACHE_ALIAS", None)
+    if alias is None or isinstance(caches[alias], LocMemCache):
+        return None
+    return caches[alias]
+
+
+def cache_key(user_id):
+    return f"identity:{user_id}"
+
+
+def load(user_id):
+    """The user with ``user.profile`` loaded, from the cache when possible (None if gone)."""
+    cache = _cache()
+    user = cache.get(cache_key(user_id)) if cache is not None else None
+    if user is None:
+        user = User.objects.select_related("profile").filter(pk=user_id).first()
+        if user is not None and cache is not None:
+            cache.set(cache_key(user_id), user, getattr(settings, "IDENTITY_CACHE_TIMEOUT", 60))
+    return user
+
+
+def forget(user_id):
+    cache = _cache()
+    if cache is not None:
+        cache.delete(cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        user = load(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+
+def user_changed(sender, instance, **kwargs):
+    forget(instance.pk)
+
+
+def profile_changed(sender, instance, **kwargs):
+    forget(instance.user_id)
+
+
+post_save.connect(user_changed, sender=User)
+post_delete.connect(user_changed, sender=User)
+post_save.connect(profile_changed, sender=Profile)
+post_delete.connect(profile_changed, sender=Profile)
@@ -0,0 +1,231 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from . import fragments, live
+from .models import Tweet
+
+# Write-behind like buffer. Likes and unlikes are kept in this process as
+# {(tweet_id, user_id): (liked in the database, liked now)}, so any number of
+# toggles by one user on one tweet collapse into a single intent, and one that
+# ends where it started is dropped. A background thread flushes the intents
+# every LIKE_FLUSH_INTERVAL seconds: one transaction per batch with a
+# bulk_create of the new likes, one delete per tweet for the removed ones and a
+# single UPDATE of all the counters. Reads (liked_tweet_ids, pending_delta)
+# merge the intents, so users see their own like at once; the counters shown
+# to everyone catch up at the next flush.
+#
+# The buffer is per process: another worker sees a like only once it is
+# flushed. With LIKE_BUFFER off every like is written straight through.
+
+log = logging.getLogger(__name__)
+
+Likes = Tweet.likes.through
+
+_lock = threading.Lock()
+_pending = {}
+# the batch being written, still merged into reads until it commits
+_flushing = {}
+_flusher = None
+_flush_lock = threading.Lock()
+
+
+def enabled():
+    return getattr(settings, "LIKE_BUFFER", False)
+
+
+def _interval():
+    return getattr(settings, "LIKE_FLUSH_INTERVAL", 1.0)
+
+
+def _in_database(tweet_id, user_id):
+    return Likes.objects.filter(tweet_id=tweet_id, user_id=user_id).exists()
+
+
+def _intent(key):
+    """(stored, liked) for a buffered pair, or None. Call with _lock held."""
+    if key in _pending:
+        return _pending[key]
+    if key in _flushing:
+        # about to be committed: treat the flushed state as the stored one
+        liked = _flushing[key][1]
+        return liked, liked
+    return None
+
+
+def record(tweet_id, user_id, liked):
+    """Like (``liked=True``) or unlike a tweet; returns the new state."""
+    if not enabled():
+        tweet, user = Tweet(id=tweet_id), User(id=user_id)
+        if tweet.add_like(user) if liked else tweet.remove_like(user):
+            fragments.bump_tweet(tweet_id)
+            live.counts_changed(tweet_id, likes=1 if liked else -1)
+        return liked
+
+    key = (tweet_id, user_id)
+    with _lock:
+        intent = _intent(key)
+    stored = intent[0] if intent else _in_database(tweet_id, user_id)
+    with _lock:
+        # a concurrent request may have queued this pair meanwhile; keep its view of the database
+        stored = (_intent(key) or (stored,))[0]
+        if liked == stored:
+            _pending.pop(key, None)
+        else:
+            _pending[key] = (stored, liked)
+    _start()
+    return liked
+
+
+def toggle(tweet_id, user_id):
+    """Flip the user's like on a tweet; returns the new state."""
+    if not enabled():
+        # unlike first: the delete's rowcount tells whether there was a like
+        tweet, user = Tweet(id=tweet_id), User(id=user_id)
+        removed = tweet.remove_like(user)
+        liked = not removed and tweet.add_like(user)
+        fragments.bump_tweet(tweet_id)
+        live.counts_changed(tweet_id, likes=-1 if removed else int(liked))
+        return liked
+
+    with _lock:
+        intent = _intent((tweet_id, user_id))
+    current = intent[1] if intent else _in_database(tweet_id, user_id)
+    return record(tweet_id, user_id, not current)
+
+
+def pending_for(user_id, tweet_ids):
+    """{tweet_id: liked} for the user's unflushed intents on ``tweet_ids``."""
+    with _lock:
+        intents = {tweet_id: _intent((tweet_id, user_id)) for tweet_id in tweet_ids}
+    return {tweet_id: intent[1] for tweet_id, intent in intents.items() if intent}
+
+
+def pending_delta(tweet_id):
+    """Like count change of a tweet that is still waiting to be flushed."""
+    with _lock:
+        # a pair in both dicts chains: the pending intent starts where the flushing one ends
+        return sum(
+            int(liked) - int(stored)
+            for intents in (_pending, _flushing)
+            for (pending_tweet, _), (stored, liked) in intents.items() if pending_tweet == tweet_id
+        )
+
+
+# ---------------------------------------------------------
+# FLUSH
+# ---------------------------------------------------------
+def _write(intents):
+    added = [key for key, (_, liked) in intents.items() if liked]
+    removed = defaultdict(list)
+    for (tweet_id, user_id), (_, liked) in intents.items():
+        if not liked:
+            removed[tweet_id].append(user_id)
+
+    tweet_ids = {tweet_id for tweet_id, _ in intents}
+    user_ids = {user_id for _, user_id in intents}
+    deltas = defaultdict(int)
+    with transaction.atomic():
+        # locking the tweets (in id order, like every flusher) keeps other flushes and the archive
+        # (twitter.archive) off them until this commits, so the rows read here are the rows written
+        # to; tweets archived since the like was queued are gone and take no new likes
+        locked = Tweet.objects.select_for_update().filter(id__in=tweet_ids).order_by("id")
+        hot = set(locked.values_list("id", flat=True))
+        existing = set(
+            Likes.objects.filter(tweet_id__in=hot, user_id__in=user_ids).values_list("tweet_id", "user_id")
+        )
+        new_rows = []
+        for tweet_id, user_id in added:
+            if tweet_id in hot and (tweet_id, user_id) not in existing:
+                new_rows.append(Likes(tweet_id=tweet_id, user_id=user_id))
+                deltas[tweet_id] += 1
+        # no ignore_conflicts: a like written around the lock fails the batch, which goes back
+        # into the buffer and is read again next round, rather than being counted twice
+        Likes.objects.bulk_create(new_rows)
+        for tweet_id, users in removed.items():
+            deleted, _ = Likes.objects.filter(tweet_id=tweet_id, user_id__in=users).delete()
+            deltas[tweet_id] -= deleted
+        deltas = {tweet_id: delta for tweet_id, delta in deltas.items() if delta}
+        if deltas:
+            # one UPDATE for every counter; deltas come from the rows inserted and deleted above
+            change = Case(
+                *[When(id=tweet_id, then=Value(delta)) for tweet_id, delta in deltas.items()],
+                default=Value(0), output_field=IntegerField(),
+            )
+            Tweet.objects.filter(id__in=deltas).update(
+                like_count=F("like_count") + change, date_modified=timezone.now(),
+            )
+    for tweet_id, delta in deltas.items():
+        fragments.bump_tweet(tweet_id)
+        live.counts_changed(tweet_id, likes=delta)
+
+
+def flush():
+    """Write every pending intent now; returns the number of intents flushed."""
+    batch_size = getattr(settings, "LIKE_FLUSH_BATCH", 1000)
+    flushed = 0
+    with _flush_lock:
+        while batch := _take(batch_size):
+            _commit(batch)
+            flushed += len(batch)
+    return flushed
+
+
+def _take(batch_size):
+    with _lock:
+        _flushing.update((key, _pending.pop(key)) for key in list(_pending)[:batch_size])
+        return dict(_flushing)
+
+
+def _commit(batch):
+    try:
+        _write(batch)
+    except Exception:
+        # back into the buffer for the next round, chained with any newer intent
+        with _lock:
+            for key, (stored, liked) in batch.items():
+                newer = _pending.pop(key, None)
+                liked = newer[1] if newer else liked
+                if liked != stored:
+                    _pending[key] = (stored, liked)
+            _flushing.clear()
+        raise
+    with _lock:
+        _flushing.clear()
+
+
+def _loop(stop):
+    while not stop.wait(_interval()):
+        try:
+            flush()
+        except Exception:
+            log.exception("like buffer flush failed")
+        finally:
+            close_old_connections()
+
+
+def _start():
+    global _flusher
+    if _flusher is not None or _interval() <= 0:
+        return
+    with _lock:
+        if _flusher is None:
+            stop = threading.Event()
+            _flusher = threading.Thread(target=_loop, args=(stop,), name="like-flusher", daemon=True)
+            _flusher.start()
+            atexit.register(_shutdown, stop)
+
+
+def _shutdown(stop):
+    stop.set()
+    try:
+        flush()
+    except Exception:
+        log.exception("like buffer flush at exit failed")
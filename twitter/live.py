@@ -0,0 +1,366 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from array import array
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Comment, LiveEvent, LiveListener, Profile, Tweet, comment_removed
+
+# Live updates (the "live" Server-Sent Events view, ASGI only). Each open stream
+# is a Subscription in this process's Hub, indexed by the profiles it follows
+# and the tweets it has on screen. Writes publish small events once their
+# transaction commits: a new tweet (with its author's profile) or a change in
+# a tweet's like and comment counters. The hub adds them to the pending update
+# of every matching subscription, so a stream that is not keeping up gets one
+# merged update ("3 new tweets, +5 likes on #12") rather than a queue of them.
+#
+# Events reach the hubs through LIVE_BACKEND: MemoryBackend hands them to this
+# process's hub (one ASGI process), DatabaseBackend stores them as LiveEvent
+# rows that every process polls for every LIVE_POLL_INTERVAL seconds while it
+# has streams open. Either way nothing is published while nobody listens: a
+# polling process refreshes its LiveListener row every LIVE_HEARTBEAT seconds,
+# and writers store events only while some row is younger than
+# LIVE_LISTENER_TIMEOUT (checked at most once per poll interval). run_tasks
+# purges old events and dead listeners with live.purge().
+#
+# The hub lives on the server's event loop; publishers in other threads (sync
+# views, the like flusher) reach it with call_soon_threadsafe. An idle stream
+# costs one Subscription (slots, id arrays), its suspended generator and a
+# future: there are no per-stream timers, one hub task wakes every stream for
+# its keepalive each LIVE_KEEPALIVE seconds. Streams end after the first tick
+# past LIVE_MAX_SECONDS and the browser reconnects, which also picks up follows
+# changed meanwhile.
+
+log = logging.getLogger(__name__)
+
+TWEET = LiveEvent.TWEET
+COUNTS = LiveEvent.COUNTS
+
+
+def enabled():
+    return getattr(settings, "LIVE_UPDATES", True)
+
+
+def max_tweets():
+    return getattr(settings, "LIVE_MAX_TWEETS", 100)
+
+
+class Subscription:
+    """One open stream: what it listens to and what it has not been sent yet."""
+
+    __slots__ = ("profile_id", "authors", "tweets", "new_tweets", "counts", "waiter")
+
+    def __init__(self, profile_id, authors, tweets):
+        self.profile_id = profile_id
+        self.authors = authors
+        self.tweets = tweets
+        self.new_tweets = 0
+        # {tweet_id: [likes, comments]}, only once there is something to send
+        self.counts = None
+        self.waiter = None
+
+    def add(self, event):
+        if event["kind"] == TWEET:
+            self.new_tweets += 1
+        else:
+            if self.counts is None:
+                self.counts = {}
+            delta = self.counts.setdefault(event["tweet"], [0, 0])
+            delta[0] += event["likes"]
+            delta[1] += event["comments"]
+        self.wake()
+
+    def take(self):
+        """The pending update, or None; what is taken is not sent again."""
+        counts = {
+            str(tweet_id): {"likes": likes, "comments": comments}
+            for tweet_id, (likes, comments) in (self.counts or {}).items() if likes or comments
+        }
+        if not self.new_tweets and not counts:
+            self.counts = None
+            return None
+        update = {"new_tweets": self.new_tweets, "tweets": counts}
+        self.new_tweets, self.counts = 0, None
+        return update
+
+    def wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def next(self):
+        """Wait for an update, or the hub's next keepalive tick (None)."""
+        if not self.new_tweets and not self.counts:
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+        return self.take()
+
+
+class Hub:
+    def __init__(self):
+        self.loop = None
+        self.subscriptions = set()
+        # followed profile id / tweet id -> subscriptions
+        self.by_author = {}
+        self.by_tweet = {}
+        self.ticker = None
+
+    @property
+    def count(self):
+        return len(self.subscriptions)
+
+    def subscribe(self, profile_id, authors, tweets):
+        """Register a stream; call from the event loop that serves it."""
+        self.loop = asyncio.get_running_loop()
+        subscription = Subscription(profile_id, array("q", authors), array("q", tweets))
+        self.subscriptions.add(subscription)
+        for author in subscription.authors:
+            self.by_author.setdefault(author, set()).add(subscription)
+        for tweet_id in subscription.tweets:
+            self.by_tweet.setdefault(tweet_id, set()).add(subscription)
+        if self.ticker is None or self.ticker.done():
+            self.ticker = self.loop.create_task(self.tick())
+        backend().start(self)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+        for index, keys in ((self.by_author, subscription.authors), (self.by_tweet, subscription.tweets)):
+            for key in keys:
+                subscriptions = index.get(key)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del index[key]
+        if not self.subscriptions:
+            if self.ticker is not None:
+                self.ticker.cancel()
+                self.ticker = None
+            backend().stop()
+
+    async def tick(self):
+        """Wake every stream each LIVE_KEEPALIVE seconds, one timer for all of them."""
+        while self.subscriptions:
+            await asyncio.sleep(getattr(settings, "LIVE_KEEPALIVE", 25))
+            for subscription in list(self.subscriptions):
+                subscription.wake()
+
+    def dispatch(self, event):
+        """Add ``event`` to the matching subscriptions; runs on the hub's loop."""
+        if event["kind"] == TWEET:
+            for subscription in self.by_author.get(event["author"], ()):
+                # your own tweets are on the page you posted them from
+                if subscription.profile_id != event["author"]:
+                    subscription.add(event)
+        else:
+            for subscription in self.by_tweet.get(event["tweet"], ()):
+                subscription.add(event)
+
+    def deliver(self, event):
+        """dispatch() from any thread."""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.dispatch(event)
+        else:
+            loop.call_soon_threadsafe(self.dispatch, event)
+
+
+hub = Hub()
+
+
+# ---------------------------------------------------------
+# BACKENDS
+# ---------------------------------------------------------
+class MemoryBackend:
+    """Events go straight to this process's hub (a single ASGI process)."""
+
+    def listening(self):
+        return hub.count > 0
+
+    def publish(self, event):
+        hub.deliver(event)
+
+    def start(self, hub):
+        pass
+
+    def stop(self):
+        pass
+
+
+class DatabaseBackend:
+    """Events go through the LiveEvent table, polled by every process with streams open."""
+
+    def __init__(self):
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.last_id = None
+        self.task = None
+        self.beat_at = 0
+        # (monotonic time of the check, whether anyone listened)
+        self.checked = (None, False)
+
+    def listening(self):
+        checked_at, listeners = self.checked
+        if checked_at is None or time.monotonic() - checked_at >= getattr(settings, "LIVE_POLL_INTERVAL", 1.0):
+            since = timezone.now() - timedelta(seconds=listener_timeout())
+            listeners = LiveListener.objects.filter(seen_at__gte=since).exists()
+            self.checked = (time.monotonic(), listeners)
+        return listeners
+
+    def publish(self, event):
+        LiveEvent.objects.create(
+            kind=event["kind"], tweet_id=event["tweet"], author_id=event.get("author"),
+            likes=event.get("likes", 0), comments=event.get("comments", 0),
+        )
+
+    def start(self, hub):
+        if self.task is None or self.task.done():
+            self.last_id = None
+            self.task = asyncio.get_running_loop().create_task(self.run(hub))
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+            self.beat_at = 0
+            asyncio.get_running_loop().create_task(LiveListener.objects.filter(name=self.name).adelete())
+
+    async def run(self, hub):
+        interval = getattr(settings, "LIVE_POLL_INTERVAL", 1.0)
+        await self.beat()
+        # streams only get what happens after they open
+        self.last_id = await LiveEvent.objects.order_by("-id").values_list("id", flat=True).afirst() or 0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.beat()
+                await self.poll(hub)
+            except Exception:
+                log.exception("live event poll failed")
+
+    async def beat(self):
+        """Refresh this process's LiveListener row every LIVE_HEARTBEAT seconds."""
+        if time.monotonic() - self.beat_at < getattr(settings, "LIVE_HEARTBEAT", 5):
+            return
+        self.beat_at = time.monotonic()
+        await LiveListener.objects.aupdate_or_create(name=self.name, defaults={"seen_at": timezone.now()})
+
+    async def poll(self, hub):
+        """Dispatch the events stored since the last poll; returns how many."""
+        events = LiveEvent.objects.filter(id__gt=self.last_id or 0).order_by("id")
+        polled = 0
+        async for row in events[:getattr(settings, "LIVE_POLL_BATCH", 1000)]:
+            hub.dispatch({
+                "kind": row.kind, "tweet": row.tweet_id, "author": row.author_id,
+                "likes": row.likes, "comments": row.comments,
+            })
+            self.last_id = row.id
+            polled += 1
+        return polled
+
+
+def listener_timeout():
+    return getattr(settings, "LIVE_LISTENER_TIMEOUT", 3 * getattr(settings, "LIVE_HEARTBEAT", 5))
+
+
+def purge():
+    """Delete LiveEvent rows older than LIVE_EVENT_RETENTION and listeners that stopped beating.
+
+    Run periodically by run_tasks, whether or not any process is polling.
+    """
+    now = timezone.now()
+    events, _ = LiveEvent.objects.filter(
+        created_at__lt=now - timedelta(seconds=getattr(settings, "LIVE_EVENT_RETENTION", 60)),
+    ).delete()
+    LiveListener.objects.filter(seen_at__lt=now - timedelta(seconds=listener_timeout())).delete()
+    return events
+
+
+_backends = {}
+
+
+def backend():
+    path = getattr(settings, "LIVE_BACKEND", "twitter.live.MemoryBackend")
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+# ---------------------------------------------------------
+# PUBLISHING
+# ---------------------------------------------------------
+def send(event):
+    current = backend()
+    if current.listening():
+        current.publish(event)
+
+
+def counts_changed(tweet_id, likes=0, comments=0):
+    """Publish a counter change of a tweet once the current transaction commits."""
+    if enabled() and (likes or comments):
+        event = {"kind": COUNTS, "tweet": tweet_id, "likes": likes, "comments": comments}
+        transaction.on_commit(lambda: send(event), robust=True)
+
+
+def _tweet_posted(tweet_id, user_id):
+    current = backend()
+    if current.listening():
+        author = Profile.objects.filter(user_id=user_id).values_list("id", flat=True).first()
+        current.publish({"kind": TWEET, "tweet": tweet_id, "author": author})
+
+
+def tweet_saved(sender, instance, created, **kwargs):
+    if created and enabled():
+        transaction.on_commit(lambda: _tweet_posted(instance.id, instance.user_id), robust=True)
+
+
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counts_changed(instance.tweet_id, comments=1)
+
+
+def comment_deleted(sender, comment, **kwargs):
+    counts_changed(comment.tweet_id, comments=-1)
+
+
+post_save.connect(tweet_saved, sender=Tweet)
+post_save.connect(comment_saved, sender=Comment)
+comment_removed.connect(comment_deleted, sender=Comment)
+
+
+# ---------------------------------------------------------
+# STREAM
+# ---------------------------------------------------------
+def _format(update):
+    return f"event: update\ndata: {json.dumps(update, separators=(',', ':'))}\n\n"
+
+
+async def events(profile_id, authors, tweet_ids):
+    """The text/event-stream of one client; subscribes once iteration starts."""
+    subscription = hub.subscribe(profile_id, authors, tweet_ids)
+    try:
+        deadline = time.monotonic() + getattr(settings, "LIVE_MAX_SECONDS", 300)
+        # reconnect after this long when the stream ends or breaks
+        yield f"retry: {getattr(settings, 'LIVE_RETRY_MS', 3000)}\n\n"
+        while time.monotonic() < deadline:
+            update = await subscription.next()
+            # a comment line keeps proxies from closing an idle connection
+            yield _format(update) if update else ": keepalive\n\n"
+    finally:
+        hub.unsubscribe(subscription)
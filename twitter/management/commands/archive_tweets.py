@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from twitter import archive
+from twitter.models import Tweet
+
+
+class Command(BaseCommand):
+    help = (
+        "Move tweets older than ARCHIVE_AFTER_DAYS, with their comments and likes, to the archive "
+        "tables, oldest first, one short transaction per batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Archive tweets older than this (default ARCHIVE_AFTER_DAYS).")
+        parser.add_argument("--batch-size", type=int, help="Tweets per transaction (default ARCHIVE_BATCH_SIZE).")
+        parser.add_argument("--limit", type=int, help="Stop after this many tweets.")
+        parser.add_argument("--pause", type=float, default=0.05, help="Seconds to wait between batches.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the tweets that would move.")
+
+    def handle(self, *args, **options):
+        before = archive.cutoff(options["days"])
+        if options["dry_run"]:
+            count = Tweet.objects.filter(created_at__lt=before).count()
+            self.stdout.write(self.style.SUCCESS(f"{count} tweets older than {before:%Y-%m-%d %H:%M} would be archived."))
+            return
+
+        moved = batches = 0
+        for ids in archive.archive(before, options["batch_size"], options["limit"], options["pause"]):
+            moved += len(ids)
+            batches += 1
+            if options["verbosity"] > 1:
+                self.stdout.write(f"batch {batches}: {len(ids)} tweets (up to id {max(ids)})")
+        self.stdout.write(self.style.SUCCESS(f"{moved} tweets archived in {batches} batches."))
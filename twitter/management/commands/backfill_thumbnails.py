@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from twitter import thumbnails
+from twitter.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Generate avatar thumbnails for profiles uploaded before the thumbnail pipeline."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Also re-check profiles that already have thumbnails.")
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(profile_image="").exclude(profile_image__isnull=True)
+        if not options["all"]:
+            profiles = profiles.filter(avatar_hash="")
+
+        done = failed = 0
+        for profile_id in profiles.order_by("id").values_list("id", flat=True).iterator():
+            try:
+                thumbnails.generate(profile_id)
+                done += 1
+            except (OSError, ValueError) as exc:
+                failed += 1
+                self.stderr.write(f"profile {profile_id}: {exc}")
+
+        self.stdout.write(self.style.SUCCESS(f"{done} profiles processed, {failed} failed."))
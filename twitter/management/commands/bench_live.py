@@ -0,0 +1,54 @@
+import asyncio
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from twitter import live
+
+
+class Command(BaseCommand):
+    help = (
+        "Open idle live update streams on one event loop and report the memory each one "
+        "holds and how long an event takes to reach all of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=10000)
+        parser.add_argument("--follows", type=int, default=200, help="Profiles each stream follows.")
+        parser.add_argument("--tweets", type=int, default=20, help="Tweets on screen per stream.")
+
+    def handle(self, *args, **options):
+        asyncio.run(self.measure(options["connections"], options["follows"], options["tweets"]))
+
+    async def measure(self, connections, follows, tweets):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        # viewers follow overlapping sets of profiles and look at overlapping pages
+        streams = [
+            live.events(n, range(n % 1000, n % 1000 + follows), range(n % 500, n % 500 + tweets))
+            for n in range(connections)
+        ]
+        for stream in streams:
+            await anext(stream)
+        # each connection waits in its own task, as it does under the ASGI server
+        waiting = [asyncio.ensure_future(anext(stream)) for stream in streams]
+        await asyncio.sleep(0)
+        per_stream = (tracemalloc.get_traced_memory()[0] - before) / connections
+        tracemalloc.stop()
+        self.stdout.write(f"{connections} idle streams: {per_stream / 1024:.2f} KiB each")
+
+        started = time.perf_counter()
+        live.hub.deliver({"kind": live.COUNTS, "tweet": 500, "likes": 1, "comments": 0})
+        live.hub.deliver({"kind": live.TWEET, "tweet": 0, "author": 999})
+        # the woken streams run before this task gets the loop back
+        await asyncio.sleep(0)
+        elapsed = (time.perf_counter() - started) * 1000
+        reached = sum(1 for task in waiting if task.done())
+        self.stdout.write(f"2 events reached {reached} streams in {elapsed:.1f} ms")
+
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+        for stream in streams:
+            await stream.aclose()
@@ -0,0 +1,85 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from twitter import ratelimit
+
+from .bench_search import _percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer the rate limiter from concurrent threads and report check latency and how "
+        "many requests were let through compared to what the buckets allow."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--clients", type=int, default=4, help="Distinct users/IPs sharing the threads.")
+        parser.add_argument("--rate", default="50/s", help='Bucket rate, as in RATE_LIMITS ("50/s").')
+        parser.add_argument("--seconds", type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        rate, clients = options["rate"], options["clients"]
+        capacity, refill = ratelimit.parse_rate(rate)
+        # same shape as a view check: one bucket for the user and one for the IP
+        buckets = [
+            [(f"rl:bench:user:{client}", rate), (f"rl:bench:ip:{client}", rate)]
+            for client in range(clients)
+        ]
+        ratelimit._cache().delete_many([key for pair in buckets for key, _ in pair])
+
+        # the cost of a check on its own, before the threads start competing for the GIL and the lock
+        solo = []
+        for n in range(2000):
+            started = time.perf_counter()
+            ratelimit.consume([(f"rl:bench:solo:{n % 100}", rate)])
+            solo.append((time.perf_counter() - started) * 1_000_000)
+        self.stdout.write(
+            f"single thread: p50 {_percentile(solo, 50):.0f} us, p99 {_percentile(solo, 99):.0f} us per check"
+        )
+
+        timings, allowed = [], [0] * clients
+        lock = threading.Lock()
+        deadline = time.monotonic() + options["seconds"]
+
+        def worker(number):
+            mine, passed = [], [0] * clients
+            n = number
+            while time.monotonic() < deadline:
+                client = n % clients
+                started = time.perf_counter()
+                wait = ratelimit.consume(buckets[client])
+                mine.append((time.perf_counter() - started) * 1_000_000)
+                passed[client] += not wait
+                n += 1
+            with lock:
+                timings.extend(mine)
+                for client, count in enumerate(passed):
+                    allowed[client] += count
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(options["threads"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        ceiling = capacity + refill * elapsed
+        self.stdout.write(
+            f"{len(timings)} checks in {elapsed:.1f}s from {options['threads']} threads "
+            f"({len(timings) / elapsed:.0f}/s) | p50 {_percentile(timings, 50):.0f} us, "
+            f"p99 {_percentile(timings, 99):.0f} us, max {max(timings):.0f} us"
+        )
+        for client, count in enumerate(allowed):
+            self.stdout.write(f"client {client}: {count} allowed, bucket allows at most {ceiling:.0f}")
+
+        if _percentile(solo, 99) >= 1000:
+            self.stdout.write(self.style.WARNING("p99 single-thread check latency is above 1 ms"))
+        if max(allowed) > ceiling + 1:
+            self.stdout.write(self.style.WARNING("more requests passed than the rate allows"))
+        ratelimit._cache().delete_many(
+            [key for pair in buckets for key, _ in pair] + [f"rl:bench:solo:{n}" for n in range(100)]
+        )
@@ -0,0 +1,78 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from twitter import search
+from twitter.models import Tweet
+
+BENCH_USERNAME = "bench_search"
+
+WORDS = (
+    "django python timeline feed cache index query banco dados busca rede social "
+    "seguir curtir comentario perfil imagem servidor latencia async replica "
+    "tweet thread lote fila worker memoria disco rede mensagem noticia futebol "
+    "musica filme viagem cafe codigo teste deploy bug release versao"
+).split()
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = "Time ranked search queries, optionally against a generated corpus of synthetic tweets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--generate", type=int, default=0, help="Synthetic tweets to create first.")
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--terms", type=int, default=2, help="Terms per query.")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the synthetic tweets at the end.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        if options["generate"]:
+            self.generate(options["generate"], rng)
+
+        if not Tweet.objects.exists():
+            raise CommandError("there are no tweets to search; use --generate")
+
+        timings, found = [], 0
+        for _ in range(options["queries"]):
+            query = " ".join(rng.sample(WORDS, options["terms"]))
+            started = time.perf_counter()
+            tweets, _cursor = search.search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+            found += bool(tweets)
+
+        self.stdout.write(
+            f"{options['queries']} queries of {options['terms']} terms, {found} with results | "
+            f"mean {statistics.mean(timings):.1f} ms, p50 {_percentile(timings, 50):.1f} ms, "
+            f"p95 {_percentile(timings, 95):.1f} ms, p99 {_percentile(timings, 99):.1f} ms"
+        )
+
+        if options["cleanup"]:
+            # Tweet.user is DO_NOTHING, so the tweets (and their postings) go first
+            Tweet.objects.filter(user__username=BENCH_USERNAME).delete()
+            User.objects.filter(username=BENCH_USERNAME).delete()
+            self.stdout.write("Synthetic tweets removed.")
+
+    def generate(self, total, rng, chunk_size=search.BATCH_SIZE):
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME)
+        created = 0
+        while created < total:
+            size = min(chunk_size, total - created)
+            with transaction.atomic():
+                last = Tweet.objects.filter(user=user).order_by("-id").values_list("id", flat=True).first() or 0
+                Tweet.objects.bulk_create(
+                    Tweet(user=user, body=" ".join(rng.choices(WORDS, k=rng.randint(5, 25))))
+                    for _ in range(size)
+                )
+                # MySQL does not return ids from bulk inserts, so read them back
+                search.index_tweets(Tweet.objects.filter(user=user, id__gt=last).only("id", "body"))
+            created += size
+            self.stdout.write(f"{created} tweets generated...")
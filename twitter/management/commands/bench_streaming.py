@@ -0,0 +1,82 @@
+import statistics
+import time
+import tracemalloc
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import reverse
+
+from twitter.models import Profile
+
+from .bench_views import Command as BenchViews
+
+
+def _fetch(client, url):
+    """(ms to the first byte, ms to the last) for one request, dropping the body as it comes."""
+    started = time.perf_counter()
+    response = client.get(url)
+    if response.status_code >= 400:
+        raise CommandError(f"{url} returned {response.status_code}")
+    chunks = iter(response.streaming_content if response.streaming else [response.content])
+    next(chunks, None)
+    first = time.perf_counter()
+    for _ in chunks:
+        pass
+    response.close()
+    return (first - started) * 1000, (time.perf_counter() - started) * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and compare time to first byte, total time and peak "
+        "memory of the home and profile pages rendered buffered and streamed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--page-size", type=int, default=100, help="Tweets per page (FEED_PAGE_SIZE).")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.measure(options["users"], options["page_size"], options["repeat"])
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+    def measure(self, users, page_size, repeat):
+        call_command("seed", users=users, seed=users, stdout=StringIO())
+        viewer = User.objects.annotate(total=Count("profile__follows")).order_by("-total", "id").first()
+        celebrity = Profile.objects.order_by("-follower_count", "id").first()
+        client = Client()
+        client.force_login(viewer)
+        clear_caches = BenchViews().clear_caches
+
+        pages = [("home", reverse("home")), ("profile", reverse("profile", args=[celebrity.user_id]))]
+        for name, url in pages:
+            for mode, stream in (("buffered", False), ("streamed", True)):
+                with override_settings(STREAM_FEED_VIEWS=stream, FEED_PAGE_SIZE=page_size):
+                    timings = []
+                    for _ in range(repeat):
+                        clear_caches()
+                        timings.append(_fetch(client, url))
+
+                    # tracemalloc slows everything down, so memory gets a run of its own
+                    clear_caches()
+                    tracemalloc.start()
+                    _fetch(client, url)
+                    peak = tracemalloc.get_traced_memory()[1] / 1024
+                    tracemalloc.stop()
+
+                ttfb = statistics.median(first for first, _ in timings)
+                total = statistics.median(last for _, last in timings)
+                self.stdout.write(
+                    f"{name:<8} {mode:<9} ttfb {ttfb:>7.1f} ms  total {total:>7.1f} ms  peak {peak:>7.0f} KiB"
+                )
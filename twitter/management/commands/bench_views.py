@@ -0,0 +1,167 @@
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import reverse
+
+from twitter.models import Profile, Tweet
+
+# Wall times depend on the machine and database, so the baselines store each
+# view's time relative to a reference request timed in the same run (the
+# anonymous login page: middleware and a template, no feed work). Query counts
+# are compared exactly; relative time and peak memory within --tolerance.
+
+# absolute allowance on top of --tolerance, so millisecond views don't fail on noise
+SLACK_MS = 5
+
+
+def _views(viewer, celebrity, tweet):
+    """(name, method, url) for every benchmarked view."""
+    return [
+        ("home", "get", reverse("home")),
+        ("profile", "get", reverse("profile", args=[celebrity.user_id])),
+        ("followers", "get", reverse("followers", args=[viewer.id])),
+        ("tweet_like", "get", reverse("tweet_like", args=[tweet.id])),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database at several sizes and report query count, wall time and "
+        "peak memory per view; fails when a view regresses against the stored baselines."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100,1000", help="Comma separated user counts to seed.")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed requests per view.")
+        parser.add_argument("--baseline", default=getattr(settings, "BENCH_BASELINE_FILE", None))
+        parser.add_argument("--update-baseline", action="store_true", help="Store this run as the baseline.")
+        parser.add_argument("--tolerance", type=float, default=0.5,
+                            help="Allowed relative growth of time and memory before failing (0.5 = +50%%).")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+
+        # everything runs in a test database, so the configured one is never touched
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+        # reference request time per size, in ms (machine-local, never stored)
+        self.references = {}
+        try:
+            results = {str(size): self.measure(size, options["repeat"]) for size in sizes}
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        path = options["baseline"]
+        if options["update_baseline"]:
+            if not path:
+                raise CommandError("no --baseline file given")
+            stored = self.load(path)
+            stored.update(results)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(stored, f, indent=2, sort_keys=True)
+                f.write("\n")
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {path}."))
+            return
+
+        regressions = self.compare(results, self.load(path) if path else {}, options["tolerance"])
+        if regressions:
+            raise CommandError("regressions:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions."))
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def measure(self, size, repeat):
+        call_command("flush", interactive=False, verbosity=0)
+        call_command("seed", users=size, seed=size, stdout=StringIO())
+
+        viewer = User.objects.annotate(total=Count("profile__follows")).order_by("-total", "id").first()
+        celebrity = Profile.objects.order_by("-follower_count", "id").first()
+        tweet = Tweet.objects.order_by("-like_count", "id").first()
+        client = Client(HTTP_REFERER="/")
+        client.force_login(viewer)
+
+        reference, _ = self.time(Client().get, reverse("login"), repeat)
+        self.references[str(size)] = reference
+        results = {}
+        self.stdout.write(f"{size:>7} users  {'reference':<11} {reference:>22.1f} ms")
+        for name, method, url in _views(viewer, celebrity, tweet):
+            request = getattr(client, method)
+            ms, queries = self.time(request, url, repeat, name)
+
+            # tracemalloc slows everything down, so memory gets a run of its own
+            self.clear_caches()
+            tracemalloc.start()
+            request(url)
+            peak = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+
+            results[name] = {
+                "queries": queries,
+                "relative": round(ms / reference, 2),
+                "peak_kib": round(peak),
+            }
+            self.stdout.write(
+                f"{size:>7} users  {name:<11} {queries:>4} queries  {ms:>8.1f} ms "
+                f"(x{results[name]['relative']:.2f})  {results[name]['peak_kib']:>7} KiB"
+            )
+        return results
+
+    def time(self, request, url, repeat, name="reference"):
+        """(median ms, most queries) of ``repeat`` cold requests."""
+        timings, queries = [], 0
+        for _ in range(repeat):
+            self.clear_caches()
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as ctx:
+                response = request(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, len(ctx.captured_queries))
+            if response.status_code >= 400:
+                raise CommandError(f"{name} returned {response.status_code}")
+        return statistics.median(timings), queries
+
+    def clear_caches(self):
+        # cold caches, so every run does the full work
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        for size, views in results.items():
+            reference = self.references[size]
+            for name, current in views.items():
+                expected = baseline.get(size, {}).get(name)
+                if not expected:
+                    continue
+                if current["queries"] > expected["queries"]:
+                    regressions.append(
+                        f"{size} users, {name}: {current['queries']} queries (baseline {expected['queries']})"
+                    )
+                for metric, slack in (("relative", SLACK_MS / reference), ("peak_kib", 0)):
+                    if metric in expected and current[metric] > expected[metric] * (1 + tolerance) + slack:
+                        regressions.append(
+                            f"{size} users, {name}: {current[metric]} {metric} (baseline {expected[metric]})"
+                        )
+        return regressions
@@ -0,0 +1,122 @@
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"server on port {port} did not start")
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Start the app under WSGI (runserver) and ASGI (uvicorn) against the configured "
+        "database and compare feed latency under concurrent clients."
+    )
+
+    servers = {
+        "wsgi": lambda port: ["manage.py", "runserver", f"127.0.0.1:{port}", "--noreload"],
+        "asgi": lambda port: ["-m", "uvicorn", "setup.asgi:application",
+                              "--port", str(port), "--log-level", "warning"],
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username", required=True, help="User whose feed is requested.")
+        parser.add_argument("--path", action="append", help="Paths to request (default: home and own profile).")
+        parser.add_argument("--clients", type=int, default=10)
+        parser.add_argument("--requests", type=int, default=200, help="Requests per server.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"user {options['username']!r} does not exist")
+
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        cookie = f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+
+        paths = options["path"] or ["/", f"/profile/{user.pk}"]
+        try:
+            for name in ("wsgi", "asgi"):
+                self.run_server(name, paths, cookie, options)
+        finally:
+            session.delete()
+
+    def run_server(self, name, paths, cookie, options):
+        port = _free_port()
+        env = dict(os.environ, ASYNC_FEED_VIEWS="1" if name == "asgi" else "0")
+        server = subprocess.Popen(
+            [sys.executable, *self.servers[name](port)],
+            cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_for(port)
+            urls = [f"http://127.0.0.1:{port}{path}" for path in paths]
+            # warm up connections, caches and imports before timing
+            for url in urls:
+                self.fetch(url, cookie)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["clients"]) as pool:
+                results = list(pool.map(
+                    lambda i: self.fetch(urls[i % len(urls)], cookie), range(options["requests"])
+                ))
+            elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait()
+
+        latencies = [ms for ok, ms in results if ok]
+        errors = len(results) - len(latencies)
+        if not latencies:
+            raise CommandError(f"{name}: every request failed")
+        self.stdout.write(
+            f"{name}: {len(results)} req, {options['clients']} clients, {errors} errors | "
+            f"mean {statistics.mean(latencies):.1f} ms, p50 {_percentile(latencies, 50):.1f} ms, "
+            f"p95 {_percentile(latencies, 95):.1f} ms, p99 {_percentile(latencies, 99):.1f} ms | "
+            f"{len(results) / elapsed:.1f} req/s"
+        )
+
+    def fetch(self, url, cookie):
+        request = urllib.request.Request(url, headers={"Cookie": cookie})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                ok = response.status == 200
+        except OSError:
+            ok = False
+        return ok, (time.perf_counter() - started) * 1000
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from twitter import suggestions
+
+
+class Command(BaseCommand):
+    help = "Precompute friends-of-friends \"who to follow\" suggestions for every profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        profiles = rows = 0
+        for batch_profiles, batch_rows in suggestions.compute(options["batch_size"]):
+            profiles += batch_profiles
+            rows += batch_rows
+            self.stdout.write(f"{profiles} profiles processed...")
+
+        self.stdout.write(self.style.SUCCESS(f"{rows} suggestions stored for {profiles} profiles."))
@@ -0,0 +1,87 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import reverse
+
+from twitter import explain
+from twitter.models import Comment, Profile, Tweet
+
+from .bench_views import Command as BenchViews
+
+
+def plan_views(viewer, celebrity, tweet):
+    """(name, url) for every view whose queries are explained."""
+    return [
+        ("home", reverse("home")),
+        ("home (page 2)", None),
+        ("profile", reverse("profile", args=[celebrity.user_id])),
+        ("followers", reverse("followers", args=[celebrity.user_id])),
+        ("follows", reverse("follows", args=[viewer.id])),
+        ("tweet_comments", reverse("tweet_comments", args=[tweet.id])),
+        ("search", reverse("search") + "?q=django"),
+    ]
+
+
+def explain_views(client, views, clear_caches=lambda: None):
+    """{view name: [(sql, problems)]}; a view's next page is fetched when its url is None."""
+    report, next_url = {}, None
+    for name, url in views:
+        url = url or next_url
+        if not url:
+            continue
+        clear_caches()
+        with explain.PlanRecorder().capture() as recorder:
+            response = client.get(url)
+        if response.status_code >= 400:
+            raise CommandError(f"{name} returned {response.status_code}")
+        cursor = (response.context or {}).get("next_cursor")
+        next_url = f"{url.split('?')[0]}?cursor={cursor}" if cursor else None
+        report[name] = explain.check(recorder)
+    return report
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and EXPLAIN every query of the main views; fails when "
+        "a query reads a whole table or sorts outside an index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            report = self.explain(options["users"])
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        failures = 0
+        for name, queries in report.items():
+            self.stdout.write(f"{name}: {'ok' if not queries else f'{len(queries)} bad plan(s)'}")
+            for sql, problems in queries:
+                failures += 1
+                for problem, where in problems:
+                    self.stdout.write(f"  {problem}: {where}")
+                self.stdout.write(f"    {sql}")
+        if failures:
+            raise CommandError(f"{failures} queries with full scans or filesorts")
+        self.stdout.write(self.style.SUCCESS("All plans use indexes."))
+
+    def explain(self, users):
+        call_command("seed", users=users, seed=users, stdout=StringIO())
+        viewer = User.objects.annotate(total=Count("profile__follows")).order_by("-total", "id").first()
+        celebrity = Profile.objects.order_by("-follower_count", "id").first()
+        tweet = Comment.objects.values("tweet").annotate(total=Count("id")).order_by("-total").first()
+        client = Client()
+        client.force_login(viewer)
+        return explain_views(
+            client, plan_views(viewer, celebrity, Tweet(id=tweet["tweet"])), BenchViews().clear_caches,
+        )
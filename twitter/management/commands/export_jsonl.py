@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from twitter import transfer
+
+
+class Command(BaseCommand):
+    help = "Stream users, profiles, tweets, comments, follows and likes to a JSONL file (.gz to compress)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Output file, or - for stdout.")
+        parser.add_argument("--types", default=",".join(transfer.KINDS),
+                            help="Comma separated record types to export, in order.")
+        parser.add_argument("--chunk-size", type=int, default=transfer.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        kinds = [kind.strip() for kind in options["types"].split(",") if kind.strip()]
+        unknown = set(kinds) - set(transfer.KINDS)
+        if unknown:
+            raise CommandError(f"unknown types: {', '.join(sorted(unknown))}")
+
+        lines = transfer.export_records(kinds, options["chunk_size"])
+        if options["path"] == "-":
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+
+        total = 0
+        with transfer.open_file(options["path"], "w") as out:
+            for line in lines:
+                out.write(line)
+                total += 1
+        self.stdout.write(self.style.SUCCESS(f"{total} records exported to {options['path']}."))
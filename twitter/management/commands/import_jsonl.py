@@ -0,0 +1,54 @@
+import os
+from collections import Counter
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from twitter import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import a JSONL file written by export_jsonl, chunk by chunk, keeping primary keys. "
+        "Rows that already exist are skipped and progress is checkpointed, so it can be resumed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--chunk-size", type=int, default=transfer.CHUNK_SIZE)
+        parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint of a previous run.")
+        parser.add_argument("--skip-derived", action="store_true",
+                            help="Do not recount tweets or rebuild timelines and the search index afterwards.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+
+        start = 0 if options["restart"] else transfer.read_checkpoint(path)
+        if start:
+            self.stdout.write(f"Resuming after line {start}.")
+
+        totals = Counter()
+        with transfer.open_file(path, "r") as lines:
+            try:
+                for kind, rows in transfer.import_records(
+                    lines, options["chunk_size"], start,
+                    checkpoint=lambda line: transfer.write_checkpoint(path, line),
+                ):
+                    totals[kind] += rows
+                    self.stdout.write(f"{totals[kind]} {kind} records processed...")
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        created = transfer.create_missing_profiles(options["chunk_size"])
+        if created:
+            self.stdout.write(f"{created} missing profiles created.")
+        if not options["skip_derived"]:
+            for command in ("recount_tweets", "rebuild_timelines", "rebuild_search_index"):
+                call_command(command, stdout=self.stdout)
+
+        if os.path.exists(transfer.checkpoint_path(path)):
+            os.remove(transfer.checkpoint_path(path))
+        summary = ", ".join(f"{rows} {kind}" for kind, rows in totals.items()) or "nothing"
+        self.stdout.write(self.style.SUCCESS(f"Processed {summary}."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from twitter import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the search index from every tweet and comment."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=search.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild(options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"{indexed} tweets and comments indexed."))
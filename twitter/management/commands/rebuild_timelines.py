@@ -0,0 +1,28 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from twitter import timeline
+
+
+class Command(BaseCommand):
+    help = "Rebuild every materialized home timeline (and follower counts) from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only rebuild the timeline of this user id.")
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("pk")
+        if options["user"]:
+            users = users.filter(pk=options["user"])
+
+        timeline.refresh_follower_counts()
+
+        total = 0
+        for user in users.only("pk").iterator(chunk_size=options["chunk_size"]):
+            with transaction.atomic():
+                timeline.rebuild(user)
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{total} timelines rebuilt."))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from twitter.models import Comment, Tweet
+
+
+def _count(queryset):
+    return Coalesce(
+        Subquery(queryset.order_by().values("tweet").annotate(total=Count("*")).values("total")),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = "Recount Tweet.like_count / comment_count and repair any drift, in chunks of tweet ids."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Only report drifted tweets.")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        last_id = Tweet.objects.aggregate(last=Max("id"))["last"] or 0
+
+        likes = _count(Tweet.likes.through.objects.filter(tweet=OuterRef("pk")))
+        comments = _count(Comment.objects.filter(tweet=OuterRef("pk")))
+
+        repaired = 0
+        for start in range(0, last_id + 1, chunk_size):
+            drifted = list(
+                Tweet.objects.filter(id__gte=start, id__lt=start + chunk_size)
+                .annotate(real_likes=likes, real_comments=comments)
+                .filter(~Q(like_count=F("real_likes")) | ~Q(comment_count=F("real_comments")))
+                .only("id", "like_count", "comment_count")
+            )
+            if not drifted:
+                continue
+
+            for tweet in drifted:
+                tweet.like_count = tweet.real_likes
+                tweet.comment_count = tweet.real_comments
+            repaired += len(drifted)
+
+            if not options["dry_run"]:
+                with transaction.atomic():
+                    Tweet.objects.bulk_update(drifted, ["like_count", "comment_count"])
+
+        verb = "would be repaired" if options["dry_run"] else "repaired"
+        self.stdout.write(self.style.SUCCESS(f"{repaired} tweets {verb}."))
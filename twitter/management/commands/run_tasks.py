@@ -0,0 +1,60 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from twitter import live, tasks
+
+
+def _run(task):
+    try:
+        return tasks.run(task)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks (see twitter.tasks) with a pool of worker threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Worker threads; 1 runs tasks inline.")
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Exit once no task is due.")
+        parser.add_argument("--stats-every", type=float, default=60, help="Seconds between queue stats lines.")
+
+    def handle(self, *args, **options):
+        workers = max(options["workers"], 1)
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="task") if workers > 1 else None
+        run = pool.map if pool else map
+        last_report = 0
+        self.processed = {}
+
+        try:
+            while True:
+                if time.monotonic() - last_report >= options["stats_every"]:
+                    tasks.requeue_stale()
+                    tasks.purge()
+                    live.purge()
+                    self.report()
+                    last_report = time.monotonic()
+
+                batch = tasks.claim(workers * 2)
+                if batch:
+                    for status in run(_run, batch):
+                        self.processed[status] = self.processed.get(status, 0) + 1
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["poll"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if pool:
+                pool.shutdown()
+            self.report()
+
+    def report(self):
+        depth = " ".join(f"{name}={value}" for name, value in tasks.stats().items())
+        done = " ".join(f"{name}={value}" for name, value in sorted(self.processed.items())) or "none"
+        self.stdout.write(f"queue: {depth} | processed: {done}")
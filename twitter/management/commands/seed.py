@@ -0,0 +1,138 @@
+import random
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from twitter.models import Comment, Profile, Tweet
+
+WORDS = (
+    "hoje amanha ontem cafe codigo django python feed rede social timeline busca "
+    "futebol musica filme serie viagem praia trabalho reuniao deploy bug teste "
+    "release versao banco dados cache fila worker servidor noticia foto livro"
+).split()
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-create synthetic users, profiles, power-law follows, tweets, likes and comments "
+        "for benchmarking, then rebuild the derived data (counters, timelines, search index)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--follows", type=float, default=20, help="Mean follows per user.")
+        parser.add_argument("--tweets", type=float, default=10, help="Mean tweets per user.")
+        parser.add_argument("--likes", type=float, default=3, help="Mean likes per tweet.")
+        parser.add_argument("--comments", type=float, default=1, help="Mean comments per tweet.")
+        parser.add_argument("--alpha", type=float, default=1.2,
+                            help="Power-law exponent of user popularity (follows and likes received).")
+        parser.add_argument("--prefix", default="seed", help="Username prefix of the generated users.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, for repeatable data sets.")
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if User.objects.filter(username__startswith=f"{prefix}_").exists():
+            raise CommandError(f"users named {prefix}_* already exist; pick another --prefix")
+
+        self.rng = random.Random(options["seed"])
+        user_ids = self.create_users(prefix, options["users"])
+        # Popularity follows a power law over a random ranking of the users
+        self.popular = self.rng.sample(user_ids, len(user_ids))
+        self.weights = list(accumulate(1 / (rank + 1) ** options["alpha"] for rank in range(len(user_ids))))
+
+        profile_ids = self.create_profiles(user_ids)
+        follows = self.create_follows(user_ids, profile_ids, options["follows"])
+        tweet_ids = self.create_tweets(user_ids, options["tweets"])
+        likes = self.create_likes(tweet_ids, options["likes"])
+        comments = self.create_comments(tweet_ids, options["comments"])
+
+        self.stdout.write(
+            f"{len(user_ids)} users, {follows} follows, {len(tweet_ids)} tweets, "
+            f"{likes} likes, {comments} comments created."
+        )
+
+        # bulk_create sends no signals: bring counters, timelines and search up to date
+        for command in ("recount_tweets", "rebuild_timelines", "rebuild_search_index"):
+            call_command(command, stdout=self.stdout)
+
+    def _count(self, mean):
+        return round(self.rng.expovariate(1 / mean)) if mean > 0 else 0
+
+    def _pick(self, count, exclude=None):
+        """``count`` distinct users drawn by popularity."""
+        # capped at half the users so rejection sampling stays cheap
+        count = min(count, len(self.popular) // 2)
+        picked = set()
+        while len(picked) < count:
+            for user_id in self.rng.choices(self.popular, cum_weights=self.weights, k=count - len(picked)):
+                if user_id != exclude:
+                    picked.add(user_id)
+        return picked
+
+    def create_users(self, prefix, total):
+        password = make_password("senha123")
+        names = [f"{prefix}_{i}" for i in range(total)]
+        with transaction.atomic():
+            User.objects.bulk_create(
+                (User(username=name, password=password, email=f"{name}@example.com") for name in names),
+                batch_size=BATCH_SIZE,
+            )
+        # read the ids back: MySQL does not return them from bulk inserts
+        return list(User.objects.filter(username__in=names).order_by("id").values_list("id", flat=True))
+
+    def create_profiles(self, user_ids):
+        Follows = Profile.follows.through
+        with transaction.atomic():
+            Profile.objects.bulk_create((Profile(user_id=pk) for pk in user_ids), batch_size=BATCH_SIZE)
+            profile_ids = dict(Profile.objects.filter(user_id__in=user_ids).values_list("user_id", "id"))
+            # every user follows themselves, as create_profile does on signup
+            Follows.objects.bulk_create(
+                (Follows(from_profile_id=pk, to_profile_id=pk) for pk in profile_ids.values()),
+                batch_size=BATCH_SIZE,
+            )
+        return profile_ids
+
+    def create_follows(self, user_ids, profile_ids, mean):
+        Follows = Profile.follows.through
+        rows = [
+            Follows(from_profile_id=profile_ids[user_id], to_profile_id=profile_ids[target])
+            for user_id in user_ids
+            for target in self._pick(self._count(mean), exclude=user_id)
+        ]
+        with transaction.atomic():
+            Follows.objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        return len(rows)
+
+    def _body(self):
+        return " ".join(self.rng.choices(WORDS, k=self.rng.randint(3, 20)))[:200]
+
+    def create_tweets(self, user_ids, mean):
+        rows = [Tweet(user_id=user_id, body=self._body()) for user_id in user_ids for _ in range(self._count(mean))]
+        with transaction.atomic():
+            Tweet.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        return list(Tweet.objects.filter(user_id__in=user_ids).values_list("id", flat=True))
+
+    def create_likes(self, tweet_ids, mean):
+        Likes = Tweet.likes.through
+        rows = [Likes(tweet_id=tweet_id, user_id=user_id) for tweet_id in tweet_ids
+                for user_id in self._pick(self._count(mean))]
+        with transaction.atomic():
+            Likes.objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        return len(rows)
+
+    def create_comments(self, tweet_ids, mean):
+        rows = [
+            Comment(tweet_id=tweet_id, user_id=user_id, body=self._body())
+            for tweet_id in tweet_ids
+            for _ in range(self._count(mean))
+            for user_id in self.rng.choices(self.popular, cum_weights=self.weights)
+        ]
+        with transaction.atomic():
+            Comment.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        return len(rows)
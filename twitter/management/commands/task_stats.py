@@ -0,0 +1,20 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from twitter import tasks
+
+
+class Command(BaseCommand):
+    help = "Print background task queue depth (per status, due now, age of the oldest due task)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="One JSON object, for monitoring scripts.")
+
+    def handle(self, *args, **options):
+        stats = tasks.stats()
+        if options["json"]:
+            self.stdout.write(json.dumps(stats))
+            return
+        for name, value in stats.items():
+            self.stdout.write(f"{name:<20} {value}")
@@ -0,0 +1,140 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# Media files (uploads and avatar thumbnails). Responses carry ETag and
+# Last-Modified from the file's stat, answer conditional requests with 304 and
+# single byte ranges with 206. Content-addressed paths (thumbs/) never change,
+# so they are cached as immutable for a year. With MEDIA_SENDFILE_HEADER set the
+# body is left to the front server (X-Sendfile or nginx X-Accel-Redirect).
+
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _etag(stat):
+    return '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+
+
+def _cache_control(path):
+    if path.startswith(tuple(getattr(settings, "MEDIA_IMMUTABLE_PREFIXES", ("thumbs/",)))):
+        return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 60 * 60)}"
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single ``bytes=`` range, False if unsatisfiable, None to ignore."""
+    match = _RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    value = request.headers.get("If-Range")
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    date = parse_http_date_safe(value)
+    return date is not None and date >= mtime
+
+
+def _read(fullpath, start, length):
+    with open(fullpath, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _sendfile(path, fullpath):
+    header = getattr(settings, "MEDIA_SENDFILE_HEADER", "")
+    if not header:
+        return None
+    response = HttpResponse()
+    if header.lower() == "x-accel-redirect":
+        response[header] = getattr(settings, "MEDIA_ACCEL_PREFIX", "/protected-media/") + quote(path)
+    else:
+        response[header] = fullpath
+    # the front server sets the real type and length
+    del response["Content-Type"]
+    return response
+
+
+@require_safe
+def serve(request, path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(fullpath)
+    except (OSError, ValueError):
+        raise Http404("arquivo não encontrado")
+    if not os.path.isfile(fullpath):
+        raise Http404("arquivo não encontrado")
+
+    etag = _etag(stat)
+    mtime = int(stat.st_mtime)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if not_modified is not None:
+        not_modified["Cache-Control"] = _cache_control(path)
+        return not_modified
+
+    response = _sendfile(path, fullpath)
+    if response is None:
+        response = _file_response(request, fullpath, stat.st_size, etag, mtime)
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(mtime)
+    response["Cache-Control"] = _cache_control(path)
+    return response
+
+
+def _file_response(request, fullpath, size, etag, mtime):
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or "application/octet-stream"
+
+    byte_range = None
+    if "Range" in request.headers and _if_range_matches(request, etag, mtime):
+        byte_range = parse_range(request.headers["Range"], size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read(fullpath, start, end - start + 1), status=206,
+                                         content_type=content_type)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+    else:
+        # FileResponse lets the WSGI server use os.sendfile via wsgi.file_wrapper
+        response = FileResponse(open(fullpath, "rb"), content_type=content_type)
+        if encoding:
+            response["Content-Encoding"] = encoding
+
+    response["Accept-Ranges"] = "bytes"
+    return response
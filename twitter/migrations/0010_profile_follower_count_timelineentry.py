@@ -0,0 +1,42 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_followers(apps, schema_editor):
+    Profile = apps.get_model("twitter", "Profile")
+    for profile in Profile.objects.annotate(total=Count("followed_by")).iterator():
+        Profile.objects.filter(pk=profile.pk).update(follower_count=profile.total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter', '0009_comment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+                ('tweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='twitter.tweet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-created_at'], name='timeline_owner_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'tweet'), name='unique_timeline_entry')],
+            },
+        ),
+        migrations.RunPython(count_followers, migrations.RunPython.noop),
+    ]
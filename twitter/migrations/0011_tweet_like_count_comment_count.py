@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:38
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_likes_and_comments(apps, schema_editor):
+    Tweet = apps.get_model("twitter", "Tweet")
+    tweets = Tweet.objects.annotate(
+        likes_total=Count("likes", distinct=True),
+        comments_total=Count("comments", distinct=True),
+    )
+    for tweet in tweets.iterator():
+        Tweet.objects.filter(pk=tweet.pk).update(
+            like_count=tweet.likes_total, comment_count=tweet.comments_total
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter', '0010_profile_follower_count_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tweet',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tweet',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_likes_and_comments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    Tweet = apps.get_model("twitter", "Tweet")
+    Tweet.objects.update(date_modified=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter', '0011_tweet_like_count_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tweet',
+            name='date_modified',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter', '0012_tweet_date_modified'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='follower_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.CreateModel(
+            name='FollowSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('mutuals', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='twitter.profile')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggestions', to='twitter.profile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['profile', '-score'], name='suggestion_profile_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('profile', 'candidate'), name='unique_follow_suggestion')],
+            },
+        ),
+    ]
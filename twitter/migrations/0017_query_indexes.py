@@ -0,0 +1,59 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter', '0016_task'),
+    ]
+
+    operations = [
+        # Profile.follows gets an explicit through model over its existing table;
+        # only the state changes here, the table and its columns stay as they are.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Follow',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('from_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='twitter.profile')),
+                        ('to_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='twitter.profile')),
+                    ],
+                    options={
+                        'db_table': 'twitter_profile_follows',
+                        'unique_together': {('from_profile', 'to_profile')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='profile',
+                    name='follows',
+                    field=models.ManyToManyField(blank=True, related_name='followed_by', through='twitter.Follow', to='twitter.profile'),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['to_profile', 'from_profile'], name='follow_to_from_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tweet',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='tweet_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tweet',
+            index=models.Index(fields=['-created_at', '-id'], name='tweet_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['tweet', '-created_at', '-id'], name='comment_tweet_created_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='timeline_owner_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['owner', '-created_at', '-tweet'], name='timeline_owner_created_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter', '0018_liveevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTweet',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('body', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField()),
+                ('date_modified', models.DateTimeField()),
+                ('like_count', models.PositiveIntegerField(default=0)),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='archived_tweets', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedLike',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('tweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='like_rows', to='twitter.archivedtweet')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedComment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('body', models.TextField(max_length=280)),
+                ('created_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('tweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='twitter.archivedtweet')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedtweet',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='archived_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtweet',
+            index=models.Index(fields=['-created_at', '-id'], name='archived_created_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivedlike',
+            unique_together={('tweet', 'user')},
+        ),
+        migrations.AddIndex(
+            model_name='archivedcomment',
+            index=models.Index(fields=['tweet', '-created_at', '-id'], name='archived_comment_created_idx'),
+        ),
+    ]
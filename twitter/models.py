@@ -1,6 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth. models import User
+from django.db.models import F
+from django.utils import timezone
 from django.db.models.signals import post_save
+from django.dispatch import Signal
+
+# Sent by Tweet.remove_comment once the comment is gone (args: comment)
+comment_removed = Signal()
 
 # Create a tweet model
 class Tweet(models.Model):
@@ -10,13 +16,73 @@ class Tweet(models.Model):
     )
     body = models.CharField(max_length=200)
     created_at = models.DateTimeField(auto_now_add=True)
+    date_modified = models.DateTimeField(auto_now=True)
     likes = models.ManyToManyField(User, related_name="tweet_like", blank=True)
+    # Denormalized counters, updated with F() (see recount_tweets)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    # ArchivedTweet rows are read-only (see twitter.archive)
+    archived = False
 
     def number_of_likes(self):
-        return self.likes.count()
+        return self.like_count
     
     def number_of_comments(self):
-        return self.comments.count()
+        return self.comment_count
+
+    def update_counter(self, field, delta):
+        # Atomic in SQL; never goes below zero and touches date_modified (used by the API's ETags)
+        tweets = Tweet.objects.filter(id=self.id)
+        if delta < 0:
+            tweets = tweets.filter(**{f"{field}__gt": 0})
+        tweets.update(**{field: F(field) + delta, "date_modified": timezone.now()})
+
+    def add_like(self, user):
+        """Like the tweet; returns False if the user already liked it."""
+        with transaction.atomic():
+            _, created = Tweet.likes.through.objects.get_or_create(tweet_id=self.id, user_id=user.id)
+            if created:
+                self.update_counter("like_count", 1)
+        return created
+
+    def remove_like(self, user):
+        """Unlike the tweet; returns False if the user had not liked it."""
+        with transaction.atomic():
+            # the delete's rowcount tells whether there was a like, no lookup needed
+            removed, _ = Tweet.likes.through.objects.filter(tweet_id=self.id, user_id=user.id).delete()
+            if removed:
+                self.update_counter("like_count", -1)
+        return bool(removed)
+
+    def add_comment(self, comment):
+        comment.tweet = self
+        with transaction.atomic():
+            comment.save()
+            self.update_counter("comment_count", 1)
+        return comment
+
+    def remove_comment(self, comment):
+        """Delete one of the tweet's comments; returns False if it was already gone.
+
+        Comments deleted with their tweet skip the counter (no post_delete
+        handler), so a tweet delete stays one batch instead of an UPDATE per comment.
+        """
+        with transaction.atomic():
+            # the count includes the comment's search postings
+            _, deleted = Comment.objects.filter(id=comment.id, tweet_id=self.id).delete()
+            removed = deleted.get(Comment._meta.label, 0)
+            if removed:
+                self.update_counter("comment_count", -1)
+        if removed:
+            comment_removed.send(sender=Comment, comment=comment)
+        return bool(removed)
+
+    class Meta:
+        indexes = [
+            # profile feed (user's tweets, newest first) and the visitors' feed
+            models.Index(fields=["user", "-created_at", "-id"], name="tweet_user_created_idx"),
+            models.Index(fields=["-created_at", "-id"], name="tweet_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} ({self.created_at:%d-%m-%Y %H:%M}): {self.body[:20]}..."
@@ -34,6 +100,12 @@ class Comment(models.Model):
     body = models.TextField(max_length=280)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # a tweet's comments, newest first (comment page and feed previews)
+            models.Index(fields=["tweet", "-created_at", "-id"], name="comment_tweet_created_idx"),
+        ]
+
     def __str__(self):
         return f'{self.user.username} - {self.body[:30]}'
 
@@ -44,11 +116,17 @@ class Profile(models.Model):
     follows = models.ManyToManyField("self",
         related_name="followed_by",
         symmetrical=False,
+        through="Follow",
+        through_fields=("from_profile", "to_profile"),
         blank=True
     )
 
     date_modified = models.DateTimeField(auto_now=True)
     profile_image = models.ImageField(null=True, blank=True, upload_to="images/")
+    # SHA-256 of profile_image once its thumbnails exist (see twitter.thumbnails)
+    avatar_hash = models.CharField(max_length=64, blank=True, default="")
+    # Kept in sync by twitter.timeline; decides fan-out on write vs merge on read
+    follower_count = models.PositiveIntegerField(default=0, db_index=True)
     
     profile_bio = models.CharField(null=True, blank=True, max_length=500)
     homepage_link = models.CharField(null=True, blank=True, max_length=100)
@@ -58,7 +136,237 @@ class Profile(models.Model):
 
     def __str__(self):
         return self.user.username
-    
+
+
+# Profile.follows rows; declared only to index the followers side, the table is Django's default one
+class Follow(models.Model):
+    from_profile = models.ForeignKey(
+        Profile, related_name="+",
+        on_delete=models.CASCADE
+    )
+    to_profile = models.ForeignKey(
+        Profile, related_name="+",
+        on_delete=models.CASCADE
+    )
+
+    class Meta:
+        db_table = "twitter_profile_follows"
+        unique_together = [("from_profile", "to_profile")]
+        indexes = [
+            # followers of a profile, in id order, read from the index alone
+            models.Index(fields=["to_profile", "from_profile"], name="follow_to_from_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.from_profile_id} -> {self.to_profile_id}"
+
+
+# Materialized home timeline: one row per (owner, tweet) pushed on write
+class TimelineEntry(models.Model):
+    owner = models.ForeignKey(
+        User, related_name="timeline",
+        on_delete=models.CASCADE
+    )
+    tweet = models.ForeignKey(
+        Tweet, related_name="timeline_entries",
+        on_delete=models.CASCADE
+    )
+    # Copy of tweet.created_at so the timeline can be read from its own index
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "tweet"], name="unique_timeline_entry"),
+        ]
+        indexes = [
+            # tweet breaks created_at ties, so a page is one index range in (created_at, id) order
+            models.Index(fields=["owner", "-created_at", "-tweet"], name="timeline_owner_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.owner} <- {self.tweet_id}"
+
+
+# Precomputed "who to follow" candidates (see compute_suggestions)
+class FollowSuggestion(models.Model):
+    profile = models.ForeignKey(
+        Profile, related_name="suggestions",
+        on_delete=models.CASCADE
+    )
+    candidate = models.ForeignKey(
+        Profile, related_name="+",
+        on_delete=models.CASCADE
+    )
+    score = models.FloatField()
+    mutuals = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["profile", "candidate"], name="unique_follow_suggestion"),
+        ]
+        indexes = [
+            models.Index(fields=["profile", "-score"], name="suggestion_profile_score_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.profile} -> {self.candidate} ({self.score:.2f})"
+
+
+# Inverted index for search: one row per (term, tweet body or comment)
+class SearchPosting(models.Model):
+    term = models.CharField(max_length=64)
+    tweet = models.ForeignKey(
+        Tweet, related_name="+",
+        on_delete=models.CASCADE
+    )
+    # Null for terms of the tweet body
+    comment = models.ForeignKey(
+        Comment, related_name="+",
+        null=True, blank=True,
+        on_delete=models.CASCADE
+    )
+    frequency = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["term", "tweet"], name="search_term_tweet_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.tweet_id}"
+
+
+# Background work queued by twitter.tasks and run by the run_tasks worker
+class Task(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    # Idempotency key: a second task with the same key is never queued
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_at"], name="task_status_run_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name}{tuple(self.args)} [{self.status}]"
+
+
+# Cold storage: tweets older than ARCHIVE_AFTER_DAYS, with their comments and
+# likes, moved out of the hot tables by the archive_tweets command. Rows keep
+# their ids, so links and feed cursors stay valid (see twitter.archive).
+class ArchivedTweet(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        User, related_name="archived_tweets",
+        on_delete=models.DO_NOTHING
+    )
+    body = models.CharField(max_length=200)
+    created_at = models.DateTimeField()
+    date_modified = models.DateTimeField()
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    archived = True
+
+    def number_of_likes(self):
+        return self.like_count
+
+    def number_of_comments(self):
+        return self.comment_count
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-created_at", "-id"], name="archived_user_created_idx"),
+            models.Index(fields=["-created_at", "-id"], name="archived_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} ({self.created_at:%d-%m-%Y %H:%M}): {self.body[:20]}... [archived]"
+
+
+class ArchivedComment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    tweet = models.ForeignKey(
+        ArchivedTweet, related_name="comments",
+        on_delete=models.CASCADE
+    )
+    user = models.ForeignKey(
+        User, related_name="+",
+        on_delete=models.CASCADE
+    )
+    body = models.TextField(max_length=280)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["tweet", "-created_at", "-id"], name="archived_comment_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.body[:30]} [archived]"
+
+
+class ArchivedLike(models.Model):
+    tweet = models.ForeignKey(
+        ArchivedTweet, related_name="like_rows",
+        on_delete=models.CASCADE
+    )
+    user = models.ForeignKey(
+        User, related_name="+",
+        on_delete=models.CASCADE
+    )
+
+    class Meta:
+        unique_together = [("tweet", "user")]
+
+    def __str__(self):
+        return f"{self.user_id} likes {self.tweet_id} [archived]"
+
+
+# Live update events, shared between processes by twitter.live.DatabaseBackend
+class LiveEvent(models.Model):
+    TWEET = "tweet"
+    COUNTS = "counts"
+    KIND_CHOICES = [(TWEET, "New tweet"), (COUNTS, "Counter change")]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Plain ids: the tweet may be gone by the time the event is read
+    tweet_id = models.BigIntegerField()
+    # Profile of the tweet's author (new tweets only)
+    author_id = models.BigIntegerField(null=True, blank=True)
+    likes = models.IntegerField(default=0)
+    comments = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.tweet_id} ({self.created_at:%d-%m-%Y %H:%M:%S})"
+
+
+# Processes with live streams open, refreshed while they poll (twitter.live.DatabaseBackend)
+class LiveListener(models.Model):
+    # host:pid
+    name = models.CharField(max_length=255, unique=True)
+    seen_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.seen_at:%d-%m-%Y %H:%M:%S})"
+
+
 # Create Profile when new user signs up
 def create_profile(sender, instance, created, **kwargs):
     if created:
@@ -69,5 +377,3 @@ def create_profile(sender, instance, created, **kwargs):
         user_profile.save()
         
 post_save.connect(create_profile, sender=User)
-
-
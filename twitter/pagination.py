@@ -0,0 +1,75 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+# Keyset pagination for feeds ordered by (-created_at, -id). The cursor is an
+# opaque token holding the sort key of the last item on the page, so every page
+# is an index range scan no matter how far the user scrolls (no OFFSET). Works
+# for any model with created_at and id (tweets, comments). A queryset can sort on
+# other columns holding the same values by aliasing them as sort_created_at and
+# sort_id (the home timeline reads its own index this way).
+#
+# A feed may continue in an archive (twitter.archive) whose rows are all older
+# than the hot ones: the same cursor works on both, and the archive is only
+# read once the hot rows run out.
+
+
+def page_size():
+    return getattr(settings, "FEED_PAGE_SIZE", 20)
+
+
+def encode_key(*values):
+    raw = "|".join(str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_key(cursor):
+    """Split an opaque cursor back into its string parts (None if malformed)."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.urlsafe_b64decode(padded).decode().split("|")
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def encode_cursor(obj):
+    return encode_key(obj.created_at.isoformat(), obj.id)
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) for a cursor, or None if it is missing or invalid."""
+    try:
+        created_at, pk = decode_key(cursor)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+def after_cursor(queryset, cursor=None):
+    """Order ``queryset`` newest first, starting right after ``cursor``."""
+    aliases = queryset.query.annotations
+    created, pk_field = ("sort_created_at", "sort_id") if "sort_created_at" in aliases else ("created_at", "id")
+    queryset = queryset.order_by(f"-{created}", f"-{pk_field}")
+
+    position = decode_cursor(cursor)
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(**{f"{created}__lt": created_at}) | Q(**{created: created_at, f"{pk_field}__lt": pk})
+        )
+    return queryset
+
+
+def paginate(queryset, cursor=None, size=None, archive=None):
+    """Return (items, next_cursor) for the page after ``cursor``, then from ``archive``."""
+    size = size or page_size()
+    items = list(after_cursor(queryset, cursor)[:size + 1])
+    if archive is not None and len(items) <= size:
+        items += after_cursor(archive, cursor)[:size + 1 - len(items)]
+    next_cursor = encode_cursor(items[size - 1]) if len(items) > size else None
+    return items[:size], next_cursor
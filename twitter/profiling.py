@@ -0,0 +1,185 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Per-request SQL accounting. Every query is recorded through the connections'
+# execute_wrapper (so it works with DEBUG off) and reduced to a normalized
+# "shape" with literals and IN lists stripped; a shape that repeats within one
+# request is the usual sign of an N+1. QueryBudgetMiddleware checks each view
+# against SQL_BUDGETS (keyed by URL name) and logs violations, or raises them
+# when SQL_BUDGET_RAISE is on (the test runner).
+#
+# Every connection gets one execute_wrapper that hands its queries to the
+# recorders of the current context (a context variable). sync_to_async carries
+# the context into its threads, so the middleware runs natively under WSGI and
+# ASGI alike and still sees the queries an async view runs in other threads.
+
+log = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*(?:%s|\?|\d+)(?:\s*,\s*(?:%s|\?|\d+))*\s*\)")
+_SPACE = re.compile(r"\s+")
+_TRANSACTION = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT", "BEGIN", "COMMIT")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def normalize(sql):
+    """SQL with literals and parameter lists collapsed, so repeats of one query compare equal."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+# recorders capturing in the current context, outermost first
+_recorders = ContextVar("query_recorders", default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    recorders = _recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        for recorder in recorders:
+            recorder.queries.append((sql, ms))
+
+
+def install(connection, **kwargs):
+    """Send the connection's queries to the current context's recorders."""
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+connection_created.connect(install)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    @contextmanager
+    def capture(self):
+        # connections opened before this module was loaded
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        token = _recorders.set(_recorders.get() + (self,))
+        try:
+            yield self
+        finally:
+            _recorders.reset(token)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def db_ms(self):
+        return sum(ms for _, ms in self.queries)
+
+    def duplicates(self, limit):
+        """{shape: times} for shapes run more than ``limit`` times."""
+        shapes = Counter(
+            normalize(sql) for sql, _ in self.queries if not sql.lstrip().upper().startswith(_TRANSACTION)
+        )
+        return {shape: times for shape, times in shapes.items() if times > limit}
+
+
+def budget_for(view_name):
+    budgets = getattr(settings, "SQL_BUDGETS", {})
+    return {**getattr(settings, "SQL_BUDGET_DEFAULT", {}), **budgets.get(view_name, {})}
+
+
+def violations(recorder, elapsed_ms, budget):
+    """Human readable budget violations for one request (empty when within budget)."""
+    found = []
+    if "queries" in budget and recorder.count > budget["queries"]:
+        found.append(f"{recorder.count} queries (budget {budget['queries']})")
+    if "ms" in budget and elapsed_ms > budget["ms"]:
+        found.append(f"{elapsed_ms:.0f} ms (budget {budget['ms']})")
+    for shape, times in recorder.duplicates(budget.get("duplicates", 3)).items():
+        found.append(f"query repeated {times}x: {shape[:300]}")
+    return found
+
+
+@contextmanager
+def query_budget(queries=None, ms=None, duplicates=3):
+    """Test helper: fail if the block exceeds the given query/time budget or repeats a query shape.
+
+        with query_budget(queries=10):
+            self.client.get(url)
+    """
+    budget = {"duplicates": duplicates}
+    if queries is not None:
+        budget["queries"] = queries
+    if ms is not None:
+        budget["ms"] = ms
+
+    recorder = QueryRecorder()
+    started = time.perf_counter()
+    with recorder.capture():
+        yield recorder
+    found = violations(recorder, (time.perf_counter() - started) * 1000, budget)
+    if found:
+        raise QueryBudgetExceeded("; ".join(found))
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recorder.capture():
+            response = self.get_response(request)
+        return self.check(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recorder.capture():
+            response = await self.get_response(request)
+        return self.check(request, response, recorder, started)
+
+    def check(self, request, response, recorder, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if getattr(settings, "SQL_PROFILE_HEADERS", False):
+            response["X-Query-Count"] = recorder.count
+            response["Server-Timing"] = (
+                f'db;dur={recorder.db_ms:.1f};desc="{recorder.count} queries", app;dur={elapsed_ms:.1f}'
+            )
+
+        match = request.resolver_match
+        if match is None or match.url_name is None:
+            return response
+        found = violations(recorder, elapsed_ms, budget_for(match.url_name))
+        if found:
+            message = f"{request.method} {request.path} ({match.url_name}) over SQL budget: " + "; ".join(found)
+            if getattr(settings, "SQL_BUDGET_RAISE", False):
+                raise QueryBudgetExceeded(message)
+            log.warning(message)
+        return response
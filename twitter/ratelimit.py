@@ -0,0 +1,108 @@
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+# Token buckets for the write views, kept in Django's cache. Each scope has a
+# rate like "30/m": the bucket holds up to 30 tokens and refills at 30 per
+# minute, so short bursts pass and sustained floods get 429 with Retry-After.
+# A request is checked against a bucket per user (or per login name) and one
+# per IP; both are read with one get_many and written with one set_many, only
+# when the request is allowed.
+#
+# get/set is not atomic across processes: under heavy concurrency a few extra
+# requests can slip through, which is fine for abuse protection. Buckets are
+# stamped with wall-clock time, which is comparable across hosts sharing the
+# cache; a stamp from a host whose clock runs ahead adds no tokens.
+
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, "RATE_LIMIT_CACHE_ALIAS", "default")]
+
+
+def parse_rate(rate):
+    """"30/m" -> (capacity 30, 0.5 tokens per second)."""
+    count, period = rate.split("/")
+    return int(count), int(count) / PERIODS[period]
+
+
+def consume(buckets, now=None):
+    """Take a token from every (key, rate) bucket; returns 0 if allowed, else seconds to wait."""
+    now = time.time() if now is None else now
+    cache = _cache()
+    with _lock:
+        stored = cache.get_many([key for key, _ in buckets])
+        updates, wait, timeout = {}, 0.0, 1
+        for key, rate in buckets:
+            capacity, refill = parse_rate(rate)
+            tokens, stamp = stored.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0, now - stamp) * refill)
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) / refill)
+            updates[key] = (tokens - 1, now)
+            # an idle bucket is full again after capacity / refill seconds, so it can expire then
+            timeout = max(timeout, math.ceil(capacity / refill))
+        if wait:
+            return wait
+        cache.set_many(updates, timeout)
+    return 0
+
+
+def client_ip(request):
+    if getattr(settings, "RATE_LIMIT_TRUST_FORWARDED", False):
+        forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def _identity(request):
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    # login attempts are counted per attempted account too
+    username = request.POST.get("username")
+    return f"login:{username.lower()}" if username else None
+
+
+def check(request, scope):
+    """Seconds the request has to wait under ``scope``'s limit (0 when allowed)."""
+    rate = getattr(settings, "RATE_LIMITS", {}).get(scope)
+    if not rate or not getattr(settings, "RATE_LIMIT_ENABLED", True):
+        return 0
+    buckets = [(f"rl:{scope}:ip:{client_ip(request)}", rate)]
+    identity = _identity(request)
+    if identity:
+        buckets.append((f"rl:{scope}:{identity}", rate))
+    return consume(buckets)
+
+
+def too_many_requests(wait):
+    seconds = max(1, math.ceil(wait))
+    response = HttpResponse(
+        f"Muitas requisições. Tente novamente em {seconds} segundos.", status=429,
+        content_type="text/plain; charset=utf-8",
+    )
+    response["Retry-After"] = seconds
+    return response
+
+
+def limit(scope, methods=("POST",)):
+    """Apply the ``scope`` rate limit of RATE_LIMITS to a view, for the given methods."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method in methods:
+                wait = check(request, scope)
+                if wait:
+                    return too_many_requests(wait)
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, InterfaceError, OperationalError, connections
+
+# Read replicas. ReplicaMiddleware picks one healthy alias of
+# DATABASE_REPLICAS for each GET/HEAD request and ReplicaRouter sends that
+# request's reads there; everything else (writes, other methods, management
+# commands, background tasks) uses the primary. A request that writes turns
+# the rest of itself to the primary and sets a short-lived cookie, so the same
+# client keeps reading from the primary for REPLICA_STICKY_SECONDS and sees its
+# own writes while the replicas catch up.
+#
+# Replicas are probed with SELECT 1 at most every REPLICA_HEALTH_INTERVAL
+# seconds per process. One that fails a probe, or breaks a request, is left
+# out until the next probe; a GET that failed on a replica is run again on
+# the primary.
+#
+# The middleware is sync and async capable. Its per-request state is a context
+# variable, which sync_to_async carries into the threads that run the queries;
+# under ASGI only a due probe leaves the event loop.
+
+log = logging.getLogger(__name__)
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+class _Request:
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+        # transactions already open when the request came in (a test case's, say)
+        self.atomic_depth = len(connections[DEFAULT_DB_ALIAS].atomic_blocks)
+
+
+_current = ContextVar("replica_request", default=None)
+# alias -> (healthy, monotonic time of the last probe)
+_health = {}
+
+
+def replicas():
+    return list(getattr(settings, "DATABASE_REPLICAS", ()))
+
+
+def sticky_seconds():
+    return getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+
+
+def cookie_name():
+    return getattr(settings, "REPLICA_STICKY_COOKIE", "db_primary")
+
+
+def _probe(alias):
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1")
+        return True
+    except DatabaseError:
+        log.warning("replica %s is down", alias, exc_info=True)
+        connections[alias].close()
+        return False
+
+
+def _probe_due(checked_at, now):
+    return checked_at is None or now - checked_at >= getattr(settings, "REPLICA_HEALTH_INTERVAL", 10)
+
+
+def is_healthy(alias, probe=True):
+    healthy, checked_at = _health.get(alias, (True, None))
+    now = time.monotonic()
+    if probe and _probe_due(checked_at, now):
+        healthy = _probe(alias)
+        _health[alias] = (healthy, now)
+    return healthy
+
+
+def probes_due():
+    """Whether choose_replica() would probe (query) a replica now."""
+    now = time.monotonic()
+    return any(_probe_due(_health.get(alias, (True, None))[1], now) for alias in replicas())
+
+
+def mark_down(alias):
+    """Leave ``alias`` out until its next health check."""
+    _health[alias] = (False, time.monotonic())
+
+
+def choose_replica(probe=True):
+    """A random healthy replica, or None; ``probe=False`` goes by the last probes only."""
+    healthy = [alias for alias in replicas() if is_healthy(alias, probe)]
+    return random.choice(healthy) if healthy else None
+
+
+def _sticky(request):
+    try:
+        return float(request.COOKIES.get(cookie_name(), 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        current = _current.get()
+        if current is None or current.replica is None or current.wrote:
+            return DEFAULT_DB_ALIAS
+        if len(connections[DEFAULT_DB_ALIAS].atomic_blocks) > current.atomic_depth:
+            # reads inside a transaction the request opened belong with its writes
+            return DEFAULT_DB_ALIAS
+        return current.replica
+
+    def db_for_write(self, model, **hints):
+        current = _current.get()
+        if current is not None:
+            current.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the primary's rows, so objects read anywhere can be related
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def wants_replica(self, request):
+        return replicas() and request.method in SAFE_METHODS and not _sticky(request)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        current = _Request(choose_replica() if self.wants_replica(request) else None)
+        token = _current.set(current)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.stick(current, response)
+
+    async def __acall__(self, request):
+        replica = None
+        if self.wants_replica(request):
+            # probes query the replicas, at most every REPLICA_HEALTH_INTERVAL
+            replica = await sync_to_async(choose_replica)() if probes_due() else choose_replica(probe=False)
+        current = _Request(replica)
+        token = _current.set(current)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.stick(current, response)
+
+    def stick(self, current, response):
+        if current.wrote:
+            seconds = sticky_seconds()
+            response.set_cookie(
+                cookie_name(), str(time.time() + seconds), max_age=seconds, httponly=True, samesite="Lax",
+            )
+        return response
+
+    def process_exception(self, request, exception):
+        current = _current.get()
+        if not isinstance(exception, (OperationalError, InterfaceError)):
+            return None
+        if current is None or current.replica is None:
+            return None
+        log.warning("read from replica %s failed, retrying on the primary", current.replica)
+        mark_down(current.replica)
+        current.replica = None
+        match = request.resolver_match
+        if match is None or current.wrote or asyncio.iscoroutinefunction(match.func):
+            return None
+        return match.func(request, *match.args, **match.kwargs)
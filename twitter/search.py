@@ -0,0 +1,230 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Q, Sum, Value, When
+from django.db.models.signals import post_save
+
+from . import tasks
+from .models import Comment, SearchPosting, Tweet
+from .pagination import decode_key, encode_key, page_size
+
+# Full-text search over tweet bodies and comments with an inverted index kept
+# in SearchPosting (one row per term per tweet body / comment), so it runs the
+# same on SQLite and MySQL. Postings are written when a tweet is created or
+# edited and when a comment is added; deletes cascade. Results are tweets that
+# contain every query term, ranked by tf-idf (body hits count double) and
+# paginated with a (score, id) keyset cursor.
+#
+# Ranking needs every posting of a match, so it is bounded: a query only ranks
+# the tweets among the newest SEARCH_MAX_CANDIDATES postings of its rarest
+# term, and every page costs the same however deep it is. Older matches of
+# very common queries are left out. The cursor carries the lowest tweet id of
+# that window, so later pages rank the same candidates. Document frequencies
+# are cached per term.
+
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+BODY_WEIGHT = 2
+COMMENT_WEIGHT = 1
+BATCH_SIZE = 1000
+
+STOPWORDS = frozenset("""
+    a o e as os um uma de da do das dos em no na nos nas por para com que se
+    ao aos é eu tu ele ela isso esse essa mas ou the an and or of to in on is
+    it for at be this that with
+""".split())
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lowercase, accent-free terms of ``text``, without stopwords."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [
+        term[:MAX_TERM_LENGTH]
+        for term in _WORD.findall(text)
+        if len(term) > 1 and term not in STOPWORDS
+    ]
+
+
+def _postings(tweet_id, text, comment_id=None):
+    return [
+        SearchPosting(term=term, tweet_id=tweet_id, comment_id=comment_id, frequency=min(count, 32767))
+        for term, count in Counter(tokenize(text)).items()
+    ]
+
+
+def index_tweet(tweet):
+    """(Re)index the body of one tweet."""
+    with transaction.atomic():
+        SearchPosting.objects.filter(tweet_id=tweet.id, comment__isnull=True).delete()
+        SearchPosting.objects.bulk_create(_postings(tweet.id, tweet.body))
+
+
+def index_comment(comment):
+    SearchPosting.objects.bulk_create(_postings(comment.tweet_id, comment.body, comment.id))
+
+
+def index_tweets(tweets, chunk_size=BATCH_SIZE):
+    """Index the bodies of freshly bulk-created tweets (bulk_create sends no signals)."""
+    SearchPosting.objects.bulk_create(
+        [posting for tweet in tweets for posting in _postings(tweet.id, tweet.body)],
+        batch_size=chunk_size,
+    )
+
+
+def rebuild(chunk_size=BATCH_SIZE):
+    """Drop and rebuild the whole index, streaming tweets and comments in chunks."""
+    SearchPosting.objects.all().delete()
+    indexed = 0
+    for model, fields in ((Tweet, ("id", "id", "body")), (Comment, ("tweet_id", "id", "body"))):
+        batch = []
+        rows = model.objects.order_by("id").values_list(*fields)
+        for tweet_id, pk, body in rows.iterator(chunk_size=chunk_size):
+            batch.extend(_postings(tweet_id, body, pk if model is Comment else None))
+            indexed += 1
+            if len(batch) >= chunk_size:
+                SearchPosting.objects.bulk_create(batch, batch_size=chunk_size)
+                batch = []
+        SearchPosting.objects.bulk_create(batch, batch_size=chunk_size)
+    return indexed
+
+
+def _document_count():
+    # Max id is an index lookup and close enough to the row count for idf
+    total = cache.get("search:documents")
+    if total is None:
+        total = Tweet.objects.aggregate(last=Max("id"))["last"] or 0
+        cache.set("search:documents", total, 60 * 10)
+    return total
+
+
+def max_candidates():
+    return getattr(settings, "SEARCH_MAX_CANDIDATES", 5000)
+
+
+def _document_frequencies(terms):
+    """{term: number of tweets containing it}; terms that occur nowhere are left out."""
+    keys = {f"search:df:{term}": term for term in terms}
+    cached = cache.get_many(list(keys))
+    frequencies = {keys[key]: df for key, df in cached.items()}
+    missing = [term for term in terms if term not in frequencies]
+    if missing:
+        counted = dict(
+            SearchPosting.objects.filter(term__in=missing)
+            .values("term")
+            .annotate(df=Count("tweet", distinct=True))
+            .values_list("term", "df")
+            .order_by()
+        )
+        cache.set_many({f"search:df:{term}": df for term, df in counted.items()}, 60 * 10)
+        frequencies.update(counted)
+    return frequencies
+
+
+def _window_start(term):
+    """Lowest tweet id among the newest max_candidates() postings of ``term`` (0: all of them)."""
+    limit = max_candidates()
+    start = (
+        SearchPosting.objects.filter(term=term)
+        .order_by("-tweet_id")
+        .values_list("tweet_id", flat=True)[limit - 1:limit]
+    )
+    return next(iter(start), 0)
+
+
+def search(query, cursor=None, size=None):
+    """Return (tweets, next_cursor) for tweets matching every term of ``query``."""
+    size = size or page_size()
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return [], None
+
+    frequencies = _document_frequencies(terms)
+    if len(frequencies) < len(terms):
+        return [], None
+
+    # integer idf weights keep scores exact, so they can be used in the cursor
+    total = max(_document_count(), 1)
+    idf = Case(
+        *[When(term=term, then=Value(int(1000 * math.log(1 + total / df)))) for term, df in frequencies.items()],
+        output_field=IntegerField(),
+    )
+    field_weight = Case(
+        When(comment__isnull=True, then=Value(BODY_WEIGHT)),
+        default=Value(COMMENT_WEIGHT),
+        output_field=IntegerField(),
+    )
+
+    # the cursor is (score, id, window start); the first page picks the window
+    score = pk = start = None
+    position = decode_key(cursor)
+    if position:
+        try:
+            score, pk, start = map(int, position)
+        except ValueError:
+            score = pk = start = None
+    rarest = min(terms, key=frequencies.get)
+    if start is None:
+        start = _window_start(rarest)
+
+    candidates = SearchPosting.objects.filter(term=rarest, tweet_id__gte=start).values("tweet_id")
+    hits = (
+        SearchPosting.objects.filter(term__in=terms, tweet_id__in=candidates)
+        .values("tweet_id")
+        .annotate(score=Sum(idf * F("frequency") * field_weight), matched=Count("term", distinct=True))
+        .filter(matched=len(terms))
+    )
+    if score is not None:
+        hits = hits.filter(Q(score__lt=score) | Q(score=score, tweet_id__lt=pk))
+
+    page = list(hits.order_by("-score", "-tweet_id").values_list("tweet_id", "score")[:size + 1])
+    found = Tweet.objects.select_related("user__profile").in_bulk([pk for pk, _ in page[:size]])
+    tweets = []
+    for pk, score in page[:size]:
+        if pk in found:
+            found[pk].search_score = score
+            tweets.append(found[pk])
+
+    next_cursor = encode_key(page[size - 1][1], page[size - 1][0], start) if len(page) > size else None
+    return tweets, next_cursor
+
+
+# ---------------------------------------------------------
+# TASKS
+# ---------------------------------------------------------
+@tasks.task
+def reindex_tweet(tweet_id):
+    tweet = Tweet.objects.filter(id=tweet_id).only("id", "body").first()
+    if tweet is not None:
+        index_tweet(tweet)
+
+
+@tasks.task
+def add_comment(comment_id):
+    comment = Comment.objects.filter(id=comment_id).only("id", "tweet_id", "body").first()
+    if comment is not None:
+        index_comment(comment)
+
+
+# ---------------------------------------------------------
+# SIGNALS
+# ---------------------------------------------------------
+def tweet_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is None or "body" in update_fields:
+        reindex_tweet.delay(instance.id)
+
+
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        add_comment.delay(instance.id, key=f"index_comment:{instance.id}")
+
+
+post_save.connect(tweet_saved, sender=Tweet)
+post_save.connect(comment_saved, sender=Comment)
@@ -0,0 +1,35 @@
+from django.contrib.auth.models import User
+from rest_framework import serializers
+
+from . import thumbnails
+from .models import Comment, Tweet
+
+
+class AuthorSerializer(serializers.ModelSerializer):
+    avatar = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ("id", "username", "avatar")
+
+    def get_avatar(self, user):
+        return thumbnails.thumbnail_url(user.profile, 55)
+
+
+class TweetSerializer(serializers.ModelSerializer):
+    user = AuthorSerializer(read_only=True)
+    likes = serializers.IntegerField(source="like_count", read_only=True)
+    comments = serializers.IntegerField(source="comment_count", read_only=True)
+    liked = serializers.BooleanField(read_only=True, default=False)
+
+    class Meta:
+        model = Tweet
+        fields = ("id", "user", "body", "created_at", "date_modified", "likes", "comments", "liked")
+
+
+class CommentSerializer(serializers.ModelSerializer):
+    user = AuthorSerializer(read_only=True)
+
+    class Meta:
+        model = Comment
+        fields = ("id", "user", "body", "created_at")
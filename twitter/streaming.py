@@ -0,0 +1,112 @@
+import re
+import secrets
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.template import Context
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import fragments
+
+# Streamed feed pages (STREAM_FEED_VIEWS). The page template is rendered once,
+# up front, with two placeholder cards as its tweet list and split there: the
+# part before them (head, navbar, messages) goes out at once, the tweet cards
+# follow in chunks as they are rendered, and the part after the list comes
+# last. Chunks start at STREAM_CHUNK_SIZE cards and double, since each one
+# costs its own lookups (cache, comment previews, likes). What the template
+# puts between two cards joins the streamed ones, so the page comes out the
+# same as the buffered one. Templates print ``tweet.card`` for each tweet and
+# wrap what needs the loaded page (next page link, follow lists, suggestions)
+# in {% deferred %}: in the up-front render those sections leave a marker and
+# keep their nodes and context, and only they are rendered once the tweets are
+# in, with next_cursor and the view's extra context. Markers carry a random
+# nonce, so nothing in the page can pass for one.
+#
+# The head is rendered before the response is returned, so messages are
+# marked as read and the CSRF cookie is set while the middlewares can still
+# see it. Work done while streaming is not seen by the middlewares (SQL
+# budgets, read replicas) and runs on the primary database.
+
+# context variable collecting the {% deferred %} sections of a streamed render
+SECTIONS = "stream_sections"
+
+
+class _Placeholder:
+    id = None
+
+    def __init__(self, marker):
+        self.card = mark_safe(marker)
+
+
+def enabled():
+    return getattr(settings, "STREAM_FEED_VIEWS", False)
+
+
+def chunk_size():
+    return getattr(settings, "STREAM_CHUNK_SIZE", 5)
+
+
+class _Sections(list):
+    def __init__(self, nonce):
+        super().__init__()
+        self.nonce = nonce
+
+    def marker(self, index):
+        return f"<!--stream:{self.nonce}:section:{index}-->"
+
+    def render(self, html, late):
+        """``html`` with the section markers replaced by the sections rendered with ``late`` context."""
+        def section(match):
+            nodelist, values, template, autoescape = self[int(match.group(1))]
+            context = Context({**values, **late}, autoescape=autoescape)
+            context.template = template
+            return nodelist.render(context)
+        return re.sub(f"<!--stream:{self.nonce}:section:(\\d+)-->", section, html)
+
+
+def defer(nodelist, context):
+    """Render a {% deferred %} section, or in a streamed render keep it and return its marker."""
+    sections = context.get(SECTIONS)
+    if sections is None:
+        return nodelist.render(context)
+    sections.append((nodelist, context.flatten(), context.template, context.autoescape))
+    return sections.marker(len(sections) - 1)
+
+
+def split(template_name, context, request):
+    """(before, between, after, sections): the page rendered once, around and between its tweet cards.
+
+    ``after`` still holds the markers of the deferred ``sections``.
+    """
+    nonce = secrets.token_hex(8)
+    marker = f"<!--stream:{nonce}:cards-->"
+    sections = _Sections(nonce)
+    html = render_to_string(
+        template_name, {**context, "tweets": [_Placeholder(marker)] * 2, SECTIONS: sections}, request,
+    )
+    before, between, after = html.split(marker)
+    return before, between, after, sections
+
+
+def stream_page(request, template_name, context, page, card_template, prepare=None, extra=None):
+    """StreamingHttpResponse of a feed page.
+
+    ``page()`` returns (tweets, next_cursor) and ``extra()`` any context only
+    needed after the tweets.
+    """
+    get_token(request)
+    before, between, after, sections = split(template_name, context, request)
+
+    def body():
+        yield before
+        tweets, next_cursor = page()
+        start, size = 0, chunk_size()
+        while start < len(tweets):
+            chunk = fragments.render_cards(tweets[start:start + size], request, card_template, prepare)
+            yield (between if start else "") + between.join(tweet.card for tweet in chunk)
+            start, size = start + size, size * 2
+        yield sections.render(after, {"next_cursor": next_cursor, **(extra() if extra else {})})
+
+    return StreamingHttpResponse(body(), content_type="text/html; charset=utf-8")
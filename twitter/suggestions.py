@@ -0,0 +1,134 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import FollowSuggestion, Profile, Tweet
+
+# "Who to follow": candidates are friends of friends, scored by how many of the
+# profile's follows already follow them (mutuals) plus a bonus for recent
+# tweets. compute() runs offline (compute_suggestions command) in batches of
+# profiles and stores the top K per profile; the home page only reads them.
+
+Follows = Profile.follows.through
+
+CHUNK_SIZE = 1000
+
+
+def top_k():
+    return getattr(settings, "SUGGESTIONS_TOP_K", 20)
+
+
+def _chunks(iterable, size=CHUNK_SIZE):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _following_of(profile_ids):
+    """{profile_id: [followed ids]} for a batch, newest follows first, capped per profile."""
+    limit = getattr(settings, "SUGGESTIONS_MAX_FOLLOWS", 500)
+    edges = defaultdict(list)
+    for chunk in _chunks(profile_ids):
+        rows = (
+            Follows.objects.filter(from_profile_id__in=chunk)
+            .exclude(from_profile_id=F("to_profile_id"))
+            .order_by("from_profile_id", "-id")
+            .values_list("from_profile_id", "to_profile_id")
+        )
+        for source, target in rows.iterator(chunk_size=CHUNK_SIZE):
+            if len(edges[source]) < limit:
+                edges[source].append(target)
+    return edges
+
+
+def recent_activity():
+    """{profile_id: tweets in the last SUGGESTIONS_ACTIVITY_DAYS days}."""
+    since = timezone.now() - timedelta(days=getattr(settings, "SUGGESTIONS_ACTIVITY_DAYS", 7))
+    rows = (
+        Tweet.objects.filter(created_at__gte=since)
+        .values_list("user__profile")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    return dict(rows.iterator(chunk_size=CHUNK_SIZE))
+
+
+def compute_batch(profile_ids, activity):
+    """Recompute and store the suggestions of ``profile_ids``; returns rows written."""
+    weight = getattr(settings, "SUGGESTIONS_ACTIVITY_WEIGHT", 0.5)
+    first_hop = _following_of(profile_ids)
+    second_hop = _following_of(set(chain.from_iterable(first_hop.values())))
+
+    rows = []
+    for profile_id in profile_ids:
+        followed = set(first_hop.get(profile_id, ()))
+        mutuals = Counter(
+            candidate
+            for friend in followed
+            for candidate in second_hop.get(friend, ())
+            if candidate != profile_id and candidate not in followed
+        )
+        scored = (
+            (count + weight * math.log1p(activity.get(candidate, 0)), count, candidate)
+            for candidate, count in mutuals.items()
+        )
+        rows.extend(
+            FollowSuggestion(profile_id=profile_id, candidate_id=candidate, score=score, mutuals=count)
+            for score, count, candidate in heapq.nlargest(top_k(), scored)
+        )
+
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(profile_id__in=profile_ids).delete()
+        FollowSuggestion.objects.bulk_create(rows, batch_size=CHUNK_SIZE)
+    return len(rows)
+
+
+def compute(batch_size=500):
+    """Stream every profile through compute_batch; yields (profiles, rows) per batch."""
+    activity = recent_activity()
+    profile_ids = Profile.objects.order_by("id").values_list("id", flat=True)
+    for batch in _chunks(profile_ids.iterator(chunk_size=batch_size), batch_size):
+        yield len(batch), compute_batch(batch, activity)
+
+
+# ---------------------------------------------------------
+# READS
+# ---------------------------------------------------------
+def _stored(profile_id):
+    return (
+        FollowSuggestion.objects.filter(profile_id=profile_id)
+        .select_related("candidate__user")
+        .order_by("-score")[:top_k()]
+    )
+
+
+def _fallback(profile_id, following_ids, limit):
+    # New users have nothing stored yet: show the most followed profiles
+    return (
+        Profile.objects.exclude(id=profile_id)
+        .exclude(id__in=list(following_ids))
+        .select_related("user")
+        .order_by("-follower_count")[:limit]
+    )
+
+
+def _pick(stored, following_ids, limit):
+    following_ids = set(following_ids)
+    return [s.candidate for s in stored if s.candidate_id not in following_ids][:limit]
+
+
+def for_profile(profile_id, following_ids, limit=5):
+    picked = _pick(_stored(profile_id), following_ids, limit)
+    return picked or list(_fallback(profile_id, following_ids, limit))
+
+
+async def afor_profile(profile_id, following_ids, limit=5):
+    picked = _pick([s async for s in _stored(profile_id)], following_ids, limit)
+    return picked or [p async for p in _fallback(profile_id, following_ids, limit)]
@@ -0,0 +1,152 @@
+import importlib
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import Task
+
+# Local task queue. Post-write work (timeline fan-out, search indexing,
+# thumbnails) is stored as Task rows once the request's transaction commits and
+# run by "manage.py run_tasks", so no broker is needed. Workers claim a task
+# with a conditional UPDATE (status queued -> running), which works the same on
+# SQLite and MySQL; failures are retried with exponential backoff up to
+# max_attempts. A task queued with an idempotency key runs at most once.
+#
+# Functions become tasks with @task, which adds ``func.delay(*args, key=None)``.
+# Arguments must be JSON serializable (pass ids, not model instances). With
+# TASKS_EAGER on (tests) delay() runs the function right away.
+
+log = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(func):
+    name = f"{func.__module__}.{func.__name__}"
+    _registry[name] = func
+
+    def delay(*args, key=None, countdown=0):
+        return enqueue(name, *args, key=key, countdown=countdown)
+
+    func.task_name = name
+    func.delay = delay
+    return func
+
+
+def resolve(name):
+    if name not in _registry:
+        # a worker may not have imported the task's module yet
+        importlib.import_module(name.rsplit(".", 1)[0])
+    return _registry[name]
+
+
+def enqueue(name, *args, key=None, countdown=0):
+    """Queue ``name(*args)`` once the current transaction commits."""
+    if getattr(settings, "TASKS_EAGER", False):
+        resolve(name)(*args)
+        return
+    transaction.on_commit(lambda: _insert(name, list(args), key, countdown))
+
+
+def _insert(name, args, key, countdown):
+    try:
+        with transaction.atomic():
+            Task.objects.create(
+                name=name, args=args, key=key,
+                max_attempts=getattr(settings, "TASK_MAX_ATTEMPTS", 5),
+                run_at=timezone.now() + timedelta(seconds=countdown),
+            )
+    except IntegrityError:
+        log.debug("task %s with key %s already queued", name, key)
+
+
+# ---------------------------------------------------------
+# WORKER
+# ---------------------------------------------------------
+def claim(limit):
+    """Mark up to ``limit`` due tasks as running for this worker and return them."""
+    now = timezone.now()
+    due = (
+        Task.objects.filter(status=Task.QUEUED, run_at__lte=now)
+        .order_by("run_at", "id")
+        .values_list("id", flat=True)[:limit]
+    )
+    claimed = [
+        pk for pk in list(due)
+        if Task.objects.filter(id=pk, status=Task.QUEUED).update(
+            status=Task.RUNNING, locked_at=now, attempts=F("attempts") + 1,
+        )
+    ]
+    return list(Task.objects.filter(id__in=claimed).order_by("run_at", "id"))
+
+
+def backoff(attempts):
+    base = getattr(settings, "TASK_RETRY_BASE", 2)
+    delay = min(base * 2 ** (attempts - 1), getattr(settings, "TASK_RETRY_MAX", 60 * 60))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def run(task):
+    """Run one claimed task and record the outcome; returns the new status."""
+    try:
+        resolve(task.name)(*task.args)
+    except Exception:
+        error = traceback.format_exc()
+        if task.attempts >= task.max_attempts:
+            status, run_at = Task.FAILED, task.run_at
+            log.error("task %s failed for good after %s attempts", task, task.attempts)
+        else:
+            status, run_at = Task.QUEUED, timezone.now() + backoff(task.attempts)
+            log.warning("task %s failed, retrying at %s", task, run_at)
+    else:
+        status, run_at, error = Task.DONE, task.run_at, ""
+
+    Task.objects.filter(id=task.id).update(
+        status=status, run_at=run_at, last_error=error, locked_at=None, updated_at=timezone.now(),
+    )
+    return status
+
+
+def requeue_stale():
+    """Give tasks whose worker died (running for longer than TASK_LOCK_TIMEOUT) back to the queue."""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, "TASK_LOCK_TIMEOUT", 10 * 60))
+    return Task.objects.filter(status=Task.RUNNING, locked_at__lt=cutoff).update(
+        status=Task.QUEUED, locked_at=None, run_at=timezone.now(),
+    )
+
+
+def purge():
+    """Delete done tasks older than TASK_KEEP_DONE and failed ones older than TASK_KEEP_FAILED.
+
+    Their idempotency keys go with them, so the same work can be queued again.
+    """
+    now = timezone.now()
+    deleted = 0
+    for status, setting, default in (
+        (Task.DONE, "TASK_KEEP_DONE", 7 * 24 * 60 * 60),
+        (Task.FAILED, "TASK_KEEP_FAILED", 30 * 24 * 60 * 60),
+    ):
+        cutoff = now - timedelta(seconds=getattr(settings, setting, default))
+        count, _ = Task.objects.filter(status=status, updated_at__lt=cutoff).delete()
+        deleted += count
+    return deleted
+
+
+def stats():
+    """Queue depth: tasks per status, how many are due now and the age of the oldest due one."""
+    now = timezone.now()
+    counts = dict(Task.objects.values_list("status").annotate(total=Count("id")).order_by())
+    due = Task.objects.filter(status=Task.QUEUED, run_at__lte=now).aggregate(
+        total=Count("id"), oldest=Min("run_at"),
+    )
+    return {
+        **{status: counts.get(status, 0) for status, _ in Task.STATUS_CHOICES},
+        "due": due["total"],
+        "oldest_due_seconds": round((now - due["oldest"]).total_seconds(), 1) if due["oldest"] else 0,
+    }
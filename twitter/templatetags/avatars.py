@@ -0,0 +1,11 @@
+from django import template
+
+from twitter import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar_url(profile, size, fmt="jpeg"):
+    """URL of ``profile``'s avatar thumbnail closest to ``size`` px (the original until it exists)."""
+    return thumbnails.thumbnail_url(profile, size, fmt)
@@ -0,0 +1,25 @@
+from django import template
+
+from twitter import streaming
+
+register = template.Library()
+
+
+@register.tag
+def deferred(parser, token):
+    """{% deferred %}...{% enddeferred %}: a part of a feed page that needs the loaded page.
+
+    Rendered in place, except in a streamed page, where it is rendered after the
+    tweet cards with next_cursor and the view's extra context (twitter.streaming).
+    """
+    nodelist = parser.parse(("enddeferred",))
+    parser.delete_first_token()
+    return DeferredNode(nodelist)
+
+
+class DeferredNode(template.Node):
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+
+    def render(self, context):
+        return streaming.defer(self.nodelist, context)
@@ -1,3 +1,1234 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import re
+import tempfile
+import tracemalloc
+import urllib.error
+import urllib.request
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.signals import template_rendered
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    archive, explain, feed, fragments, graph, identity, likes, live, pagination, profiling, ratelimit, routing, search, suggestions, tasks, thumbnails, timeline, transfer, urls, views,
+)
+from .management.commands.explain_views import explain_views, plan_views
+from .models import ArchivedComment, ArchivedLike, ArchivedTweet, Comment, FollowSuggestion, LiveEvent, LiveListener, Profile, Task, TimelineEntry, Tweet
+
+
+class FeedQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user("viewer", password="x")
+        authors = [User.objects.create_user(f"author{i}", password="x") for i in range(4)]
+        for author in authors:
+            cls.viewer.profile.follows.add(author.profile)
+
+        for i in range(24):
+            author = authors[i % len(authors)]
+            tweet = Tweet.objects.create(user=author, body=f"tweet {i}")
+            tweet.likes.add(authors[(i + 1) % len(authors)])
+            for j in range(i % 5):
+                Comment.objects.create(tweet=tweet, user=authors[j % len(authors)], body="oi")
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, url, page_size):
+        cache.clear()  # compare cold renders
+        with override_settings(FEED_PAGE_SIZE=page_size):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["tweets"]), page_size)
+        return len(ctx.captured_queries)
+
+    def test_home_query_count_does_not_grow_with_page_size(self):
+        self.client.force_login(self.viewer)
+        url = reverse("home")
+        self.assertEqual(self.count_queries(url, 5), self.count_queries(url, 20))
+
+    def test_visitor_home_query_count_does_not_grow_with_page_size(self):
+        url = reverse("home")
+        self.assertEqual(self.count_queries(url, 5), self.count_queries(url, 20))
+
+    def test_profile_query_count_does_not_grow_with_page_size(self):
+        self.client.force_login(self.viewer)
+        author = User.objects.get(username="author0")
+        url = reverse("profile", args=[author.id])
+        # author0 has 6 tweets: a page that reaches the last one also looks in the archive
+        self.assertEqual(self.count_queries(url, 2), self.count_queries(url, 5))
+
+    def test_comment_preview_is_bounded(self):
+        url = reverse("home")
+        with override_settings(COMMENT_PREVIEW_SIZE=2):
+            response = self.client.get(url)
+        for tweet in response.context["tweets"]:
+            self.assertLessEqual(len(tweet.preview_comments), 2)
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", password="x")
+        cls.tweets = [Tweet.objects.create(user=cls.author, body=f"tweet {i}") for i in range(5)]
+
+    def test_cursor_round_trip(self):
+        tweet = self.tweets[2]
+        self.assertEqual(pagination.decode_cursor(pagination.encode_cursor(tweet)), (tweet.created_at, tweet.id))
+        self.assertNotIn("=", pagination.encode_cursor(tweet))
+
+    def test_invalid_cursors_start_from_the_top(self):
+        garbage = ["", "!!!", "bm9wZQ", pagination.encode_key("ontem", 1), pagination.encode_key("2024-01-01", "x"), "\xff"]
+        for cursor in garbage:
+            self.assertIsNone(pagination.decode_cursor(cursor), cursor)
+        items, _ = pagination.paginate(Tweet.objects.all(), "!!!", size=2)
+        self.assertEqual([tweet.id for tweet in items], [self.tweets[4].id, self.tweets[3].id])
+
+        self.client.force_login(self.author)
+        response = self.client.get(reverse("profile", args=[self.author.id]), {"cursor": "!!!"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["tweets"]), len(self.tweets))
+
+    def test_ties_on_created_at_are_paged_by_id(self):
+        Tweet.objects.update(created_at=self.tweets[0].created_at)
+        seen, cursor = [], None
+        while True:
+            items, cursor = pagination.paginate(Tweet.objects.all(), cursor, size=2)
+            seen += [tweet.id for tweet in items]
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted((tweet.id for tweet in self.tweets), reverse=True))
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", password="x")
+        cls.reader = User.objects.create_user("reader", password="x")
+
+    def timeline_ids(self, user):
+        return list(timeline.home_timeline(user).values_list("id", flat=True))
+
+    def test_push_backfill_and_retract(self):
+        old = Tweet.objects.create(user=self.author, body="antes")
+        self.assertEqual(self.timeline_ids(self.author), [old.id])
+        self.assertEqual(self.timeline_ids(self.reader), [])
+
+        self.reader.profile.follows.add(self.author.profile)
+        self.assertEqual(self.timeline_ids(self.reader), [old.id])
+        new = Tweet.objects.create(user=self.author, body="depois")
+        self.assertEqual(self.timeline_ids(self.reader), [new.id, old.id])
+
+        self.reader.profile.follows.remove(self.author.profile)
+        self.assertEqual(self.timeline_ids(self.reader), [])
+        self.assertEqual(self.timeline_ids(self.author), [new.id, old.id])
+
+    def test_follow_tasks_running_out_of_order_follow_the_current_edge(self):
+        tweet = Tweet.objects.create(user=self.author, body="oi")
+        pair = [[self.reader.profile.id, self.author.profile.id]]
+
+        self.reader.profile.follows.add(self.author.profile)
+        self.reader.profile.follows.remove(self.author.profile)
+        # the follow's task arrives after the unfollow's
+        timeline.sync_follows(pair, True)
+        self.assertEqual(self.timeline_ids(self.reader), [])
+
+        self.reader.profile.follows.add(self.author.profile)
+        timeline.sync_follows(pair, False)
+        self.assertEqual(self.timeline_ids(self.reader), [tweet.id])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_authors_above_the_fanout_limit_are_merged_on_read(self):
+        friend = User.objects.create_user("friend", password="x")
+        fan = User.objects.create_user("fan", password="x")
+        # author: followed by itself, reader and fan; friend: by itself and reader
+        self.reader.profile.follows.add(self.author.profile, friend.profile)
+        fan.profile.follows.add(self.author.profile)
+
+        pushed = Tweet.objects.create(user=friend, body="amigo")
+        merged = Tweet.objects.create(user=self.author, body="celebridade")
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.reader, tweet=pushed).exists())
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.reader, tweet=merged).exists())
+        self.assertEqual(self.timeline_ids(self.reader), [merged.id, pushed.id])
+        self.assertEqual(self.timeline_ids(fan), [merged.id])
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_timelines_are_trimmed_to_length(self):
+        self.reader.profile.follows.add(self.author.profile)
+        tweets = [Tweet.objects.create(user=self.author, body=str(i)) for i in range(5)]
+        newest = [tweet.id for tweet in reversed(tweets)][:3]
+        self.assertEqual(self.timeline_ids(self.reader), newest)
+        self.assertEqual(self.timeline_ids(self.author), newest)
+
+        # ties on created_at are cut by id, as the feed sorts them
+        TimelineEntry.objects.filter(owner=self.reader).update(created_at=tweets[0].created_at)
+        with override_settings(TIMELINE_LENGTH=2):
+            timeline.trim([self.reader.id])
+        self.assertEqual(
+            sorted(TimelineEntry.objects.filter(owner=self.reader).values_list("tweet_id", flat=True)),
+            sorted(newest[:2]),
+        )
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", password="x")
+        cls.fan = User.objects.create_user("fan", password="x")
+        cls.tweet = Tweet.objects.create(user=cls.author, body="contado")
+
+    def counters(self):
+        self.tweet.refresh_from_db()
+        return self.tweet.like_count, self.tweet.comment_count
+
+    def test_likes_and_comments_keep_the_counters(self):
+        self.assertTrue(self.tweet.add_like(self.fan))
+        self.assertFalse(self.tweet.add_like(self.fan))
+        comment = self.tweet.add_comment(Comment(user=self.fan, body="oi"))
+        self.tweet.add_comment(Comment(user=self.author, body="tchau"))
+        self.assertEqual(self.counters(), (1, 2))
+
+        self.assertTrue(self.tweet.remove_comment(comment))
+        self.assertFalse(self.tweet.remove_comment(comment))
+        self.assertTrue(self.tweet.remove_like(self.fan))
+        self.assertFalse(self.tweet.remove_like(self.fan))
+        self.assertEqual(self.counters(), (0, 1))
+
+    def test_deleting_a_tweet_does_not_update_it_per_comment(self):
+        for i in range(3):
+            self.tweet.add_comment(Comment(user=self.fan, body=f"oi {i}"))
+        with CaptureQueriesContext(connection) as ctx:
+            self.tweet.delete()
+        self.assertEqual([q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE")], [])
+        self.assertFalse(Comment.objects.exists())
+
+    def test_recount_repairs_drift(self):
+        self.tweet.add_like(self.fan)
+        self.tweet.add_comment(Comment(user=self.fan, body="oi"))
+        Tweet.objects.filter(id=self.tweet.id).update(like_count=7, comment_count=0)
+
+        out = StringIO()
+        call_command("recount_tweets", "--dry-run", stdout=out)
+        self.assertIn("1 tweets would be repaired", out.getvalue())
+        self.assertEqual(self.counters(), (7, 0))
+
+        call_command("recount_tweets", stdout=StringIO())
+        self.assertEqual(self.counters(), (1, 1))
+
+
+class LikedLookupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", password="x")
+        cls.viewer = User.objects.create_user("viewer", password="x")
+        cls.tweets = [Tweet.objects.create(user=cls.author, body=f"tweet {i}") for i in range(10)]
+        for tweet in cls.tweets[::3]:
+            tweet.add_like(cls.viewer)
+
+    def page(self):
+        return list(Tweet.objects.order_by("id"))
+
+    def test_one_query_for_the_whole_page(self):
+        tweets = self.page()
+        with self.assertNumQueries(1):
+            feed.mark_liked(tweets, self.viewer)
+        self.assertEqual([tweet.id for tweet in tweets if tweet.liked], [tweet.id for tweet in self.tweets[::3]])
+
+    def test_visitors_and_empty_pages_need_no_query(self):
+        tweets = self.page()
+        with self.assertNumQueries(0):
+            feed.mark_liked(tweets, AnonymousUser())
+            self.assertEqual(feed.mark_liked([], self.viewer), [])
+            self.assertEqual(feed.liked_tweet_ids(self.viewer, []), set())
+        self.assertFalse(any(tweet.liked for tweet in tweets))
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", password="x")
+        cls.viewer = User.objects.create_user("viewer", password="x")
+        cls.viewer.profile.follows.add(cls.author.profile)
+        cls.tweet = Tweet.objects.create(user=cls.author, body="cacheado")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_second_render_is_a_hit(self):
+        self.client.get(reverse("home"))
+        self.client.get(reverse("home"))
+        self.assertEqual(fragments.stats(), {"hits": 1, "misses": 1})
+
+    def test_cards_are_kept_briefly_on_a_per_process_cache(self):
+        # other workers never see this process's version bumps
+        self.assertEqual(fragments._timeout(), 5)
+        with override_settings(CACHES=SHARED_CACHES, FRAGMENT_CACHE_ALIAS="shared"):
+            self.assertEqual(fragments._timeout(), 60 * 60 * 24)
+
+    def test_like_bumps_version_and_overlay_is_per_viewer(self):
+        self.client.force_login(self.viewer)
+        self.client.get(reverse("tweet_like", args=[self.tweet.id]), HTTP_REFERER="/")
+
+        response = self.client.get(reverse("home"))
+        self.assertIn("fa-solid fa-heart", response.context["tweets"][0].card)
+        self.assertIn('<span class="like-count">1</span>', response.context["tweets"][0].card)
+
+        self.client.force_login(self.author)
+        response = self.client.get(reverse("profile", args=[self.author.id]))
+        card = response.context["tweets"][0].card
+        self.assertIn("fa fa-heart-o", card)
+        self.assertIn(reverse("delete_tweet", args=[self.tweet.id]), card)
+        self.assertNotIn("__slot_", card)
+
+    def test_bodies_cannot_fake_slot_markers(self):
+        markers = " ".join(f"__slot_{name}__" for name in fragments.SLOTS)
+        body = f"oi {markers} tchau"
+        tweet = Tweet.objects.create(user=self.author, body=body)
+        comment = tweet.add_comment(Comment(user=self.viewer, body=f"{markers} __slot_0123456789abcdef_owner_start__"))
+
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.status_code, 200)
+        card = response.context["tweets"][0].card
+        self.assertIn(f'<p class="mb-1">{body}</p>', card)
+        self.assertIn(comment.body, card)
+
+        self.client.force_login(self.viewer)
+        response = self.client.get(reverse("profile", args=[self.author.id]))
+        card = response.context["tweets"][0].card
+        self.assertIn(f'<p class="tweet-body">{body}</p>', card)
+        self.assertNotIn(reverse("delete_tweet", args=[tweet.id]), card)
+
+    def test_profile_change_refreshes_comment_previews(self):
+        self.tweet.add_comment(Comment(user=self.viewer, body="oi"))
+        self.client.get(reverse("home"))
+        User.objects.filter(id=self.viewer.id).update(username="renomeado")
+        fragments.bump_profile(self.viewer.id)
+
+        card = self.client.get(reverse("home")).context["tweets"][0].card
+        self.assertIn("renomeado", card)
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as path:
+            file_cache = {"default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": path,
+            }}
+            with override_settings(CACHES=file_cache):
+                self.client.get(reverse("home"))
+                self.client.get(reverse("home"))
+                self.assertEqual(fragments.stats(), {"hits": 1, "misses": 1})
+
+
+class ApiConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", password="x")
+        cls.viewer = User.objects.create_user("viewer", password="x")
+        cls.viewer.profile.follows.add(cls.author.profile)
+        cls.tweet = Tweet.objects.create(user=cls.author, body="api")
+
+    def setUp(self):
+        self.client.force_login(self.viewer)
+
+    def test_unchanged_feed_returns_304_without_loading_tweets(self):
+        response = self.client.get(reverse("api_feed"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["body"], "api")
+
+        with CaptureQueriesContext(connection) as ctx:
+            again = self.client.get(reverse("api_feed"), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["ETag"], response["ETag"])
+        self.assertFalse(any('."body"' in q["sql"] for q in ctx.captured_queries))
+
+    def test_like_changes_etag(self):
+        response = self.client.get(reverse("api_feed"))
+        liked = self.client.post(reverse("api_like", args=[self.tweet.id]))
+        self.assertEqual(liked.json(), {"liked": True, "likes": 1})
+
+        again = self.client.get(reverse("api_feed"), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 200)
+        self.assertTrue(again.json()["results"][0]["liked"])
+
+    @override_settings(LIKE_BUFFER=True, LIKE_FLUSH_INTERVAL=0)
+    def test_buffered_like_changes_etag(self):
+        self.addCleanup(likes.flush)
+        response = self.client.get(reverse("api_feed"))
+        self.client.post(reverse("api_like", args=[self.tweet.id]))
+        # no row changed yet, the like is only in the buffer
+        self.assertEqual(likes.pending_delta(self.tweet.id), 1)
+
+        again = self.client.get(reverse("api_feed"), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 200)
+        self.assertTrue(again.json()["results"][0]["liked"])
+
+    def test_follow_and_comment(self):
+        other = User.objects.create_user("other", password="x")
+        response = self.client.post(reverse("api_follow", args=[other.id]))
+        self.assertTrue(response.json()["following"])
+
+        response = self.client.post(reverse("api_tweet_comments", args=[self.tweet.id]), {"body": "oi"})
+        self.assertEqual(response.status_code, 201)
+        comments = self.client.get(reverse("api_tweet_comments", args=[self.tweet.id])).json()
+        self.assertEqual([c["body"] for c in comments["results"]], ["oi"])
+
+
+class FollowerGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user("alice", password="x").profile
+        self.bob = User.objects.create_user("bob", password="x").profile
+
+    def test_follow_and_unfollow_invalidate_cached_arrays(self):
+        self.assertFalse(graph.is_following(self.alice.id, self.bob.id))
+        self.assertEqual(graph.counts(self.bob.id), {"followers": 1, "following": 1})
+
+        self.client.force_login(self.alice.user)
+        self.client.get(reverse("follow", args=[self.bob.user_id]), HTTP_REFERER="/")
+        self.assertTrue(graph.is_following(self.alice.id, self.bob.id))
+        self.assertEqual(list(graph.followers(self.bob.id)), sorted([self.alice.id, self.bob.id]))
+
+        self.client.get(reverse("unfollow", args=[self.bob.user_id]), HTTP_REFERER="/")
+        self.assertFalse(graph.is_following(self.alice.id, self.bob.id))
+
+    def test_arrays_are_kept_briefly_on_a_per_process_cache(self):
+        # a follow only drops the arrays of the process that handled it
+        self.assertEqual(graph._timeout(), 5)
+        with override_settings(CACHES=SHARED_CACHES, GRAPH_CACHE_ALIAS="shared"):
+            self.assertEqual(graph._timeout(), 60 * 60)
+
+    def test_follower_page_is_keyset_paginated(self):
+        self.bob.followed_by.add(self.alice)
+        self.client.force_login(self.bob.user)
+        with override_settings(FEED_PAGE_SIZE=1):
+            first = self.client.get(reverse("followers", args=[self.bob.user_id]))
+            second = self.client.get(
+                reverse("followers", args=[self.bob.user_id]), {"cursor": first.context["next_cursor"]}
+            )
+        self.assertEqual([p.id for p in first.context["page"]], [min(self.alice.id, self.bob.id)])
+        self.assertEqual([p.id for p in second.context["page"]], [max(self.alice.id, self.bob.id)])
+        self.assertIsNone(second.context["next_cursor"])
+
+
+class SuggestionTests(TestCase):
+    def test_friends_of_friends_ranked_by_mutuals(self):
+        me, f1, f2, popular, loner = (
+            User.objects.create_user(name, password="x").profile
+            for name in ("me", "f1", "f2", "popular", "loner")
+        )
+        me.follows.add(f1, f2)
+        f1.follows.add(popular, loner)
+        f2.follows.add(popular)
+
+        list(suggestions.compute(batch_size=2))
+
+        stored = FollowSuggestion.objects.filter(profile=me).order_by("-score")
+        self.assertEqual([(s.candidate, s.mutuals) for s in stored], [(popular, 2), (loner, 1)])
+
+        cache.clear()
+        self.client.force_login(me.user)
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.context["suggestions"], [popular, loner])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()  # document frequencies
+
+    def test_ranked_and_paginated_matches(self):
+        author = User.objects.create_user("author", password="x")
+        body_hit = Tweet.objects.create(user=author, body="Café com Django hoje")
+        comment_hit = Tweet.objects.create(user=author, body="django no trabalho")
+        Tweet.objects.create(user=author, body="só café")
+        comment_hit.add_comment(Comment(user=author, body="muito café aqui"))
+
+        self.assertEqual(search.tokenize("Café com DJANGO"), ["cafe", "django"])
+
+        first, cursor = search.search("cafe django", size=1)
+        second, last = search.search("cafe django", cursor=cursor, size=1)
+        self.assertEqual(first + second, [body_hit, comment_hit])
+        self.assertIsNone(last)
+
+        body_hit.body = "outro assunto"
+        body_hit.save()
+        self.assertEqual(search.search("cafe django")[0], [comment_hit])
+
+        response = self.client.get(reverse("search"), {"q": "trabalho"})
+        self.assertEqual(response.context["tweets"], [comment_hit])
+
+    @override_settings(SEARCH_MAX_CANDIDATES=3)
+    def test_ranking_is_bounded_to_the_newest_candidates(self):
+        author = User.objects.create_user("author", password="x")
+        Tweet.objects.bulk_create([Tweet(user=author, body="janela"), Tweet(user=author, body="janela")])
+        search.rebuild()
+        tweets = [Tweet.objects.create(user=author, body=f"janela busca {i}") for i in range(5)]
+        # "rara" is in fewer tweets, so its postings bound the window
+        for tweet in tweets:
+            tweet.add_comment(Comment(user=author, body="rara"))
+
+        first, cursor = search.search("janela rara", size=2)
+        Tweet.objects.create(user=author, body="janela rara nova")
+        second, last = search.search("janela rara", cursor=cursor, size=2)
+        self.assertEqual(first + second, tweets[:1:-1])
+        self.assertIsNone(last)
+
+
+class AvatarThumbnailTests(TestCase):
+    def upload(self, user):
+        image = BytesIO()
+        Image.new("RGB", (400, 300), "red").save(image, "PNG")
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("update_user"), {
+                "first_name": "Ana", "last_name": "Lima", "email": "ana@example.com",
+                "profile_image": SimpleUploadedFile("me.png", image.getvalue(), "image/png"),
+            })
+        return Profile.objects.get(user=user)
+
+    def test_upload_builds_shared_thumbnails(self):
+        with tempfile.TemporaryDirectory() as media, \
+                override_settings(MEDIA_ROOT=media):
+            first = self.upload(User.objects.create_user("first", password="x"))
+            second = self.upload(User.objects.create_user("second", password="x"))
+
+            self.assertTrue(first.avatar_hash)
+            self.assertEqual(first.avatar_hash, second.avatar_hash)
+            for size in thumbnails.sizes():
+                for fmt in thumbnails.FORMATS:
+                    name = thumbnails.thumbnail_name(first.avatar_hash, size, fmt)
+                    with default_storage.open(name) as thumb:
+                        self.assertEqual(Image.open(thumb).size, (size, size))
+            self.assertEqual(len(default_storage.listdir(f"thumbs/{first.avatar_hash[:2]}")[1]), 6)
+            self.assertTrue(thumbnails.thumbnail_url(first, 50).endswith("-55.jpeg"))
+
+
+class MediaServingTests(LiveServerTestCase):
+    # the live server answers MEDIA_URL by itself; unwrap it so twitter.media does
+    static_handler = staticmethod(lambda media_handler: media_handler.application)
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        os.makedirs(os.path.join(media.name, "thumbs"))
+        for name in ("images/me.txt", "thumbs/ab-55.txt"):
+            os.makedirs(os.path.dirname(os.path.join(media.name, name)), exist_ok=True)
+            with open(os.path.join(media.name, name), "wb") as f:
+                f.write(b"0123456789")
+        settings = override_settings(MEDIA_ROOT=media.name, MEDIA_SENDFILE_HEADER="")
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def fetch(self, path, **headers):
+        request = urllib.request.Request(self.live_server_url + "/media/" + path, headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers, error.read()
+
+    def test_validators_and_cache_headers(self):
+        status, headers, body = self.fetch("images/me.txt")
+        self.assertEqual((status, body), (200, b"0123456789"))
+        self.assertEqual(headers["Accept-Ranges"], "bytes")
+        self.assertNotIn("immutable", headers["Cache-Control"])
+
+        self.assertEqual(self.fetch("images/me.txt", **{"If-None-Match": headers["ETag"]})[0], 304)
+        self.assertEqual(self.fetch("images/me.txt", **{"If-Modified-Since": headers["Last-Modified"]})[0], 304)
+        self.assertIn("immutable", self.fetch("thumbs/ab-55.txt")[1]["Cache-Control"])
+        self.assertEqual(self.fetch("images/missing.txt")[0], 404)
+        self.assertEqual(self.fetch("../settings.py")[0], 400)
+
+    def test_ranges(self):
+        status, headers, body = self.fetch("images/me.txt", Range="bytes=2-5")
+        self.assertEqual((status, body, headers["Content-Range"]), (206, b"2345", "bytes 2-5/10"))
+        self.assertEqual(self.fetch("images/me.txt", Range="bytes=-3")[2], b"789")
+        self.assertEqual(self.fetch("images/me.txt", Range="bytes=20-")[0], 416)
+        # a stale If-Range gets the whole file
+        self.assertEqual(self.fetch("images/me.txt", Range="bytes=2-5", **{"If-Range": '"old"'})[0], 200)
+
+    def test_sendfile_handoff(self):
+        with override_settings(MEDIA_SENDFILE_HEADER="X-Accel-Redirect"):
+            status, headers, body = self.fetch("thumbs/ab-55.txt")
+        self.assertEqual((status, body), (200, b""))
+        self.assertEqual(headers["X-Accel-Redirect"], "/protected-media/thumbs/ab-55.txt")
+
+
+class SeedCommandTests(TestCase):
+    def test_seeded_data_is_consistent(self):
+        call_command("seed", users=40, follows=5, tweets=3, likes=2, comments=1, stdout=StringIO())
+
+        users = User.objects.filter(username__startswith="seed_")
+        self.assertEqual(users.count(), 40)
+        self.assertEqual(Profile.objects.filter(user__in=users).count(), 40)
+        # like signups, every profile follows itself
+        self.assertEqual(Profile.objects.filter(user__in=users, follows=F("pk")).count(), 40)
+
+        drifted = Tweet.objects.annotate(real=Count("likes")).exclude(like_count=F("real"))
+        self.assertFalse(drifted.exists())
+        celebrity = Profile.objects.order_by("-follower_count").first()
+        self.assertEqual(celebrity.follower_count, celebrity.followed_by.count())
+        self.assertGreater(celebrity.follower_count, 5)
+
+
+class QueryPlanTests(TestCase):
+    def test_view_queries_use_indexes(self):
+        call_command("seed", users=60, stdout=StringIO())
+        viewer = User.objects.annotate(total=Count("profile__follows")).order_by("-total", "id").first()
+        celebrity = Profile.objects.order_by("-follower_count", "id").first()
+        tweet = Tweet.objects.order_by("-comment_count", "id").first()
+        self.client.force_login(viewer)
+        with override_settings(FEED_PAGE_SIZE=5):
+            report = explain_views(self.client, plan_views(viewer, celebrity, tweet), cache.clear)
+        self.assertIn("home (page 2)", report)
+        self.assertEqual({name: problems for name, problems in report.items() if problems}, {})
+
+    def test_reports_full_scans_and_filesorts(self):
+        with explain.PlanRecorder().capture() as recorder:
+            list(Tweet.objects.filter(body="oi"))
+            list(Comment.objects.order_by("body")[:5])
+        problems = [problem for _, found in explain.check(recorder) for problem in found]
+        self.assertIn(("full scan", "twitter_tweet"), problems)
+        self.assertIn(("filesort", "twitter_comment"), problems)
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("budget", password="x")
+        for i in range(5):
+            Tweet.objects.create(user=cls.user, body=f"tweet {i}")
+
+    def test_normalized_shapes_catch_n_plus_one(self):
+        self.assertEqual(
+            profiling.normalize("SELECT * FROM t WHERE id IN (1, 2,3) AND name = 'x''y'"),
+            "SELECT * FROM t WHERE id IN (...) AND name = ?",
+        )
+        with self.assertRaisesMessage(profiling.QueryBudgetExceeded, "repeated 5x"):
+            with profiling.query_budget():
+                for tweet in Tweet.objects.all():
+                    tweet.user.username
+
+        with profiling.query_budget(queries=1):
+            list(Tweet.objects.select_related("user"))
+
+    def test_middleware_headers_and_budget(self):
+        self.client.force_login(self.user)
+        with override_settings(SQL_PROFILE_HEADERS=True):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse("home"))
+        self.assertEqual(int(response["X-Query-Count"]), len(ctx.captured_queries))
+        self.assertIn("db;dur=", response["Server-Timing"])
+
+        with override_settings(SQL_BUDGETS={"home": {"queries": 2}}):
+            with self.assertRaises(profiling.QueryBudgetExceeded):
+                self.client.get(reverse("home"))
+
+
+class JsonlTransferTests(TestCase):
+    def test_round_trip_and_resume(self):
+        call_command("seed", users=20, follows=4, tweets=2, likes=2, comments=1, stdout=StringIO())
+        # the oldest tweets, with their comments and likes, go to the archive tables
+        list(archive.archive(timezone.now() + timedelta(days=1), limit=10))
+        tweet = Tweet.objects.order_by("id").first()
+        archived = ArchivedTweet.objects.order_by("id").first()
+        exported = list(transfer.export_records())
+        counts = {kind: model.objects.count() for kind, model in transfer.KINDS.items()}
+        self.assertEqual(counts["archived_tweet"], 10)
+        self.assertTrue(counts["archived_comment"] and counts["archived_like"])
+
+        for model in (ArchivedLike, ArchivedComment, ArchivedTweet, Comment, Tweet, User):
+            model.objects.all().delete()
+        # an interrupted run: the first chunk of users committed, then it stopped
+        checkpoints = []
+        next(transfer.import_records(exported, chunk_size=5, checkpoint=checkpoints.append))
+        self.assertEqual(User.objects.count(), 5)
+        list(transfer.import_records(exported, chunk_size=5, start=checkpoints[-1]))
+
+        self.assertEqual({kind: model.objects.count() for kind, model in transfer.KINDS.items()}, counts)
+        restored = Tweet.objects.get(id=tweet.id)
+        self.assertEqual((restored.created_at, restored.body), (tweet.created_at, tweet.body))
+        restored = ArchivedTweet.objects.get(id=archived.id)
+        self.assertEqual(
+            (restored.created_at, restored.like_count, restored.comment_count),
+            (archived.created_at, archived.like_count, archived.comment_count),
+        )
+        # users came with their exported profiles, not ones made by the signal
+        self.assertFalse(User.objects.filter(profile__isnull=True).exists())
+
+
+@override_settings(LIKE_BUFFER=True, LIKE_FLUSH_INTERVAL=0)
+class LikeBufferTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user("author", password="x")
+        self.fan = User.objects.create_user("fan", password="x")
+        self.tweet = Tweet.objects.create(user=self.author, body="viral")
+        self.addCleanup(likes.flush)
+
+    def test_toggles_coalesce_and_flush_in_batch(self):
+        self.client.force_login(self.fan)
+        url = reverse("tweet_like", args=[self.tweet.id])
+        for _ in range(3):
+            self.client.get(url, HTTP_REFERER="/")
+
+        # nothing written yet, but the fan already sees the like
+        self.assertFalse(self.tweet.likes.exists())
+        self.assertEqual(likes.pending_delta(self.tweet.id), 1)
+        self.assertTrue(views.mark_liked([self.tweet], self.fan)[0].liked)
+
+        likes.toggle(self.tweet.id, self.author.id)
+        likes.toggle(self.tweet.id, self.author.id)
+        self.assertEqual(likes.flush(), 1)
+
+        self.tweet.refresh_from_db()
+        self.assertEqual(list(self.tweet.likes.all()), [self.fan])
+        self.assertEqual(self.tweet.like_count, 1)
+
+        likes.record(self.tweet.id, self.fan.id, False)
+        likes.flush()
+        self.tweet.refresh_from_db()
+        self.assertEqual((self.tweet.likes.count(), self.tweet.like_count), (0, 0))
+
+    def test_like_written_during_the_flush_is_not_counted_twice(self):
+        likes.record(self.tweet.id, self.fan.id, True)
+        bulk_create = likes.Likes.objects.bulk_create
+
+        def racing(rows, **kwargs):
+            # another writer gets the same like in after the flush read the existing rows
+            with transaction.atomic():
+                self.tweet.add_like(self.fan)
+            return bulk_create(rows, **kwargs)
+
+        with mock.patch.object(likes.Likes.objects, "bulk_create", racing):
+            with self.assertRaises(IntegrityError):
+                likes.flush()
+        # the batch went back into the buffer and the next round finds the row
+        self.assertEqual(likes.pending_delta(self.tweet.id), 1)
+        likes.flush()
+        self.tweet.refresh_from_db()
+        self.assertEqual((self.tweet.likes.count(), self.tweet.like_count), (1, 1))
+
+    def test_likes_of_tweets_archived_before_the_flush_are_dropped(self):
+        likes.record(self.tweet.id, self.fan.id, True)
+        archive.archive_batch(timezone.now() + timedelta(days=1))
+        likes.flush()
+        self.assertFalse(likes.Likes.objects.exists())
+        self.assertEqual(ArchivedTweet.objects.get(id=self.tweet.id).like_count, 0)
+
+
+@tasks.task
+def flaky(fail):
+    if fail:
+        raise RuntimeError("boom")
+
+
+@override_settings(TASKS_EAGER=False)
+class TaskQueueTests(TestCase):
+    def test_post_commit_queue_worker_and_retries(self):
+        author = User.objects.create_user("author", password="x")
+        fan = User.objects.create_user("fan", password="x")
+        with self.captureOnCommitCallbacks(execute=True):
+            fan.profile.follows.add(author.profile)
+            tweet = Tweet.objects.create(user=author, body="depois do commit")
+            # same idempotency key: not queued twice
+            timeline.fan_out.delay(tweet.id, key=f"fan_out:{tweet.id}")
+            flaky.delay(True)
+
+        # the author's own timeline doesn't wait for the worker
+        self.assertTrue(TimelineEntry.objects.filter(owner=author, tweet=tweet).exists())
+        self.assertFalse(TimelineEntry.objects.filter(owner=fan).exists())
+        self.assertEqual(Task.objects.filter(name="twitter.timeline.fan_out").count(), 1)
+        self.assertEqual(tasks.stats()["due"], Task.objects.count())
+
+        call_command("run_tasks", workers=1, once=True, stdout=StringIO())
+        self.assertTrue(TimelineEntry.objects.filter(owner=fan, tweet=tweet).exists())
+
+        failed = Task.objects.get(name="twitter.tests.flaky")
+        self.assertEqual((failed.status, failed.attempts), (Task.QUEUED, 1))
+        self.assertGreater(failed.run_at, timezone.now())
+        self.assertIn("boom", failed.last_error)
+        self.assertEqual(tasks.stats()["done"], Task.objects.count() - 1)
+
+    def test_purge_drops_old_done_and_failed_tasks(self):
+        for status in (Task.DONE, Task.FAILED, Task.QUEUED):
+            Task.objects.create(name="twitter.tests.flaky", key=f"old:{status}", status=status)
+        Task.objects.create(name="twitter.tests.flaky", key="recent", status=Task.FAILED)
+        Task.objects.exclude(key="recent").update(updated_at=timezone.now() - timedelta(days=60))
+
+        self.assertEqual(tasks.purge(), 2)
+        self.assertEqual(sorted(Task.objects.values_list("key", flat=True)), ["old:queued", "recent"])
+
+
+@override_settings(RATE_LIMITS={"like": "2/m", "login": "3/m"})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("fan", password="x")
+        self.tweet = Tweet.objects.create(user=self.user, body="curta")
+
+    def test_bucket_refills_over_time(self):
+        buckets = [("rl:test", "2/s")]
+        self.assertEqual([ratelimit.consume(buckets, now=0) for _ in range(2)], [0, 0])
+        self.assertAlmostEqual(ratelimit.consume(buckets, now=0), 0.5)
+        # a denied request takes no token
+        self.assertAlmostEqual(ratelimit.consume(buckets, now=0.25), 0.25)
+        self.assertEqual(ratelimit.consume(buckets, now=0.5), 0)
+
+    def test_views_answer_429_with_retry_after(self):
+        self.client.force_login(self.user)
+        url = reverse("tweet_like", args=[self.tweet.id])
+        for _ in range(2):
+            self.assertEqual(self.client.get(url, HTTP_REFERER="/").status_code, 302)
+        response = self.client.get(url, HTTP_REFERER="/")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+
+        # login attempts count per account as well as per IP
+        self.client.logout()
+        for _ in range(3):
+            self.client.post(reverse("login"), {"username": "fan", "password": "errada"})
+        response = self.client.post(reverse("login"), {"username": "fan", "password": "x"},
+                                    REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.client.get(reverse("login")).status_code, 200)
+
+    # the follow timeline sync queued as in production, not run inside the request
+    @override_settings(RATE_LIMITS={"like": "1/m", "follow": "1/m", "comment": "1/m"}, TASKS_EAGER=False)
+    def test_api_and_profile_follow_share_the_buckets(self):
+        other = User.objects.create_user("other", password="x")
+        self.client.force_login(self.user)
+        requests = [
+            (self.client.post, reverse("api_like", args=[self.tweet.id]), {}),
+            (self.client.delete, reverse("api_like", args=[self.tweet.id]), {}),
+            (self.client.post, reverse("api_tweet_comments", args=[self.tweet.id]), {"body": "oi"}),
+            (self.client.post, reverse("api_tweet_comments", args=[self.tweet.id]), {"body": "oi"}),
+            (self.client.post, reverse("profile", args=[other.id]), {"follow": "follow"}),
+            (self.client.post, reverse("api_follow", args=[other.id]), {}),
+        ]
+        self.assertEqual(
+            [request(url, data).status_code for request, url, data in requests],
+            [200, 429, 201, 429, 200, 429],
+        )
+
+    def test_stamps_from_a_clock_ahead_add_no_tokens(self):
+        buckets = [("rl:test", "1/s")]
+        self.assertEqual(ratelimit.consume(buckets, now=100), 0)
+        # another host, 5 seconds behind
+        self.assertAlmostEqual(ratelimit.consume(buckets, now=95), 1)
+
+
+# a cache every process sees, as REDIS_URL gives in production
+SHARED_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": tempfile.mkdtemp()},
+}
+
+
+@override_settings(
+    DATABASE_REPLICAS=["replica"],
+    REPLICA_HEALTH_INTERVAL=60,
+    CACHES=SHARED_CACHES,
+    SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+    SESSION_CACHE_ALIAS="shared",
+    IDENTITY_CACHE_ALIAS="shared",
+)
+class ReplicaRoutingTests(TestCase):
+    # the "replica" test database never receives the primary's writes: a replica lagging forever
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        caches["shared"].clear()
+        routing._health.clear()
+        self.user = User.objects.create_user("leitor", password="segredo")
+        Tweet.objects.create(user=self.user, body="recém escrito")
+
+    def home(self):
+        response = self.client.get(reverse("home"))
+        return response.context["user"].is_authenticated, [tweet.body for tweet in response.context["tweets"]]
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        self.assertEqual(self.home(), (False, []))
+
+        response = self.client.post(reverse("login"), {"username": "leitor", "password": "segredo"})
+        self.assertIn("db_primary", response.cookies)
+        self.assertEqual(self.home(), (True, ["recém escrito"]))
+
+        # once the window is over, the timeline is read from the lagging replica again
+        # (session and user now come from the cache)
+        self.client.cookies["db_primary"] = "0"
+        self.assertEqual(self.home(), (True, []))
+
+    def test_unhealthy_replica_falls_back_to_the_primary(self):
+        self.assertTrue(routing.is_healthy("replica"))
+        routing.mark_down("replica")
+        self.assertEqual(self.home(), (False, ["recém escrito"]))
+        self.assertEqual(routing.ReplicaRouter().db_for_write(Tweet), "default")
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    CACHES=SHARED_CACHES,
+    SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+    SESSION_CACHE_ALIAS="shared",
+    IDENTITY_CACHE_ALIAS="shared",
+)
+class CachedIdentityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["shared"].clear()
+        self.user = User.objects.create_user("eu", password="senha-antiga-123", email="eu@example.com")
+        self.client.post(reverse("login"), {"username": "eu", "password": "senha-antiga-123"})
+
+    def test_warm_request_needs_no_identity_queries(self):
+        self.client.get(reverse("change_password"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("change_password"))
+        self.assertEqual(response.context["user"].profile.user_id, self.user.id)
+
+    def test_profile_and_password_changes_drop_the_cached_user(self):
+        self.client.get(reverse("change_password"))
+        self.client.post(reverse("update_user"), {
+            "username": "eu", "first_name": "Novo", "last_name": "Nome", "email": "eu@example.com",
+        })
+        self.assertEqual(self.client.get(reverse("change_password")).context["user"].first_name, "Novo")
+
+        self.client.post(reverse("change_password"), {
+            "old_password": "senha-antiga-123", "new_password1": "outra-senha-456", "new_password2": "outra-senha-456",
+        })
+        self.assertTrue(self.client.get(reverse("change_password")).context["user"].check_password("outra-senha-456"))
+
+    def test_follow_does_not_write_back_cached_counters(self):
+        other = User.objects.create_user("outro", password="x")
+        self.client.get(reverse("change_password"))
+        # follower_count changes with update(), so the cached profile still has the old value
+        other.profile.follows.add(self.user.profile)
+        self.client.get(reverse("follow", args=[other.id]), HTTP_REFERER="/")
+        self.assertEqual(Profile.objects.get(user=self.user).follower_count, 2)
+        self.assertIsNone(caches["shared"].get(identity.cache_key(self.user.id)))
+
+    def test_per_process_cache_is_not_used(self):
+        self.client.get(reverse("change_password"))
+        with override_settings(IDENTITY_CACHE_ALIAS="default"):
+            identity.forget(self.user.id)
+            self.client.get(reverse("change_password"))
+            self.assertIsNone(cache.get(identity.cache_key(self.user.id)))
+            with self.assertNumQueries(1):
+                self.assertEqual(identity.load(self.user.id).profile.user_id, self.user.id)
+
+
+class StreamingFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("leitor", password="x")
+        for i in range(7):
+            Tweet.objects.create(user=self.user, body=f"tweet {i}")
+        self.client.force_login(self.user)
+
+    def page(self, url, stream):
+        with override_settings(STREAM_FEED_VIEWS=stream, FEED_PAGE_SIZE=6):
+            response = self.client.get(url)
+            self.assertEqual(response.streaming, stream)
+            html = b"".join(response.streaming_content if stream else [response.content]).decode()
+        # CSRF tokens are masked differently on every render
+        return response, re.sub(r'name="csrfmiddlewaretoken" value="[^"]+"', "", html)
+
+    def test_streamed_pages_match_buffered_ones(self):
+        for url in (reverse("home"), reverse("profile", args=[self.user.id])):
+            _, buffered = self.page(url, stream=False)
+            _, streamed = self.page(url, stream=True)
+            self.assertEqual(streamed, buffered)
+            self.assertIn("tweet 6", streamed)
+            self.assertIn("?cursor=", streamed)
+
+    def test_page_template_is_rendered_once(self):
+        rendered = []
+
+        def record(sender, template, **kwargs):
+            rendered.append(template.name)
+
+        template_rendered.connect(record)
+        self.addCleanup(template_rendered.disconnect, record)
+        self.page(reverse("profile", args=[self.user.id]), stream=True)
+        self.assertEqual(rendered.count("profile.html"), 1)
+
+    def test_head_is_sent_first_with_messages_and_csrf_cookie(self):
+        self.client.get(reverse("follow", args=[self.user.id]), HTTP_REFERER="/")
+        with override_settings(STREAM_FEED_VIEWS=True):
+            response = self.client.get(reverse("home"))
+            chunks = list(response.streaming_content)
+        self.assertIn(b"navbar", chunks[0])
+        self.assertIn("Você começou a seguir", chunks[0].decode())
+        self.assertNotIn(b"tweet 6", chunks[0])
+        self.assertIn("csrftoken", response.cookies)
+        # the message was consumed by the streamed page
+        self.assertNotIn("Você começou a seguir", self.client.get(reverse("home")).content.decode())
+
+
+@override_settings(FEED_PAGE_SIZE=2)
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user("author", password="x")
+        self.viewer = User.objects.create_user("viewer", password="x")
+        self.viewer.profile.follows.add(self.author.profile)
+        now = timezone.now()
+        self.tweets = [Tweet.objects.create(user=self.author, body=f"tweet {i}") for i in range(5)]
+        for days, tweet in zip((300, 200, 100, 1, 0), self.tweets):
+            Tweet.objects.filter(id=tweet.id).update(created_at=now - timedelta(days=days, minutes=-tweet.id))
+        self.old = self.tweets[2]
+        self.old.add_comment(Comment(user=self.viewer, body="antigo"))
+        self.old.add_comment(Comment(user=self.author, body="resposta"))
+        self.old.add_like(self.viewer)
+        self.client.force_login(self.viewer)
+
+    def test_moves_old_tweets_with_comments_and_likes(self):
+        out = StringIO()
+        call_command("archive_tweets", days=30, batch_size=2, pause=0, stdout=out)
+        self.assertIn("3 tweets archived in 2 batches", out.getvalue())
+
+        self.assertEqual(sorted(Tweet.objects.values_list("body", flat=True)), ["tweet 3", "tweet 4"])
+        archived = ArchivedTweet.objects.get(id=self.old.id)
+        self.assertEqual((archived.like_count, archived.comment_count), (1, 2))
+        self.assertEqual(sorted(archived.comments.values_list("body", flat=True)), ["antigo", "resposta"])
+        self.assertEqual(list(archived.like_rows.values_list("user_id", flat=True)), [self.viewer.id])
+        self.assertFalse(Comment.objects.exists() or TimelineEntry.objects.filter(tweet_id=self.old.id).exists())
+
+        # nothing left to move
+        call_command("archive_tweets", days=30, stdout=out)
+        self.assertIn("0 tweets archived", out.getvalue())
+
+    def test_profile_pages_read_the_archive_once_hot_tweets_run_out(self):
+        list(archive.archive(archive.cutoff(30), size=2))
+        url = reverse("profile", args=[self.author.id])
+
+        # a page the hot tweets fill (with one to spare) never reads the archive
+        with CaptureQueriesContext(connection) as first, override_settings(FEED_PAGE_SIZE=1):
+            self.assertEqual([t.body for t in self.client.get(url).context["tweets"]], ["tweet 4"])
+        self.assertFalse(any("twitter_archivedtweet" in q["sql"] for q in first.captured_queries))
+
+        pages, cursor = [], ""
+        while cursor is not None:
+            response = self.client.get(url, {"cursor": cursor})
+            pages.append([t.body for t in response.context["tweets"]])
+            cursor = response.context["next_cursor"]
+        self.assertEqual(pages, [["tweet 4", "tweet 3"], ["tweet 2", "tweet 1"], ["tweet 0"]])
+        # archived tweets are read only
+        self.assertNotIn(reverse("tweet_like", args=[self.tweets[0].id]), response.content.decode())
+
+        api = self.client.get(reverse("api_profile_tweets", args=[self.author.id]))
+        api = self.client.get(reverse("api_profile_tweets", args=[self.author.id]), {"cursor": api.json()["next"]})
+        self.assertEqual([t["body"] for t in api.json()["results"]], ["tweet 2", "tweet 1"])
+
+    def test_archived_tweet_comments_and_likes_are_shown(self):
+        list(archive.archive(archive.cutoff(30)))
+        response = self.client.get(reverse("tweet_comments", args=[self.old.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["tweet"].liked)
+        self.assertEqual([c.body for c in response.context["comments"]], ["resposta", "antigo"])
+        self.assertNotContains(response, reverse("add_comment", args=[self.old.id]))
+        self.assertEqual(self.client.get(reverse("tweet_like", args=[self.old.id])).status_code, 404)
+
+    def test_api_reads_archived_comments_and_refuses_new_ones(self):
+        list(archive.archive(archive.cutoff(30)))
+        url = reverse("api_tweet_comments", args=[self.old.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c["body"] for c in response.json()["results"]], ["resposta", "antigo"])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        self.assertEqual(self.client.post(url, {"body": "tarde demais"}).status_code, 409)
+        self.assertEqual(ArchivedTweet.objects.get(id=self.old.id).comment_count, 2)
+
+
+class AsyncUrls:
+    urlpatterns = [
+        path('', views.home_async, name="home"),
+        path('profile/<int:pk>', views.profile_async, name="profile"),
+    ] + urls.urlpatterns
+
+
+# TransactionTestCase: the async views read from a second thread/connection
+@override_settings(ROOT_URLCONF=AsyncUrls)
+class AsyncFeedViewTests(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user("author", password="x")
+        self.viewer = User.objects.create_user("viewer", password="x")
+        self.viewer.profile.follows.add(self.author.profile)
+        User.objects.create_user("stranger", password="x")
+        for i in range(3):
+            Tweet.objects.create(user=self.author, body=f"async {i}")
+
+    async def test_home_async_renders_feed_and_suggestions(self):
+        await self.async_client.aforce_login(self.viewer)
+        response = await self.async_client.get("/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([t.body for t in response.context["tweets"]], ["async 2", "async 1", "async 0"])
+        self.assertEqual([p.user.username for p in response.context["suggestions"]], ["stranger"])
+
+    async def test_profile_async(self):
+        await self.async_client.aforce_login(self.viewer)
+        response = await self.async_client.get(f"/profile/{self.author.id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["tweets"]), 3)
+
+        missing = await self.async_client.get("/profile/999999")
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_query_budget_middleware_runs_natively(self):
+        self.assertTrue(iscoroutinefunction(profiling.QueryBudgetMiddleware(views.home_async)))
+        await self.async_client.aforce_login(self.viewer)
+        with override_settings(SQL_PROFILE_HEADERS=True):
+            response = await self.async_client.get("/")
+        # the async view's queries run in another thread and are still counted
+        self.assertGreater(int(response["X-Query-Count"]), 3)
+
+    @override_settings(DATABASE_REPLICAS=["replica"])
+    async def test_replica_middleware_runs_natively(self):
+        self.assertTrue(iscoroutinefunction(routing.ReplicaMiddleware(views.home_async)))
+        routing._health.clear()
+        # the visitors' feed is read from the replica, which never got the tweets
+        response = await self.async_client.get("/")
+        self.assertEqual(response.context["tweets"], [])
+        self.assertTrue(routing.is_healthy("replica", probe=False))
+
+
+# TransactionTestCase: events are published once the writes commit
+@override_settings(LIVE_BACKEND="twitter.live.MemoryBackend", LIVE_POLL_INTERVAL=60)
+class LiveUpdatesTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user("author", password="x")
+        self.viewer = User.objects.create_user("viewer", password="x")
+        self.viewer.profile.follows.add(self.author.profile)
+        self.stranger = User.objects.create_user("stranger", password="x")
+        self.tweet = Tweet.objects.create(user=self.author, body="on screen")
+
+    def write(self):
+        Tweet.objects.create(user=self.author, body="new")
+        Tweet.objects.create(user=self.stranger, body="not followed")
+        Tweet.objects.create(user=self.viewer, body="mine")
+        self.tweet.add_comment(Comment(user=self.stranger, body="hi"))
+        likes.toggle(self.tweet.id, self.viewer.id)
+        likes.toggle(self.tweet.id, self.stranger.id)
+
+    def test_needs_login_and_asgi(self):
+        self.assertEqual(self.client.get(reverse("live")).status_code, 401)
+        self.client.force_login(self.viewer)
+        self.assertEqual(self.client.get(reverse("live")).status_code, 204)
+
+    async def test_stream_merges_new_tweets_and_count_deltas(self):
+        await self.async_client.aforce_login(self.viewer)
+        response = await self.async_client.get(reverse("live"), {"tweets": f"{self.tweet.id},x"})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        self.assertTrue((await anext(stream)).startswith(b"retry:"))
+
+        await sync_to_async(self.write)()
+        event, data = (await anext(stream)).decode().splitlines()[:2]
+        self.assertEqual(event, "event: update")
+        self.assertEqual(json.loads(data.removeprefix("data: ")), {
+            "new_tweets": 1, "tweets": {str(self.tweet.id): {"likes": 2, "comments": 1}},
+        })
+
+        # the server cancels the response when the client goes away
+        waiting = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual((live.hub.count, live.hub.by_author, live.hub.by_tweet), (0, {}, {}))
+
+    @override_settings(LIVE_BACKEND="twitter.live.DatabaseBackend")
+    async def test_database_backend_polls_events(self):
+        backend = live.backend()
+        backend.checked = (None, False)
+        # nobody polls yet, so nothing is stored
+        await sync_to_async(Tweet.objects.create)(user=self.author, body="unheard")
+        self.assertEqual(await LiveEvent.objects.acount(), 0)
+
+        viewer = await Profile.objects.aget(user=self.viewer)
+        author = await Profile.objects.aget(user=self.author)
+        subscription = live.hub.subscribe(viewer.id, [author.id], [self.tweet.id])
+        try:
+            while backend.last_id is None:
+                await asyncio.sleep(0.01)
+            self.assertTrue(await LiveListener.objects.filter(name=backend.name).aexists())
+            backend.checked = (None, False)
+            await sync_to_async(self.write)()
+            # nothing reaches the stream until the poll
+            self.assertEqual((await LiveEvent.objects.acount(), subscription.take()), (6, None))
+            self.assertEqual(await backend.poll(live.hub), 6)
+        finally:
+            live.hub.unsubscribe(subscription)
+        self.assertIsNone(backend.task)
+        self.assertEqual(subscription.take(), {
+            "new_tweets": 1, "tweets": {str(self.tweet.id): {"likes": 2, "comments": 1}},
+        })
+        # the process's listener row goes with its last stream
+        while await LiveListener.objects.aexists():
+            await asyncio.sleep(0.01)
+
+    @override_settings(LIVE_BACKEND="twitter.live.DatabaseBackend")
+    def test_purge_drops_old_events_and_dead_listeners(self):
+        backend = live.backend()
+        old = timezone.now() - timedelta(hours=1)
+        LiveListener.objects.create(name="crashed:1", seen_at=old)
+        backend.checked = (None, False)
+        self.assertFalse(backend.listening())
+
+        LiveEvent.objects.create(kind=LiveEvent.COUNTS, tweet_id=self.tweet.id, likes=1)
+        LiveEvent.objects.filter(kind=LiveEvent.COUNTS).update(created_at=old)
+        LiveEvent.objects.create(kind=LiveEvent.TWEET, tweet_id=self.tweet.id)
+        self.assertEqual(live.purge(), 1)
+        self.assertEqual(list(LiveEvent.objects.values_list("kind", flat=True)), [LiveEvent.TWEET])
+        self.assertFalse(LiveListener.objects.exists())
+
+        # the task worker purges them too, with no stream open anywhere
+        LiveEvent.objects.update(created_at=old)
+        call_command("run_tasks", once=True, stdout=StringIO())
+        self.assertFalse(LiveEvent.objects.exists())
+
+    async def test_ten_thousand_idle_streams(self):
+        viewer = await Profile.objects.aget(user=self.viewer)
+        authors = await graph.afollowing(viewer.id)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        streams = [live.events(viewer.id, authors, [self.tweet.id]) for _ in range(10000)]
+        for stream in streams:
+            await anext(stream)
+        # every stream waits for its next update, as an idle connection does
+        waiting = [asyncio.ensure_future(anext(stream)) for stream in streams]
+        await asyncio.sleep(0)
+        per_stream = (tracemalloc.get_traced_memory()[0] - before) / len(streams)
+        tracemalloc.stop()
+        self.assertEqual(live.hub.count, 10000)
+        # the connection's own task included
+        self.assertLess(per_stream, 3 * 1024)
+
+        live.hub.deliver({"kind": live.COUNTS, "tweet": self.tweet.id, "likes": 1, "comments": 0})
+        chunks = await asyncio.gather(*waiting)
+        self.assertTrue(all('"likes":1' in chunk for chunk in chunks))
+        for stream in streams:
+            await stream.aclose()
+        self.assertEqual((live.hub.count, live.hub.by_tweet), (0, {}))
@@ -0,0 +1,87 @@
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import fragments, identity, tasks
+from .models import Profile
+
+# Avatar thumbnails. Uploaded images are resized to a few fixed square sizes in
+# WebP and JPEG, stored under thumbs/ by the SHA-256 of the original, so the
+# same picture uploaded twice (or by two users) is only processed and stored
+# once. Resizing runs as a background task (twitter.tasks) after the upload
+# commits; until it finishes, templates keep serving the original file.
+
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+
+
+def sizes():
+    return tuple(sorted(getattr(settings, "AVATAR_SIZES", (35, 55, 200))))
+
+
+def pick_size(size):
+    """Smallest stored size that is at least ``size`` pixels (or the largest)."""
+    available = sizes()
+    return next((s for s in available if s >= size), available[-1])
+
+
+def thumbnail_name(digest, size, fmt):
+    return f"thumbs/{digest[:2]}/{digest}-{size}.{fmt}"
+
+
+def thumbnail_url(profile, size, fmt="jpeg"):
+    if profile.avatar_hash:
+        return default_storage.url(thumbnail_name(profile.avatar_hash, pick_size(size), fmt))
+    return profile.profile_image.url if profile.profile_image else None
+
+
+def content_hash(image_field):
+    digest = hashlib.sha256()
+    with image_field.open("rb") as source:
+        for chunk in source.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _render(image, size, fmt):
+    thumb = ImageOps.fit(image, (size, size), Image.LANCZOS)
+    if fmt == "jpeg" and thumb.mode != "RGB":
+        thumb = thumb.convert("RGB")
+    out = BytesIO()
+    thumb.save(out, FORMATS[fmt], quality=getattr(settings, "AVATAR_QUALITY", 85))
+    return out.getvalue()
+
+
+@tasks.task
+def generate(profile_id):
+    """Build the missing thumbnails of a profile's image; returns the content hash."""
+    profile = Profile.objects.only("id", "user_id", "profile_image", "avatar_hash").get(id=profile_id)
+    if not profile.profile_image:
+        return None
+
+    digest = content_hash(profile.profile_image)
+    wanted = [
+        (size, fmt) for size in sizes() for fmt in FORMATS
+        if not default_storage.exists(thumbnail_name(digest, size, fmt))
+    ]
+    if wanted:
+        with profile.profile_image.open("rb") as source:
+            image = ImageOps.exif_transpose(Image.open(source))
+            image.load()
+        for size, fmt in wanted:
+            default_storage.save(thumbnail_name(digest, size, fmt), ContentFile(_render(image, size, fmt)))
+
+    if digest != profile.avatar_hash:
+        Profile.objects.filter(id=profile_id).update(avatar_hash=digest, date_modified=timezone.now())
+        fragments.bump_profile(profile.user_id)
+        identity.forget(profile.user_id)
+    return digest
+
+
+def schedule(profile):
+    """Queue thumbnail generation for ``profile``'s current image."""
+    generate.delay(profile.id, key=f"thumbnails:{profile.id}:{profile.profile_image.name}")
@@ -0,0 +1,239 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_save
+
+from . import tasks
+from .models import Profile, TimelineEntry, Tweet
+
+# Home timelines are materialized on write: when a tweet is posted, one
+# TimelineEntry is pushed for the author (right away) and for each follower
+# (by the fan_out task). Authors with
+# more than TIMELINE_FANOUT_LIMIT followers are not fanned out; their tweets are
+# merged into the feed when it is read instead. Every push trims the timelines
+# it wrote to back to TIMELINE_LENGTH entries.
+
+BATCH_SIZE = 1000
+
+
+def fanout_limit():
+    return getattr(settings, "TIMELINE_FANOUT_LIMIT", 10000)
+
+
+def timeline_length():
+    return getattr(settings, "TIMELINE_LENGTH", 800)
+
+
+def is_fanned_out(profile):
+    return profile.follower_count <= fanout_limit()
+
+
+def _bulk_push(owner_ids, tweets):
+    entries = [
+        TimelineEntry(owner_id=owner_id, tweet_id=tweet_id, created_at=created_at)
+        for owner_id in owner_ids
+        for tweet_id, created_at in tweets
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    trim(owner_ids)
+
+
+def trim(owner_ids):
+    """Drop the entries past TIMELINE_LENGTH from the owners' timelines."""
+    length = timeline_length()
+    newest = (
+        TimelineEntry.objects.filter(owner_id=OuterRef("pk"))
+        .order_by("-created_at", "-tweet_id")
+        .values("pk")
+    )
+    # the first entry to drop of each owner with one, read from the owner's index
+    first_dropped = (
+        User.objects.filter(pk__in=owner_ids)
+        .annotate(entry=Subquery(newest[length:length + 1]))
+        .exclude(entry=None)
+        .values("entry")
+    )
+    cuts = list(TimelineEntry.objects.filter(pk__in=first_dropped).values_list("owner_id", "created_at", "tweet_id"))
+    # a few owners per statement keeps the OR chain short (SQLite limits expression depth)
+    for start in range(0, len(cuts), 100):
+        older = Q()
+        for owner_id, created_at, tweet_id in cuts[start:start + 100]:
+            older |= Q(owner_id=owner_id) & (Q(created_at__lt=created_at) | Q(created_at=created_at, tweet_id__lte=tweet_id))
+        TimelineEntry.objects.filter(older).delete()
+
+
+def push_tweet(tweet):
+    """Push a new tweet to its author's timeline and, if fanned out, to the followers'."""
+    _bulk_push([tweet.user_id], [(tweet.id, tweet.created_at)])
+    push_to_followers(tweet)
+
+
+def push_to_followers(tweet):
+    tweets = [(tweet.id, tweet.created_at)]
+    author = Profile.objects.get(user_id=tweet.user_id)
+    if not is_fanned_out(author):
+        return
+
+    follower_ids = (
+        Profile.objects.filter(follows=author)
+        .exclude(user_id=tweet.user_id)
+        .values_list("user_id", flat=True)
+    )
+    batch = []
+    for owner_id in follower_ids.iterator(chunk_size=BATCH_SIZE):
+        batch.append(owner_id)
+        if len(batch) == BATCH_SIZE:
+            _bulk_push(batch, tweets)
+            batch = []
+    if batch:
+        _bulk_push(batch, tweets)
+
+
+def backfill(follower, followed):
+    """Copy the followed profile's recent tweets into the follower's timeline."""
+    if follower.user_id == followed.user_id or not is_fanned_out(followed):
+        return
+    recent = (
+        Tweet.objects.filter(user_id=followed.user_id)
+        .order_by("-created_at")
+        .values_list("id", "created_at")[:timeline_length()]
+    )
+    _bulk_push([follower.user_id], list(recent))
+
+
+def retract(follower, followed):
+    """Remove the followed profile's tweets from the follower's timeline."""
+    if follower.user_id == followed.user_id:
+        return
+    TimelineEntry.objects.filter(
+        owner_id=follower.user_id, tweet__user_id=followed.user_id
+    ).delete()
+
+
+def refresh_follower_counts(profile_ids=None):
+    followers = (
+        Profile.follows.through.objects.filter(to_profile=OuterRef("pk"))
+        .order_by()
+        .values("to_profile")
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    profiles = Profile.objects.all()
+    if profile_ids is not None:
+        profiles = profiles.filter(pk__in=profile_ids)
+    profiles.update(follower_count=Coalesce(Subquery(followers), 0))
+
+
+def home_timeline(user):
+    """Tweets for the user's home feed, newest first."""
+    merged = list(
+        Profile.objects.filter(
+            followed_by__user=user, follower_count__gt=fanout_limit()
+        ).exclude(user=user).values_list("user_id", flat=True)
+    )
+    if not merged:
+        # page on the entries' copy of (created_at, id), straight from their index
+        return Tweet.objects.filter(timeline_entries__owner=user).alias(
+            sort_created_at=F("timeline_entries__created_at"), sort_id=F("timeline_entries__tweet_id"),
+        ).order_by("-sort_created_at", "-sort_id")
+
+    # An author may have been fanned out before crossing the limit, so select by
+    # id to avoid duplicating those tweets.
+    pushed = TimelineEntry.objects.filter(owner=user).values("tweet_id")
+    return Tweet.objects.filter(
+        Q(id__in=pushed) | Q(user_id__in=merged)
+    ).order_by("-created_at", "-id")
+
+
+def rebuild(user):
+    """Rebuild one user's timeline from scratch."""
+    TimelineEntry.objects.filter(owner=user).delete()
+    sources = (
+        Profile.objects.filter(followed_by__user=user, follower_count__lte=fanout_limit())
+        .values("user_id")
+    )
+    recent = (
+        Tweet.objects.filter(Q(user_id__in=sources) | Q(user=user))
+        .order_by("-created_at")
+        .values_list("id", "created_at")[:timeline_length()]
+    )
+    _bulk_push([user.id], list(recent))
+
+
+# ---------------------------------------------------------
+# TASKS
+# ---------------------------------------------------------
+@tasks.task
+def fan_out(tweet_id):
+    tweet = Tweet.objects.filter(id=tweet_id).only("id", "user_id", "created_at").first()
+    if tweet is not None:
+        push_to_followers(tweet)
+
+
+def _following(pairs):
+    """The (follower_id, followed_id) profile pairs among ``pairs`` that are follows right now."""
+    return set(
+        Profile.follows.through.objects.filter(
+            from_profile_id__in={follower for follower, _ in pairs},
+            to_profile_id__in={followed for _, followed in pairs},
+        ).values_list("from_profile_id", "to_profile_id")
+    ) & pairs
+
+
+@tasks.task
+def sync_follows(pairs, added=None):
+    """Backfill or retract timelines for [follower_id, followed_id] profile pairs.
+
+    The follow and unfollow tasks of one pair may run concurrently or out of
+    order, so ``added`` (what the queuing request did) is not trusted: each pair
+    follows its current Follow row, which is read again once the timeline has
+    been changed, in case the other task's write landed in between.
+    """
+    pairs = {tuple(pair) for pair in pairs}
+    profiles = Profile.objects.in_bulk({pk for pair in pairs for pk in pair})
+    pairs = {pair for pair in pairs if pair[0] in profiles and pair[1] in profiles}
+
+    synced = _following(pairs)
+    for follower_id, followed_id in pairs:
+        sync = backfill if (follower_id, followed_id) in synced else retract
+        sync(profiles[follower_id], profiles[followed_id])
+    for follower_id, followed_id in synced ^ _following(pairs):
+        sync = backfill if (follower_id, followed_id) not in synced else retract
+        sync(profiles[follower_id], profiles[followed_id])
+
+
+# ---------------------------------------------------------
+# SIGNALS
+# ---------------------------------------------------------
+def tweet_saved(sender, instance, created, **kwargs):
+    if created:
+        # the author sees it right after posting; the followers get it from the queue
+        _bulk_push([instance.user_id], [(instance.id, instance.created_at)])
+        fan_out.delay(instance.id, key=f"fan_out:{instance.id}")
+
+
+def follows_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        # pk_set is not provided for clear(), so remember it until the rows are gone
+        related = instance.followed_by if reverse else instance.follows
+        instance._cleared_follows = set(related.values_list("pk", flat=True))
+        return
+    if action == "post_clear":
+        pk_set = instance.__dict__.pop("_cleared_follows", None)
+    elif action not in ("post_add", "post_remove"):
+        return
+
+    if not pk_set:
+        return
+
+    refresh_follower_counts({instance.pk} if reverse else pk_set)
+    if reverse:
+        instance.refresh_from_db(fields=["follower_count"])
+
+    pairs = [[pk, instance.pk] if reverse else [instance.pk, pk] for pk in sorted(pk_set)]
+    sync_follows.delay(pairs, action == "post_add")
+
+
+post_save.connect(tweet_saved, sender=Tweet)
+m2m_changed.connect(follows_changed, sender=Profile.follows.through)
@@ -0,0 +1,170 @@
+import datetime
+import gzip
+import json
+import os
+from contextlib import contextmanager
+from itertools import groupby, islice
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+
+from .models import ArchivedComment, ArchivedLike, ArchivedTweet, Comment, Profile, Tweet, create_profile
+
+# Bulk JSONL export/import (export_jsonl / import_jsonl commands). One record
+# per line, {"type": ..., <column>: ...}, in dependency order: users, profiles,
+# tweets, comments, follows, likes, then the archive (twitter.archive): archived
+# tweets, their comments and their likes. Both directions stream: exports read with
+# iterator(chunk_size) and imports bulk_create one chunk at a time, so memory
+# stays flat whatever the file size. Imports keep the exported primary keys and
+# ignore rows that already exist, and a checkpoint file records the last
+# committed line, so an interrupted import can be resumed.
+
+KINDS = {
+    "user": User,
+    "profile": Profile,
+    "tweet": Tweet,
+    "comment": Comment,
+    "follow": Profile.follows.through,
+    "like": Tweet.likes.through,
+    "archived_tweet": ArchivedTweet,
+    "archived_comment": ArchivedComment,
+    "archived_like": ArchivedLike,
+}
+
+CHUNK_SIZE = 1000
+
+
+class _Encoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder drops microseconds, which the feeds' (created_at, id) keysets need
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def open_file(path, mode):
+    """Open a JSONL file for text ``mode`` ("r"/"w"), gzip compressed when it ends in .gz."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+# ---------------------------------------------------------
+# EXPORT
+# ---------------------------------------------------------
+def export_records(kinds=KINDS, chunk_size=CHUNK_SIZE):
+    """Yield one JSON line per row of every kind, streamed in primary key order."""
+    encoder = _Encoder(ensure_ascii=False)
+    for kind in kinds:
+        model = KINDS[kind]
+        rows = model.objects.order_by("pk").values(*_columns(model))
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield encoder.encode({"type": kind, **row}) + "\n"
+
+
+# ---------------------------------------------------------
+# IMPORT
+# ---------------------------------------------------------
+@contextmanager
+def raw_import():
+    """Keep exported timestamps and skip the per-user create_profile signal while importing."""
+    stamped = [
+        field for model in KINDS.values() for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in stamped]
+    for field in stamped:
+        field.auto_now = field.auto_now_add = False
+    post_save.disconnect(create_profile, sender=User)
+    try:
+        yield
+    finally:
+        post_save.connect(create_profile, sender=User)
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _parse(lines, start):
+    for number, line in enumerate(lines, start=1):
+        if number <= start or not line.strip():
+            continue
+        record = json.loads(line)
+        yield number, record.pop("type"), record
+
+
+def _batches(records, chunk_size):
+    """Group consecutive records of one kind into chunks of at most ``chunk_size``."""
+    for kind, group in groupby(records, key=lambda item: item[1]):
+        while chunk := list(islice(group, chunk_size)):
+            yield kind, chunk
+
+
+def import_records(lines, chunk_size=CHUNK_SIZE, start=0, checkpoint=None):
+    """Bulk insert the records in ``lines``, skipping the first ``start`` lines.
+
+    ``checkpoint(line)`` is called after each chunk commits. Yields (kind, rows)
+    per chunk.
+    """
+    with raw_import():
+        for kind, chunk in _batches(_parse(lines, start), chunk_size):
+            if kind not in KINDS:
+                raise ValueError(f"unknown record type {kind!r} on line {chunk[0][0]}")
+            model = KINDS[kind]
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    [model(**record) for _, _, record in chunk], ignore_conflicts=True,
+                )
+            if checkpoint:
+                checkpoint(chunk[-1][0])
+            yield kind, len(chunk)
+
+    reset_sequences()
+
+
+def reset_sequences():
+    # explicit ids leave PostgreSQL sequences behind; a no-op on SQLite and MySQL
+    statements = connection.ops.sequence_reset_sql(no_style(), list(KINDS.values()))
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def create_missing_profiles(chunk_size=CHUNK_SIZE):
+    """Profiles for imported users that came without one; returns how many were created."""
+    missing = User.objects.filter(profile__isnull=True).order_by("pk").values_list("pk", flat=True)
+    created = last = 0
+    # keyset chunks rather than one open cursor, since the loop writes to the joined table
+    while chunk := list(missing.filter(pk__gt=last)[:chunk_size]):
+        Profile.objects.bulk_create([Profile(user_id=pk) for pk in chunk])
+        created += len(chunk)
+        last = chunk[-1]
+    return created
+
+
+def checkpoint_path(path):
+    return f"{path}.progress"
+
+
+def read_checkpoint(path):
+    try:
+        with open(checkpoint_path(path)) as f:
+            return json.load(f)["line"]
+    except (OSError, ValueError, KeyError):
+        return 0
+
+
+def write_checkpoint(path, line):
+    # write then rename, so a crash never leaves a half-written checkpoint
+    tmp = checkpoint_path(path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"line": line}, f)
+    os.replace(tmp, checkpoint_path(path))
+
@@ -1,10 +1,17 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
+
+# Under ASGI the feed pages use the async views (see ASYNC_FEED_VIEWS)
+if getattr(settings, "ASYNC_FEED_VIEWS", False):
+    home_view, profile_view = views.home_async, views.profile_async
+else:
+    home_view, profile_view = views.home, views.profile
 
 urlpatterns = [
-    path('', views.home, name="home"),
+    path('', home_view, name="home"),
     path('profile_list/', views.profile_list, name="profile_list"),
-    path('profile/<int:pk>', views.profile, name="profile"),
+    path('profile/<int:pk>', profile_view, name="profile"),
     path('profile/followers/<int:pk>', views.followers, name='followers'),
     path('profile/follows/<int:pk>', views.follows, name='follows'),
     path('login/', views.login_user, name='login'),
@@ -18,5 +25,14 @@ urlpatterns = [
     path('edit_tweet/<int:pk>', views.edit_tweet, name="edit_tweet"),
     path('change-password/', views.change_password, name='change_password'),
     path('tweet/<int:pk>/comment/', views.add_comment, name='add_comment'),
+    path('tweet/<int:pk>/comments/', views.tweet_comments, name='tweet_comments'),
+    path('search/', views.search_tweets, name='search'),
+    path('live/', views.live_updates, name='live'),
 
+    # JSON API
+    path('api/feed/', api.feed, name='api_feed'),
+    path('api/profile/<int:pk>/tweets/', api.profile_tweets, name='api_profile_tweets'),
+    path('api/profile/<int:pk>/follow/', api.follow, name='api_follow'),
+    path('api/tweet/<int:pk>/comments/', api.tweet_comments, name='api_tweet_comments'),
+    path('api/tweet/<int:pk>/like/', api.like, name='api_like'),
 ]
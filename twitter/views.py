@@ -1,12 +1,24 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
+from django.db import close_old_connections
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 
-from .models import Profile, Tweet, Comment
+from .models import ArchivedTweet, Profile, Tweet
 from .forms import ProfileUpdateForm, TweetForm, SignUpForm, ProfilePicForm, UpdateUserForm, CommentForm
+from .pagination import paginate
+from .feed import (
+    asuggestions_for, home_page, mark_liked, prefetch_comment_previews, profile_page,
+    suggestions_for, with_authors,
+)
+from . import fragments, graph, likes, live, ratelimit, search, streaming, thumbnails
 
 
 
@@ -14,6 +26,7 @@ from .forms import ProfileUpdateForm, TweetForm, SignUpForm, ProfilePicForm, Upd
 # ---------------------------------------------------------
 # HOME - FEED
 # ---------------------------------------------------------
+@ratelimit.limit("tweet")
 def home(request):
 
     # Usuário autenticado → feed dos perfis que segue + ele mesmo
@@ -29,32 +42,39 @@ def home(request):
                 messages.success(request, "Seu tweet foi publicado!")
                 return redirect('home')
 
-        # pega os perfis que o user segue
-        following_profiles = request.user.profile.follows.all()
+        # streaming: cabeçalho e navbar saem na hora, os cards em blocos (twitter.streaming)
+        if streaming.enabled():
+            return streaming.stream_page(
+                request, "home.html", {"form": form},
+                page=lambda: home_page(request.user, request.GET.get("cursor")),
+                card_template="tweet_card.html", prepare=prefetch_comment_previews,
+                extra=lambda: {"suggestions": suggestions_for(request.user.profile.id)},
+            )
 
-        # feed = tweets dessas pessoas + meus próprios tweets
-        tweets = Tweet.objects.filter(
-            user__profile__in=following_profiles
-        ).union(
-            Tweet.objects.filter(user=request.user)
-        ).order_by('-created_at')
+        # feed = timeline materializada (tweets de quem sigo + meus próprios tweets)
+        tweets, next_cursor = home_page(request.user, request.GET.get("cursor"))
+        fragments.render_cards(tweets, request, "tweet_card.html", prefetch_comment_previews)
 
         # sugestões de usuários (não seguiram ainda)
-        suggestions = Profile.objects.exclude(
-            user=request.user
-        ).exclude(
-            id__in=following_profiles
-        )[:5]
+        suggestions = suggestions_for(request.user.profile.id)
 
         return render(request, 'home.html', {
             "tweets": tweets,
+            "next_cursor": next_cursor,
             "form": form,
             "suggestions": suggestions,
         })
 
     # visitante → todos tweets (público)
-    tweets = Tweet.objects.all().order_by("-created_at")
-    return render(request, 'home.html', {"tweets": tweets})
+    if streaming.enabled():
+        return streaming.stream_page(
+            request, "home.html", {},
+            page=lambda: home_page(request.user, request.GET.get("cursor")),
+            card_template="tweet_card.html", prepare=prefetch_comment_previews,
+        )
+    tweets, next_cursor = home_page(request.user, request.GET.get("cursor"))
+    fragments.render_cards(tweets, request, "tweet_card.html", prefetch_comment_previews)
+    return render(request, 'home.html', {"tweets": tweets, "next_cursor": next_cursor})
 
 
 # ---------------------------------------------------------
@@ -72,13 +92,13 @@ def profile_list(request):
 # ---------------------------------------------------------
 # PERFIL
 # ---------------------------------------------------------
+@ratelimit.limit("follow")
 def profile(request, pk):
     if not request.user.is_authenticated:
         messages.error(request, "Você precisa estar conectado para visualizar esta página.")
         return redirect('home')
 
     profile = get_object_or_404(Profile, user_id=pk)
-    tweets = Tweet.objects.filter(user_id=pk).order_by("-created_at")
 
     # follow/unfollow via POST
     if request.method == "POST":
@@ -90,30 +110,63 @@ def profile(request, pk):
         elif action == "unfollow":
             current.follows.remove(profile)
 
-        current.save()
+        current.save(update_fields=["date_modified"])
+
+    if streaming.enabled():
+        return streaming.stream_page(
+            request, "profile.html", {"profile": profile},
+            page=lambda: profile_page(pk, request.GET.get("cursor")),
+            card_template="profile_tweet_card.html",
+            extra=lambda: _follow_context(request.user.profile.id, profile),
+        )
+
+    tweets, next_cursor = profile_page(pk, request.GET.get("cursor"))
+    fragments.render_cards(tweets, request, "profile_tweet_card.html")
+
+    return render(request, "profile.html", {
+        "profile": profile,
+        "tweets": tweets,
+        "next_cursor": next_cursor,
+        **_follow_context(request.user.profile.id, profile),
+    })
+
 
-    return render(request, "profile.html", {"profile": profile, "tweets": tweets})
+def _follow_context(viewer_profile_id, profile):
+    # seguidores/seguindo vêm do cache do grafo (arrays ordenados de ids)
+    following_ids = list(graph.following(profile.id)[:5])
+    follower_ids = list(graph.followers(profile.id)[:3])
+    preview = graph.load_profiles(following_ids + follower_ids, viewer_profile_id)
+
+    return {
+        "following_preview": preview[:len(following_ids)],
+        "followers_preview": preview[len(following_ids):],
+        "follow_counts": graph.counts(profile.id),
+        "is_following": graph.is_following(viewer_profile_id, profile.id),
+    }
 
 
 # ---------------------------------------------------------
 # FOLLOW / UNFOLLOW (botões externos)
 # ---------------------------------------------------------
+@ratelimit.limit("follow", methods=("GET", "POST"))
 def follow(request, pk):
     if request.user.is_authenticated:
         target = Profile.objects.get(user_id=pk)
         request.user.profile.follows.add(target)
-        request.user.profile.save()
+        # só o timestamp: o resto do perfil pode vir do cache de identidade (twitter.identity)
+        request.user.profile.save(update_fields=["date_modified"])
         messages.success(request, f"Você começou a seguir {target.user.username}.")
         return redirect(request.META.get("HTTP_REFERER"))
     messages.error(request, "Por favor faça login primeiro.")
     return redirect('home')
 
 
+@ratelimit.limit("follow", methods=("GET", "POST"))
 def unfollow(request, pk):
     if request.user.is_authenticated:
         target = Profile.objects.get(user_id=pk)
         request.user.profile.follows.remove(target)
-        request.user.profile.save()
+        request.user.profile.save(update_fields=["date_modified"])
         messages.success(request, f"Você deicou de seguir {target.user.username}.")
         return redirect(request.META.get("HTTP_REFERER"))
     messages.error(request, "Por favor faça login primeiro.")
@@ -129,7 +182,7 @@ def followers(request, pk):
             messages.error(request, "Este não é o seu perfil.")
             return redirect('home')
         profile = Profile.objects.get(user_id=pk)
-        return render(request, 'followers.html', {"profiles": profile})
+        return render(request, 'followers.html', _follow_page(request, profile, graph.followers))
     messages.error(request, "Por favor faça login primeiro.")
     return redirect('home')
 
@@ -140,14 +193,25 @@ def follows(request, pk):
             messages.error(request, "Este não é o seu perfil.")
             return redirect('home')
         profile = Profile.objects.get(user_id=pk)
-        return render(request, 'follows.html', {"profiles": profile})
+        return render(request, 'follows.html', _follow_page(request, profile, graph.following))
     messages.error(request, "Por favor faça login primeiro.")
     return redirect('home')
 
 
+def _follow_page(request, profile, adjacency):
+    ids, next_cursor = graph.page(adjacency(profile.id), request.GET.get("cursor"))
+    return {
+        "profiles": profile,
+        "page": graph.load_profiles(ids, profile.id),
+        "next_cursor": next_cursor,
+        "follow_counts": graph.counts(profile.id),
+    }
+
+
 # ---------------------------------------------------------
 # LOGIN / LOGOUT
 # ---------------------------------------------------------
+@ratelimit.limit("login")
 def login_user(request):
     if request.method == "POST":
         username = request.POST.get("username")
@@ -198,7 +262,8 @@ def update_user(request):
         messages.error(request, "Porfavor faça seu login.")
         return redirect('home')
 
-    current_user = request.user
+    # lidos do banco, não do cache de identidade, já que o formulário grava todos os campos
+    current_user = User.objects.select_related("profile").get(pk=request.user.pk)
     profile = current_user.profile
 
     user_form = UpdateUserForm(request.POST or None, instance=current_user)
@@ -206,7 +271,14 @@ def update_user(request):
 
     if user_form.is_valid() and profile_form.is_valid():
         user_form.save()
-        profile_form.save()
+        image_changed = "profile_image" in profile_form.changed_data
+        if image_changed:
+            # mostra a imagem original até as miniaturas ficarem prontas
+            profile_form.instance.avatar_hash = ""
+        profile = profile_form.save()
+        if image_changed:
+            fragments.bump_profile(current_user.id)
+            thumbnails.schedule(profile)
         messages.success(request, "Seu perfil foi atualizado com sucesso!")
         return redirect('profile', current_user.id)
 
@@ -242,13 +314,12 @@ def change_password(request):
 # ---------------------------------------------------------
 # LIKE
 # ---------------------------------------------------------
+@ratelimit.limit("like", methods=("GET", "POST"))
 def tweet_like(request, pk):
     if request.user.is_authenticated:
-        tweet = get_object_or_404(Tweet, id=pk)
-        if request.user in tweet.likes.all():
-            tweet.likes.remove(request.user)
-        else:
-            tweet.likes.add(request.user)
+        get_object_or_404(Tweet.objects.only("id"), id=pk)
+        # curtida vai para o buffer (twitter.likes) e é gravada em lote
+        likes.toggle(pk, request.user.id)
         return redirect(request.META.get("HTTP_REFERER"))
 
     messages.error(request, "Porfavor faça seu login.")
@@ -270,6 +341,7 @@ def delete_tweet(request, pk):
         return redirect('home')
 
     tweet.delete()
+    fragments.bump_tweet(pk)
     messages.success(request, "Tweet apagado.")
     return redirect(request.META.get("HTTP_REFERER"))
 
@@ -294,6 +366,7 @@ def edit_tweet(request, pk):
     if request.method == "POST":
         if form.is_valid():
             form.save()
+            fragments.bump_tweet(tweet.id)
             messages.success(request, "Seu tweet foi atualizado!")
             return redirect('home')
 
@@ -302,6 +375,7 @@ def edit_tweet(request, pk):
 #---------------------------------------------------------
 #COMMENTS
 #---------------------------------------------------------
+@ratelimit.limit("comment")
 def add_comment(request, pk):
     if not request.user.is_authenticated:
         messages.error(request, "Please log in.")
@@ -314,8 +388,134 @@ def add_comment(request, pk):
         if form.is_valid():
             comment = form.save(commit=False)
             comment.user = request.user
-            comment.tweet = tweet
-            comment.save()
+            tweet.add_comment(comment)
+            fragments.bump_tweet(pk)
             return redirect(request.META.get('HTTP_REFERER'))
 
     return redirect('home')
+
+
+def tweet_comments(request, pk):
+    # tweets antigos podem já estar no arquivo (twitter.archive)
+    tweet = with_authors(Tweet.objects.all()).filter(id=pk).first()
+    if tweet is None:
+        tweet = get_object_or_404(with_authors(ArchivedTweet.objects.all()), id=pk)
+    comments, next_cursor = paginate(
+        tweet.comments.select_related("user__profile"),
+        request.GET.get("cursor"),
+    )
+    mark_liked([tweet], request.user)
+
+    return render(request, "comments.html", {
+        "tweet": tweet,
+        "comments": comments,
+        "next_cursor": next_cursor,
+    })
+
+
+# ---------------------------------------------------------
+# BUSCA
+# ---------------------------------------------------------
+def search_tweets(request):
+    query = request.GET.get("q", "").strip()
+    tweets, next_cursor = search.search(query, request.GET.get("cursor")) if query else ([], None)
+    fragments.render_cards(tweets, request, "tweet_card.html", prefetch_comment_previews)
+
+    return render(request, "search.html", {
+        "query": query,
+        "tweets": tweets,
+        "next_cursor": next_cursor,
+    })
+
+
+# ---------------------------------------------------------
+# ASYNC (ASGI) - HOME / PERFIL
+# ---------------------------------------------------------
+# Versões async de home e profile para rodar em setup.asgi (ASYNC_FEED_VIEWS).
+# As leituras independentes rodam ao mesmo tempo: uma numa thread própria (com
+# sua própria conexão) e a outra pelo ORM async. POSTs e visitantes usam as
+# views síncronas acima.
+
+def _in_thread(func):
+    def run(*args):
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+async def home_async(request):
+    user = await request.auser()
+    if request.method == "POST" or not user.is_authenticated:
+        return await sync_to_async(home)(request)
+    request.user = user
+
+    (tweets, next_cursor), suggestions = await asyncio.gather(
+        _in_thread(home_page)(user, request.GET.get("cursor")),
+        asuggestions_for(user),
+    )
+    await sync_to_async(fragments.render_cards)(
+        tweets, request, "tweet_card.html", prefetch_comment_previews
+    )
+
+    return await sync_to_async(render)(request, 'home.html', {
+        "tweets": tweets,
+        "next_cursor": next_cursor,
+        "form": TweetForm(),
+        "suggestions": suggestions,
+    })
+
+
+async def profile_async(request, pk):
+    user = await request.auser()
+    if request.method == "POST" or not user.is_authenticated:
+        return await sync_to_async(profile)(request, pk)
+    request.user = user
+
+    try:
+        profile, (tweets, next_cursor) = await asyncio.gather(
+            Profile.objects.select_related("user").aget(user_id=pk),
+            _in_thread(profile_page)(pk, request.GET.get("cursor")),
+        )
+    except Profile.DoesNotExist:
+        raise Http404("Perfil não encontrado.")
+    await sync_to_async(fragments.render_cards)(tweets, request, "profile_tweet_card.html")
+    viewer = await Profile.objects.only("id").aget(user=user)
+    follow_context = await sync_to_async(_follow_context)(viewer.id, profile)
+
+    return await sync_to_async(render)(request, "profile.html", {
+        "profile": profile,
+        "tweets": tweets,
+        "next_cursor": next_cursor,
+        **follow_context,
+    })
+
+
+# ---------------------------------------------------------
+# LIVE - NOVOS TWEETS (SSE)
+# ---------------------------------------------------------
+# Server-Sent Events com o número de tweets novos de quem o usuário segue e as
+# mudanças de likes/comentários dos tweets na tela (?tweets=1,2,3). Só roda sob
+# ASGI; no WSGI cada conexão prenderia uma thread, então o navegador recebe 204
+# e não tenta de novo.
+
+async def live_updates(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    if not isinstance(request, ASGIRequest) or not live.enabled():
+        return HttpResponse(status=204)
+
+    tweet_ids = []
+    for value in request.GET.get("tweets", "").split(",")[:live.max_tweets()]:
+        if value.strip().isdigit():
+            tweet_ids.append(int(value))
+    profile_id = await Profile.objects.values_list("id", flat=True).aget(user_id=user.id)
+    authors = await graph.afollowing(profile_id)
+
+    response = StreamingHttpResponse(live.events(profile_id, authors, tweet_ids), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # nginx would otherwise buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response